@@ -0,0 +1,48 @@
+"""
+    Measures a handler that makes several edits, transposing the line around
+    the cursor as in the README, in the middle of a large buffer: with each
+    edit drawing as it's made, against the same edits inside app.batch(),
+    which rewrites the changed line once. Run from the directory containing
+    the peacock package:
+        $ python -m peacock.benchmarks.batch_edits 10000 200
+"""
+from io import StringIO
+import sys
+from time import perf_counter
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+
+def transpose(app, cur_line, x):
+    app.move_cursor_to_x(0)
+    app.interact.delete_line()
+    app.write(cur_line[x:] + cur_line[:x])
+    app.move_cursor_to_x(len(cur_line) - x)
+
+def batched(app, cur_line, x):
+    with app.batch():
+        transpose(app, cur_line, x)
+
+def main(count=10000, presses=200):
+    print("{} presses in the middle of {} lines".format(presses, count))
+    results = []
+    for handler in (transpose, batched):
+        out = StringIO()
+        app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+        app.write("\n".join("line number {}".format(i) 
+                            for i in range(count)))
+        app.move_cursor_to(5, count // 2)
+        app.on("\\")(handler)
+
+        start, size = perf_counter(), out.tell()
+        for _ in range(presses):
+            app.handle("\\")
+        elapsed = perf_counter() - start
+        print("  {:<10} {:8.3f} s {:>10} bytes {:8.1f} bytes/press".format(
+            handler.__name__, elapsed, out.tell() - size, 
+            (out.tell() - size) / presses))
+        results.append(list(app._buffer))
+    assert results[0] == results[1]
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
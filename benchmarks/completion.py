@@ -0,0 +1,71 @@
+"""
+    Measures completing a word from the words in a large buffer: rescanning
+    the buffer for candidates on every completion, against a Completer that
+    the buffer's edits keep up to date, which only counts the whole buffer
+    the first time. Each completion follows typing a character at the end
+    of the buffer. Run from the directory containing the peacock package:
+        $ python -m peacock.benchmarks.completion 100000 1000
+"""
+from collections import Counter
+from io import StringIO
+import sys
+from time import perf_counter
+
+from peacock.interact import Completer, InteractANSIMac
+from peacock.interact.complete import WORD
+
+NAMES = ["value", "values", "validate", "valid", "total", "totals", "index",
+         "indices", "item", "items", "interact", "line_length", "lines"]
+PREFIXES = ["va", "to", "in", "it", "li", "l"]
+
+class NullOut(StringIO):
+    def write(self, text):
+        return len(text)
+
+def make(count):
+    interact = InteractANSIMac(None, NullOut(), 120)
+    interact.write("\n".join(
+        "{} = {}({}_{}) + {}".format(NAMES[i % 13], NAMES[i * 7 % 13],
+                                     NAMES[i * 3 % 13], i % 1000, i)
+        for i in range(count)))
+    interact.write("\n")
+    return interact
+
+def rescan(lines, prefix, k=10):
+    counts = Counter(word for line in lines for word in WORD.findall(line)
+                     if word.startswith(prefix) and word != prefix)
+    return sorted(counts, key=lambda word: (-counts[word], word))[:k]
+
+def typed(interact, times, complete):
+    # Types a character, then completes a prefix, 'times' times over
+    elapsed = 0
+    for i in range(times):
+        interact.write("x" if i % 50 else "\n")
+        start = perf_counter()
+        result = complete(interact._buffer, PREFIXES[i % len(PREFIXES)])
+        elapsed += perf_counter() - start
+    return elapsed, result
+
+def report(name, times, elapsed):
+    print("  {:<16} {:>5} times {:9.3f} s {:9.3f} ms/completion".format(
+        name, times, elapsed, elapsed / times * 1e3))
+
+def main(count=100000, times=1000, rescans=10):
+    print("{} lines".format(count))
+
+    interact = make(count)
+    elapsed, expected = typed(interact, rescans, rescan)
+    report("rescan", rescans, elapsed)
+
+    interact = make(count)
+    interact.completer = completer = Completer()
+    start = perf_counter()
+    completer.complete(interact._buffer, "")
+    report("first count", 1, perf_counter() - start)
+    elapsed, result = typed(interact, rescans, completer.complete)
+    assert result == expected
+    elapsed, _ = typed(interact, times, completer.complete)
+    report("completer", times, elapsed)
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
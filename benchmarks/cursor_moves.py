@@ -0,0 +1,61 @@
+"""
+    Measures the bytes an editing session sends to the terminal, and how
+    much of it goes on cursor moves. A scripted session of typing, arrow
+    keys, deletes and newlines is fed through a headless app, with its
+    output captured and analyzed. Run from the directory containing the
+    peacock package:
+        $ python -m peacock.benchmarks.cursor_moves 5000
+"""
+from io import StringIO
+import os
+import random
+import sys
+import tempfile
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+from peacock.interact.capture import Tee, analyze, load
+
+WORDS = ["peacock", "terminal", "cursor", "def", "return", "日本語", "x", "if"]
+ARROWS = ["left", "right", "up", "down"]
+
+def session(count, seed=0):
+    """
+        Generates a reproducible stream of 'count' keys
+    """
+    rand = random.Random(seed)
+    keys = []
+    while len(keys) < count:
+        roll = rand.random()
+        if roll < 0.5:
+            keys.extend(rand.choice(WORDS) + " ")
+        elif roll < 0.85:
+            keys.extend([rand.choice(ARROWS)] * rand.randint(1, 6))
+        elif roll < 0.95:
+            keys.append("delete")
+        else:
+            keys.append("enter")
+    return keys[:count]
+
+def main(count=5000):
+    path = os.path.join(tempfile.mkdtemp(), "session.cast")
+    out = Tee(StringIO(), path, width=80)
+    app = Peacock(running=False, line_length=80, out=out, keyboard=KeyDecoder())
+    for key in session(count):
+        app.handle(key)
+    out.close()
+
+    width, frames = load(path)
+    frames = analyze(frames, width)
+    total = sum(sum(frame.bytes.values()) for frame in frames)
+    moves = sum(frame.bytes["move"] for frame in frames)
+    sequences = sum(frame.counts["move"] for frame in frames)
+    merged = sum(1 for frame in frames for issue, _ in frame.issues
+                 if issue == "move after move")
+    print("keys:                {}".format(count))
+    print("bytes written:       {}".format(total))
+    print("bytes on moves:      {} in {} sequences".format(moves, sequences))
+    print("move after move:     {}".format(merged))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,46 @@
+"""
+    Measures driving an app from a script: a paragraph typed at the top of a
+    buffer, with a few cursor moves and deletes, handled key by key through
+    handle(), against the same keys passed to feed(), which draws once when
+    they have all been handled. Run from the directory containing the 
+    peacock package:
+        $ python -m peacock.benchmarks.feed 1000 20
+"""
+from io import StringIO
+import sys
+from time import perf_counter
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+
+SENTENCE = (list("The quick brown fox jumps over the lazy dog") + 
+            ["left"] * 4 + ["delete"] * 4 + ["enter"])
+
+def app_with_lines(count):
+    out = StringIO()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    app.write("\n".join("line {}".format(i) for i in range(count)))
+    app.move_cursor_to(0, 0)
+    return app, out
+
+def main(count=1000, sentences=20):
+    keys = SENTENCE * sentences
+    print("{} keys typed at the top of {} lines".format(len(keys), count))
+
+    results = []
+    for name in ("handle", "feed"):
+        app, out = app_with_lines(count)
+        start, size = perf_counter(), out.tell()
+        if name == "handle":
+            for key in keys:
+                app.handle(key)
+        else:
+            app.feed(keys)
+        elapsed = perf_counter() - start
+        print("  {:<8} {:8.3f} s {:>11} bytes".format(name, elapsed,
+                                                     out.tell() - size))
+        results.append(list(app._buffer))
+    assert results[0] == results[1]
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,61 @@
+"""
+    Measures how long the event loop takes to catch up with an arrow key
+    held down over a long file: the auto-repeated presses that piled up in
+    the keyboard's queue are handled one at a time, each drawing and
+    flushing its own cursor move, against being taken off the queue
+    together and handled as one counted move. Run from the directory
+    containing the peacock package:
+        $ python -m peacock.benchmarks.held_keys 2000 10000
+"""
+from io import StringIO
+import sys
+from time import perf_counter
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+
+class CountingOut(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.size = self.flushes = 0
+
+    def write(self, text):
+        self.size += len(text)
+        return len(text)
+
+    def flush(self):
+        self.flushes += 1
+
+def app_with_file(lines):
+    out = CountingOut()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    app.write("\n".join("line {} of the file".format(i) 
+                        for i in range(lines)))
+    app.move_cursor_to(0, 0)
+    out.size = out.flushes = 0
+    return app, out
+
+def run(name, presses, lines, coalesce):
+    app, out = app_with_file(lines)
+    # Holding down, then up
+    app.keyboard.feed("\033[B" * presses + "\033[A" * presses)
+    start = perf_counter()
+    calls = 0
+    # What the event loop does, until the queue is empty
+    key = app.keyboard.get_key_or_none()
+    while key:
+        app.handle(key, app._repeats(key) if coalesce else 1)
+        calls += 1
+        key = app.keyboard.get_key_or_none()
+    elapsed = perf_counter() - start
+    assert (app._x, app._y) == (0, 0)
+    print("  {:<10} {:>6} presses {:>6} handled {:8.3f} s {:>8} bytes "
+          "{:>6} flushes".format(name, 2 * presses, calls, elapsed, out.size,
+                                 out.flushes))
+
+def main(presses=2000, lines=10000):
+    run("one-by-one", presses, lines, False)
+    run("coalesced", presses, lines, True)
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""
+    Measures the event loop of a running app: the CPU it burns while the
+    user isn't typing, and how long a key takes to be handled after it's
+    read. The loop polling the keyboard's queue, as it did, spins a core;
+    sleeping on the keyboard's wakeup, it uses next to none. Run from the
+    directory containing the peacock package:
+        $ python -m peacock.benchmarks.idle_loop 1 200
+"""
+from io import StringIO
+import sys
+from time import perf_counter, process_time, sleep
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+
+class PollingDecoder(KeyDecoder):
+    # The loop as it was: straight back to polling
+    def wait(self, timeout=None):
+        return bool(len(self._ring))
+
+def run(name, keyboard, seconds, keys):
+    app = Peacock(running=False, out=StringIO(), keyboard=keyboard)
+    latencies = []
+
+    @app.on("ctrl+t")
+    def handled(app, *args):
+        latencies.append(perf_counter() - fed[0])
+
+    app.start()
+    try:
+        cpu = process_time()
+        sleep(seconds)
+        cpu = process_time() - cpu
+        for _ in range(keys):
+            fed = [perf_counter()]
+            count = len(latencies)
+            keyboard.feed("\x14")
+            while len(latencies) == count:
+                sleep(0.0005)
+    finally:
+        app.stop()
+        app.join()
+    latencies.sort()
+    print("  {:<8} {:6.1f}% CPU idle, key handled after {:7.1f} us (p50) "
+          "{:7.1f} us (p99)".format(name, cpu / seconds * 100,
+                                    latencies[len(latencies) // 2] * 1e6,
+                                    latencies[int(len(latencies) * 0.99)] * 1e6))
+
+def main(seconds=1, keys=200):
+    run("polling", PollingDecoder(), seconds, keys)
+    run("waking", KeyDecoder(), seconds, keys)
+
+if __name__ == "__main__":
+    main(*map(float, sys.argv[1:2]), *map(int, sys.argv[2:3]))
@@ -0,0 +1,44 @@
+"""
+    Measures the memory an Interact's per-line metadata takes on a large
+    buffer: first with nothing cached (as for lines that are never shown),
+    then once every line's column map and wrap have been built. The text of
+    the lines, and the output written, are not counted. Run from the
+    directory containing the peacock package:
+        $ python -m peacock.benchmarks.line_memory 1000000
+"""
+from io import StringIO
+import sys
+import tracemalloc
+
+from peacock.interact import InteractANSIMac
+
+class NullOut(StringIO):
+    def write(self, text):
+        return len(text)
+
+def main(count=1000000):
+    text = "\n".join("line {}".format(i) for i in range(count))
+    interact = InteractANSIMac(None, NullOut(), 120)
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    interact.write(text)
+
+    # The lines themselves are the same however the metadata is kept
+    lines = sys.getsizeof(interact._buffer) + sum(map(sys.getsizeof,
+                                                      interact._buffer))
+    empty = tracemalloc.get_traced_memory()[0] - start - lines
+
+    for y in range(count):
+        interact._wrap(y)
+    cached = tracemalloc.get_traced_memory()[0] - start - lines
+    tracemalloc.stop()
+
+    print("{} lines".format(count))
+    print("  nothing cached  {:>8.1f} MiB {:>6.1f} bytes/line".format(
+        empty / 2 ** 20, empty / count))
+    print("  all cached      {:>8.1f} MiB {:>6.1f} bytes/line".format(
+        cached / 2 ** 20, cached / count))
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
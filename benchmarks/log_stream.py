@@ -0,0 +1,81 @@
+"""
+    Measures tailing a log written line by line from a background thread:
+    writing each line to the app with app.write, which rewrites the trailing
+    output and flushes every time, appending each one to a buffer shown in
+    a window that follows it and drawing a frame, and writing them to a
+    stream, which the event loop appends to the buffer at 30 frames a
+    second. The window scrolls natively in both. Run from the directory
+    containing the peacock package:
+        $ python -m peacock.benchmarks.log_stream 100000 24
+"""
+from io import StringIO
+import sys
+from threading import Thread
+from time import perf_counter
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder, Window
+
+class CountingOut(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.size = self.flushes = 0
+
+    def write(self, text):
+        self.size += len(text)
+        return len(text)
+
+    def flush(self):
+        self.flushes += 1
+
+def lines(count):
+    return ("[{:06d}] GET /static/app.js 200 {} ms\n".format(i, i % 97)
+            for i in range(count))
+
+def report(name, count, elapsed, out, frames=None):
+    print("  {:<8} {:>7} lines {:8.3f} s {:>11} bytes {:>7} flushes{}".format(
+        name, count, elapsed, out.size, out.flushes,
+        "" if frames is None else " {:>5} frames".format(frames)))
+
+def by_write(count):
+    out = CountingOut()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    start = perf_counter()
+    thread = Thread(target=lambda: [app.write(line) for line in lines(count)])
+    thread.start()
+    thread.join()
+    report("write", count, perf_counter() - start, out)
+
+def by_append(count, height):
+    out = CountingOut()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    buffer = app.buffer("log")
+    app.layout(Window(buffer, follow=True), height)
+    start = perf_counter()
+    for line in lines(count):
+        buffer.append(line)
+        app.render()
+    report("append", count, perf_counter() - start, out)
+
+def by_stream(count, height):
+    out = CountingOut()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    log = app.stream("log")
+    app.layout(Window(app.buffer("log"), follow=True), height)
+    start = perf_counter()
+    thread = Thread(target=lambda: [log.write(line) for line in lines(count)])
+    thread.start()
+
+    # What the event loop does between keys
+    while thread.is_alive() or log.due(float("inf")):
+        app.flush_streams()
+    report("stream", count, perf_counter() - start, out, log.frames)
+    assert len(app.buffer("log")) == count + 1
+
+def main(count=100000, height=24):
+    by_write(count)
+    by_append(count, height)
+    by_stream(count, height)
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""
+    Measures playing a macro that comments out a line and moves down, over a
+    large buffer: handling its keys one at a time as they were typed, which
+    renders after every key, against Macros.play, which renders once when
+    all of them have been handled. Typing a key redraws the rest of the
+    buffer after it, so only the first few repetitions are typed. Run from
+    the directory containing the peacock package:
+        $ python -m peacock.benchmarks.macro_replay 100000 1000 10
+"""
+from io import StringIO
+import sys
+from time import perf_counter
+
+from peacock import Mode, Peacock
+from peacock.interact import KeyDecoder
+
+MACRO = ["i", "#", " ", "esc", "left", "left", "down"]
+
+def app_with_macro(count):
+    out = StringIO()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    app.write("\n".join("line {}".format(i) for i in range(count)))
+    app.move_cursor_to(0, 0)
+
+    app.add_mode(Mode("normal", keyboard=app.keyboard,
+                      parent=app.modes["insert"]))
+    app.on("i", mode="normal")(lambda app, *args: app.set_mode("insert"))
+    app.on("esc")(lambda app, *args: app.set_mode("normal"))
+    app.macros.bind("normal")
+    app.set_mode("normal")
+    app.macros.registers["a"] = MACRO
+    return app, out
+
+def report(name, times, elapsed, size):
+    print("  {:<12} {:>5} times {:8.3f} s {:>11} bytes {:9.3f} ms/time".format(
+        name, times, elapsed, size, elapsed / times * 1e3))
+
+def main(count=100000, times=1000, typed=10):
+    print("{} lines, macro of {} keys".format(count, len(MACRO)))
+
+    app, out = app_with_macro(count)
+    start, size = perf_counter(), out.tell()
+    for _ in range(typed):
+        for key in MACRO:
+            app.handle(key)
+    report("key by key", typed, perf_counter() - start, out.tell() - size)
+    expected = app._buffer[:typed]
+
+    app, out = app_with_macro(count)
+    start, size = perf_counter(), out.tell()
+    app.macros.play("a", times)
+    report("macro", times, perf_counter() - start, out.tell() - size)
+    assert app._buffer[:typed] == expected
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,44 @@
+"""
+    Measures what timing every handler costs: a session of arrow keys and
+    bound keys is fed through a headless app without a profiler, with one,
+    and with one capturing cProfile and sampling profiles of every key. Run
+    from the directory containing the peacock package:
+        $ python -m peacock.benchmarks.profiler 20000
+"""
+from io import StringIO
+import os
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+
+KEYS = ["left", "right", "up", "down", "ctrl+t"]
+
+def run(name, count, profile=None):
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.write("\n".join("line {}".format(i) for i in range(100)))
+    app.on("ctrl+t")(lambda app, line, x: app.move_cursor_to_x(len(line) // 2))
+    if profile:
+        profile(app.profile())
+    keys = [KEYS[i % len(KEYS)] for i in range(count)]
+    start = perf_counter()
+    for key in keys:
+        app.handle(key)
+    elapsed = perf_counter() - start
+    app.stop_profiling()
+    print("  {:<10} {:>6} keys {:8.3f} s {:8.2f} us per key".format(
+        name, count, elapsed, elapsed / count * 1e6))
+
+def main(count=20000):
+    run("off", count)
+    run("timed", count, lambda profiler: None)
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, "handlers")
+        run("cProfile", count, lambda profiler: profiler.capture(count, path))
+        run("sampled", count, lambda profiler: profiler.capture(
+            count, path, sampling=True))
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
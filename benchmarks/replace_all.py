@@ -0,0 +1,62 @@
+"""
+    Measures replacing every match of a regular expression across a large 
+    buffer with replace_all, and undoing it, against making the same 
+    replacements by moving to each match, deleting it and writing the 
+    replacement, on the first few thousand lines. Run from the directory 
+    containing the peacock package:
+        $ python -m peacock.benchmarks.replace_all 1000000 2000
+"""
+from io import StringIO
+import re
+import sys
+from time import perf_counter
+
+from peacock.interact import InteractANSIMac
+
+PATTERN, REPL = r"\bvalue\b", "amount"
+
+def make(count):
+    interact = InteractANSIMac(None, StringIO(), 120)
+    # A match on every 10th line
+    interact.write("\n".join("{} = value + {}".format("total", i) if i % 10 
+                             == 0 else "line {} of the file".format(i) 
+                             for i in range(count)))
+    interact.out.truncate(0)
+    interact.out.seek(0)
+    return interact
+
+def by_hand(interact):
+    pattern = re.compile(PATTERN)
+    for y, line in enumerate(list(interact._buffer)):
+        for match in reversed(list(pattern.finditer(line))):
+            interact.move_cursor_to(match.end(), y)
+            interact.delete(match.end() - match.start())
+            interact.write(REPL)
+
+def report(name, count, elapsed, interact):
+    print("  {:<16} {:>8} lines {:8.3f} s {:>11} bytes".format(
+        name, count, elapsed, len(interact.out.getvalue())))
+
+def main(count=1000000, by_hand_count=2000):
+    interact = make(by_hand_count)
+    start = perf_counter()
+    by_hand(interact)
+    report("delete + write", by_hand_count, perf_counter() - start, 
+           interact)
+    expected = list(interact._buffer)
+
+    interact = make(count)
+    start = perf_counter()
+    replaced = interact.replace_all(PATTERN, REPL)
+    report("replace_all", count, perf_counter() - start, interact)
+    assert interact._buffer[:by_hand_count] == expected
+    assert replaced == (count + 9) // 10
+
+    interact.out.truncate(0)
+    interact.out.seek(0)
+    start = perf_counter()
+    interact.undo()
+    report("undo", count, perf_counter() - start, interact)
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
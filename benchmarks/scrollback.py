@@ -0,0 +1,63 @@
+"""
+    Measures the memory a long running app's buffer holds, and the time
+    spent writing to it, as it's written line after line: keeping every
+    line, against a scrollback capped at a number of lines, with and without
+    spilling the evicted lines to a file. Run from the directory containing
+    the peacock package:
+        $ python -m peacock.benchmarks.scrollback 200000 10000
+"""
+from io import StringIO
+import os
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+
+from peacock.interact import InteractANSIMac, Scrollback
+
+class NullOut(StringIO):
+    def write(self, text):
+        return len(text)
+
+def write(count, scrollback=None):
+    interact = InteractANSIMac(None, NullOut(), 120)
+    interact.scrollback = scrollback
+    for i in range(count):
+        interact.write("[{:07d}] worker {} finished a job\n".format(i, i % 8))
+    return interact
+
+def run(name, count, scrollback=None):
+    # Timed on its own, as tracing every allocation takes longer than the
+    # writes do, then again to trace what it holds
+    start = perf_counter()
+    interact = write(count, scrollback and scrollback())
+    elapsed = perf_counter() - start
+    kept = len(interact._buffer) - interact._first
+    if interact.scrollback:
+        interact.scrollback.close()
+    del interact
+    tracemalloc.start()
+    interact = write(count, scrollback and scrollback())
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("  {:<10} {:>8} lines kept {:8.3f} s {:8.1f} MiB held "
+          "{:8.1f} MiB peak".format(name, kept, elapsed, held / 2 ** 20, 
+                                    peak / 2 ** 20))
+    return interact
+
+def main(count=200000, max_lines=10000):
+    print("{} lines written".format(count))
+    run("unbounded", count)
+    run("capped", count, lambda: Scrollback(max_lines=max_lines))
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, "spill.log")
+        with open(path, "a") as spill:
+            interact = run("spilled", count, 
+                           lambda: Scrollback(max_lines=max_lines, 
+                                              spill=spill))
+        with open(path) as spill:
+            # Both runs spilled to the file
+            assert sum(1 for _ in spill) == 2 * interact.scrollback.evicted
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""
+    Measures what an idle session costs in a peacock Server: memory per
+    session, threads, and CPU used by the loop while nobody is typing.
+    Sessions run on local PTYs. Run from the directory containing the
+    peacock package:
+        $ python -m peacock.benchmarks.server_sessions 200
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from peacock.peacock.server import Server
+
+def setup(app):
+    @app.on("ctrl+x")
+    def shout(app, *args):
+        app.write("!")
+
+def main(count=200, idle=2.0):
+    server = Server(setup)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    masters = [server.spawn()[1] for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Type a key into every session, so each one has drawn something
+    for master in masters:
+        os.write(master, b"a")
+    while server.poll(0.05):
+        pass
+
+    loop = threading.Thread(target=server.run)
+    loop.start()
+    cpu = time.process_time()
+    time.sleep(idle)
+    cpu = time.process_time() - cpu
+    threads = threading.active_count()
+    server.stop()
+    loop.join()
+    for master in masters:
+        os.close(master)
+
+    print("sessions:            {}".format(count))
+    print("memory per session:  {:.1f} KiB".format((after - before) / count / 1024))
+    print("threads:             {}".format(threads))
+    print("idle CPU:            {:.2f} ms over {:.0f} s".format(cpu * 1000, idle))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
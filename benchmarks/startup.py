@@ -0,0 +1,78 @@
+"""
+    Measures how long importing peacock and constructing an app take, and
+    what constructing an app does to the process and the terminal: how many
+    threads it leaves running, and whether stdin was taken out of cooked
+    mode. Each measurement runs in a fresh interpreter whose stdin is a PTY,
+    as it would be in a terminal. Run from the directory containing the
+    peacock package:
+        $ python -m peacock.benchmarks.startup 20
+"""
+import os
+import pty
+import subprocess
+import sys
+import tempfile
+
+IMPORT = """
+from time import perf_counter
+start = perf_counter()
+import peacock
+print(perf_counter() - start)
+"""
+
+CONSTRUCT = """
+from io import StringIO
+import os, sys, termios, threading
+from time import perf_counter
+from peacock import Peacock
+before = termios.tcgetattr(sys.stdin)
+start = perf_counter()
+app = Peacock(out=StringIO(), running={running})
+elapsed = perf_counter() - start
+print(elapsed, threading.active_count() - 1,
+      int(termios.tcgetattr(sys.stdin) != before))
+app.stop()
+sys.stdout.flush()
+
+# Older keyboards blocked reading stdin could abort a normal shutdown, and
+# this has to run against them too, to compare
+os._exit(0)
+"""
+
+def measure(code, runs, cache):
+    """
+        Runs 'code' in 'runs' fresh interpreters with a PTY for stdin, after
+        one run to fill the bytecode cache, so that compiling isn't timed
+        :param cache: str - directory to keep the bytecode in
+        :return: [[float]] - the numbers each run printed
+    """
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONPYCACHEPREFIX=cache)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    results = []
+    for _ in range(runs + 1):
+        master, slave = pty.openpty()
+        try:
+            output = subprocess.run([sys.executable, "-c", code], stdin=slave,
+                                    stdout=subprocess.PIPE, env=env,
+                                    check=True, timeout=30).stdout
+        finally:
+            os.close(master)
+            os.close(slave)
+        results.append([float(value) for value in output.split()])
+    return results[1:]
+
+def main(runs=20):
+    cache = tempfile.mkdtemp()
+    imports = sorted(result[0] for result in measure(IMPORT, runs, cache))
+    print("import peacock        {:7.2f} ms (median)".format(
+        imports[len(imports) // 2] * 1e3))
+    for running in (False, True):
+        results = sorted(measure(CONSTRUCT.format(running=running), runs,
+                                 cache))
+        elapsed, threads, cbreak = results[len(results) // 2]
+        print("Peacock(running={!s:<5}) {:7.2f} ms (median), {} threads, "
+              "terminal {}".format(running, elapsed * 1e3, int(threads),
+                                   "changed" if cbreak else "untouched"))
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,71 @@
+"""
+    Measures the bytes it takes to draw syntax highlighted code with a 256
+    color/24-bit color theme, wrapping every run in its full style and a
+    reset, against render_runs, which only writes the attributes that change
+    between runs. Needs Pygments. Run from the directory containing the
+    peacock package:
+        $ python -m peacock.benchmarks.styled_output [file.py]
+"""
+import os
+import sys
+from time import perf_counter
+
+from pygments.lexers import PythonLexer
+from pygments.token import Token
+
+from peacock import format
+from peacock.format.styled import render_runs, slice_runs
+from peacock.interact import Highlighter, PygmentsLineLexer
+
+# Neighbouring tokens share colors and attributes, as in most themes
+THEME = {Token.Keyword: "#c792ea,bold",
+         Token.Name.Function: "#82aaff,bold",
+         Token.Name.Class: "#ffcb6b,bold,underline",
+         Token.Name.Builtin: "#82aaff",
+         Token.Name: "#eeffff",
+         Token.String: "#c3e88d",
+         Token.Comment: "245",
+         Token.Number: "#f78c6c",
+         Token.Operator: "#89ddff",
+         Token.Punctuation: "#89ddff",
+         Token.Text: "#eeffff"}
+
+def wrapped(text, runs):
+    """
+        How runs were rendered before: a full style and a reset around each
+    """
+    output, pos = [], 0
+    for length, style in slice_runs(runs, 0, len(text)):
+        chunk = text[pos:pos + length]
+        pos += length
+        if style:
+            output.append(format.style(style) + chunk + format.style_off)
+        else:
+            output.append(chunk)
+    output.append(text[pos:])
+    return "".join(output)
+
+def measure(render, lines, runs):
+    start = perf_counter()
+    size = sum(len(render(line, line_runs).encode("utf-8"))
+               for line, line_runs in zip(lines, runs))
+    return size, perf_counter() - start
+
+def main(path):
+    with open(path, encoding="utf-8") as source:
+        lines = source.read().split("\n")
+    highlighter = Highlighter(PygmentsLineLexer(PythonLexer()), THEME)
+    runs = [highlighter.runs(lines, y) for y in range(len(lines))]
+    plain = sum(len(line.encode("utf-8")) for line in lines)
+
+    print("{} lines, {} bytes of text".format(len(lines), plain))
+    for name, render in (("full style per run", wrapped),
+                         ("style transitions", render_runs)):
+        size, elapsed = measure(render, lines, runs)
+        print("  {:<20} {:>8} bytes ({:>6} of escapes) {:.3f} s".format(
+            name, size, size - plain, elapsed))
+
+if __name__ == "__main__":
+    default = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                           "peacock", "peacock.py")
+    main(sys.argv[1] if len(sys.argv) > 1 else default)
@@ -0,0 +1,48 @@
+"""
+    Times formatting a styled table with format.rows, against calling
+    format() on every cell and measuring the results by hand. Run from the
+    directory containing the peacock package:
+        $ python -m peacock.benchmarks.table_rows 100000
+"""
+import sys
+from time import perf_counter
+
+from peacock import format
+
+TEMPLATE = "{|bold} {:>8.2f|green} {} {|blue}"
+
+def table(count):
+    return [("row{}".format(i), i * 1.5, i % 7 == 0, "日本" * (i % 3))
+            for i in range(count)]
+
+def by_hand(rows):
+    cells = [[format("{|bold}", name), format("{:>8.2f|green}", value),
+              format("{}", flag), format("{|blue}", text)]
+             for name, value, flag, text in rows]
+    widths = [max(format.width(row[i]) for row in cells) for i in range(4)]
+    return [" ".join(cell + " " * (widths[i] - format.width(cell))
+                     for i, cell in enumerate(row)) for row in cells]
+
+def main(count=100000):
+    rows = table(count)
+
+    start = perf_counter()
+    lines = by_hand(rows)
+    hand = perf_counter() - start
+
+    start = perf_counter()
+    for line in format.rows(TEMPLATE, rows):
+        pass
+    batch = perf_counter() - start
+
+    start = perf_counter()
+    first = next(format.rows(TEMPLATE, rows, widths=[9, 11, 5, 6]))
+    streamed = perf_counter() - start
+
+    print("rows:                      {}".format(count))
+    print("format() per cell:         {:.3f} s".format(hand))
+    print("format.rows:               {:.3f} s".format(batch))
+    print("first line, widths given:  {:.6f} s".format(streamed))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
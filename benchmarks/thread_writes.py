@@ -0,0 +1,63 @@
+"""
+    Measures writing to a running app from another thread. Each write made
+    directly draws and flushes on its own (and, with the event loop running,
+    races with its handlers); queued for the loop, the writes waiting when
+    it gets to them are made as one batch and drawn once. Run from the
+    directory containing the peacock package:
+        $ python -m peacock.benchmarks.thread_writes 20000
+"""
+from io import StringIO
+import sys
+from threading import Thread
+from time import perf_counter
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+
+class CountingOut(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.size = self.flushes = 0
+
+    def write(self, text):
+        self.size += len(text)
+        return len(text)
+
+    def flush(self):
+        self.flushes += 1
+
+def report(name, count, elapsed, out):
+    print("  {:<8} {:>6} writes {:8.3f} s {:>9} bytes {:>6} flushes".format(
+        name, count, elapsed, out.size, out.flushes))
+
+def direct(count):
+    out = CountingOut()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    start = perf_counter()
+    thread = Thread(target=lambda: [app.write("{} ".format(i)) 
+                                    for i in range(count)])
+    thread.start()
+    thread.join()
+    report("direct", count, perf_counter() - start, out)
+
+def queued(count):
+    out = CountingOut()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    app.start()
+    start = perf_counter()
+    futures = []
+    thread = Thread(target=lambda: futures.extend(
+        app.write("{} ".format(i)) for i in range(count)))
+    thread.start()
+    thread.join()
+    futures[-1].result()
+    report("queued", count, perf_counter() - start, out)
+    app.stop()
+    app.join()
+
+def main(count=20000):
+    direct(count)
+    queued(count)
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
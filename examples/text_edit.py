@@ -2,10 +2,10 @@ from inspect import getsource
 from importlib import import_module
 from pygments.lexers import get_lexer_for_filename
 from pygments.token import Token
-from re import sub
 import sys
 sys.path.append("/Users/jamesmcnamara/workspace/sandbox/python/peacock")
 from peacock import Peacock, write, format
+from peacock.interact import Highlighter, PygmentsLineLexer
 
 
 app = Peacock()
@@ -30,21 +30,12 @@ def parse(filename, func):
     mod_name = filename[:filename.rfind(".")]
     mod = import_module(mod_name, package=__package__)
     code = getsource(getattr(mod, func))
-    lexer = get_lexer_for_filename(filename)
-    output = ""
-    args = []
-    for tok, text in lexer.get_tokens(code):
-        text = sub("(?<!\\ )\{", "{{", text)
-        text = sub("(?<!\\ )\}", "}}", text)
-        while tok not in syntax_highlighting: 
-            tok = tok.parent
-        color = syntax_highlighting[tok]
-        if color == '':
-            output += text
-        else:
-            output += "{|" + color + "}"
-            args.append(text)
-    return format(output, *args)
+
+    # The highlighter styles the code as it is rendered, and only re-lexes
+    # the lines that change, so the buffer itself stays plain text
+    lexer = PygmentsLineLexer(get_lexer_for_filename(filename))
+    app.highlighter = Highlighter(lexer, syntax_highlighting)
+    return code
 
 @app.init()
 def init():
@@ -0,0 +1,6 @@
+from .format import _format_factory
+
+# Initialize the format closure
+format = _format_factory()
+
+from .styled import StyledText
@@ -1,4 +1,6 @@
-from itertools import chain, zip_longest, repeat
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import chain, count, zip_longest, repeat
 from re import search, compile
 
 def _format_factory():
@@ -51,6 +53,18 @@ def _format_factory():
 
     # turn off color styling code
     STYLE_OFF = "{}0;m".format(ESCAPE_SEQ)
+
+    # matches a graphics escape sequence, capturing its parameters
+    SGR_RE = compile("\033\\[([0-9;]*)m")
+
+    # maps the codes in a graphics escape sequence back to attribute names
+    FG_NAMES = {code.rstrip(";"): name for name, code in FG_MAP.items()}
+    BG_NAMES = {code.rstrip(";"): name for name, code in BG_MAP.items() 
+                if name != "negative"}
+
+    # codes that turn each attribute back off, without touching the others
+    OFF_MAP = {"1": "22", "4": "24", "5": "25", "7": "27", "8": "28"}
+    OFF_NAMES = {off: FG_NAMES[on] for on, off in OFF_MAP.items()}
     
 
     ################################ IMPLEMENTATION ###########################
@@ -72,6 +86,48 @@ def _format_factory():
         # peacock_attrs would hold 'blue;orange'
         peacock_attrs = PEACOCK_ATTRS_RE.search(fmt_spec).group()
 
+        # trim fmt_spec to be acceptable to str.format()
+        raw_fmt_spec = REMOVE_PEACOCK_RE.sub("", fmt_spec)
+        return "".join((style(peacock_attrs), raw_fmt_spec, STYLE_OFF))
+
+    def color(attr, attr_map):
+        """
+            Returns the code for a single attribute. Besides the names in the
+            map, colors can be given as a number from the 256 color palette,
+            or as "#rrggbb" (or "#rgb") for 24-bit color
+            ex: '208' will return "38;5;208" as a foreground
+            :param attr: str - attribute name
+            :param attr_map: dict - FG_MAP or BG_MAP
+            :return: str
+        """
+        if attr in attr_map:
+            return attr_map[attr].rstrip(";")
+        extended = "38" if attr_map is FG_MAP else "48"
+        if attr.isdigit() and int(attr) < 256:
+            return "{};5;{}".format(extended, int(attr))
+        if attr.startswith("#") and len(attr) in (4, 7):
+            digits = attr[1:] if len(attr) == 7 else \
+                     "".join(digit * 2 for digit in attr[1:])
+            try:
+                rgb = [int(digits[i:i + 2], 16) for i in (0, 2, 4)]
+            except ValueError:
+                raise KeyError(attr)
+            return "{};2;{};{};{}".format(extended, *rgb)
+        raise KeyError(attr)
+
+    @lru_cache(maxsize=1024)
+    def codes(peacock_attrs):
+        """
+            Returns the escape sequence code for each attribute in the 
+            peacock part of a format specification
+            ex: 'blue,bold;208' will return ("34", "1", "48;5;208")
+            :param peacock_attrs: str - foreground attributes, optionally 
+                followed by a ';' and background attributes
+            :return: (str)
+        """
+        if not peacock_attrs:
+            return ()
+
         if ";" in peacock_attrs:
             fg_attrs, bg_attrs = peacock_attrs.split(";")
 
@@ -80,19 +136,294 @@ def _format_factory():
                              zip(bg_attrs.lower().split(","), repeat(BG_MAP)))
         else:
             attr_map = zip(peacock_attrs.lower().split(","), repeat(FG_MAP))
-        
-        
-        # attrs holds the attribute strings which will be added to the string
-        # at the end of preprocessing
-        attrs = [map[attr.strip()] for attr, map in attr_map] 
-        
-        # trim fmt_spec to be acceptable to str.format()
-        raw_fmt_spec = REMOVE_PEACOCK_RE.sub("", fmt_spec)
+
+        # A background on its own (";blue") leaves an empty foreground
+        return tuple(color(attr.strip(), map) for attr, map in attr_map 
+                     if attr.strip())
+
+    @lru_cache(maxsize=1024)
+    def style(peacock_attrs):
+        """
+            Consumes the peacock part of a format specification and returns
+            the escape sequence that turns those attributes on. Empty 
+            specifications have no escape sequence
+            ex: 'blue,bold;cyan' will return "\033[34;1;46;m"
+            :param peacock_attrs: str - foreground attributes, optionally 
+                followed by a ';' and background attributes
+            :return: str
+        """
+        if not peacock_attrs:
+            return ""
 
         # format string starts with escape sequence, concatenates all 
         # user-specified strings ends with an 'm' to designate graphics
-        attr_string = ESCAPE_SEQ + "".join(attrs) + "m"
-        return "".join((attr_string, raw_fmt_spec, STYLE_OFF))
+        return ESCAPE_SEQ + "".join(code + ";" for code in codes(peacock_attrs))\
+               + "m"
+
+    @lru_cache(maxsize=1024)
+    def attributes(peacock_attrs):
+        """
+            Breaks a specification down into the state it puts the terminal
+            in: the attributes that are on, the foreground color and the 
+            background color, each as its escape sequence code
+            ex: 'blue,bold;208' will return (frozenset({"1"}), "34", 
+                "48;5;208")
+            :param peacock_attrs: str
+            :return: (frozenset, str or None, str or None)
+        """
+        attrs, fg, bg = set(), None, None
+        for code in codes(peacock_attrs):
+            if code in OFF_MAP:
+                attrs.add(code)
+            elif code.startswith("3"):
+                fg = code
+            else:
+                bg = code
+        return frozenset(attrs), fg, bg
+
+    @lru_cache(maxsize=4096)
+    def transition(old, new):
+        """
+            Returns the shortest escape sequence that takes the terminal from
+            one style to another: either turning off just the attributes that
+            'new' doesn't have and turning on just the ones it adds, or 
+            resetting and starting again, whichever takes fewer bytes. 
+            Renderers that track the style the terminal is in can use this
+            between neighbouring runs, rather than wrapping every run in a
+            full style and a reset
+            ex: transition('blue,bold', 'blue;red') will return "\033[22;41m"
+            :param old: str - the style in effect, "" for none
+            :param new: str - the style wanted
+            :return: str
+        """
+        old_attrs, old_fg, old_bg = attributes(old)
+        new_attrs, new_fg, new_bg = attributes(new)
+        changes = [OFF_MAP[attr] for attr in sorted(old_attrs - new_attrs)]
+        if old_fg and not new_fg:
+            changes.append("39")
+        if old_bg and not new_bg:
+            changes.append("49")
+        changes += sorted(new_attrs - old_attrs)
+        changes += [code for code, previous in ((new_fg, old_fg), 
+                                                (new_bg, old_bg))
+                    if code and code != previous]
+        if not changes:
+            return ""
+
+        reset = ["0"] + sorted(new_attrs) + [code for code in (new_fg, new_bg)
+                                             if code]
+        codes = min(changes, reset, key=lambda codes: len(";".join(codes)))
+        return ESCAPE_SEQ + ";".join(codes) + "m"
+
+    def parse(text):
+        """
+            The inverse of format: splits text containing graphics escape 
+            sequences into the plain text and the style runs it describes. 
+            Styles are given as peacock specifications, so that they can be
+            turned back into escape sequences with style()
+            ex: "a\033[34;1;mbc\033[0;m" will return ("abc", [(1, ""), 
+                (2, "bold,blue")])
+            :param text: str - text that may contain escape sequences
+            :return: (str, [(int, str)]) - the plain text, and (length, style)
+                runs covering it
+        """
+        plain, runs = [], []
+        attrs, fg, bg = [], None, None
+        pos = 0
+        for match in SGR_RE.finditer(text):
+            chunk = text[pos:match.start()]
+            if chunk:
+                fg_attrs = ",".join(attrs + ([fg] if fg else []))
+                plain.append(chunk)
+                runs.append((len(chunk), fg_attrs + (";" + bg if bg else "")))
+            pos = match.end()
+
+            # An empty parameter list is a reset, but the trailing ';' that
+            # format() leaves in its sequences is not
+            params = match.group(1)
+            params = iter(params.split(";") if params else ["0"])
+            for code in params:
+                if code == "0":
+                    attrs, fg, bg = [], None, None
+                elif code in ("38", "48"):
+                    if code == "38":
+                        fg = extended_color(params)
+                    else:
+                        bg = extended_color(params)
+                elif code in OFF_NAMES:
+                    if OFF_NAMES[code] in attrs:
+                        attrs.remove(OFF_NAMES[code])
+                elif code in ("39", "49"):
+                    if code == "39":
+                        fg = None
+                    else:
+                        bg = None
+                elif code in BG_NAMES:
+                    bg = BG_NAMES[code]
+                elif code.startswith("3") and code in FG_NAMES:
+                    fg = FG_NAMES[code]
+                elif code in FG_NAMES and FG_NAMES[code] not in attrs:
+                    attrs.append(FG_NAMES[code])
+
+        chunk = text[pos:]
+        if chunk:
+            plain.append(chunk)
+            runs.append((len(chunk), ",".join(attrs + ([fg] if fg else [])) 
+                                     + (";" + bg if bg else "")))
+
+        # Merge neighbours that ended up with the same style
+        merged = []
+        for length, style in runs:
+            if merged and merged[-1][1] == style:
+                merged[-1] = (merged[-1][0] + length, style)
+            else:
+                merged.append((length, style))
+        return "".join(plain), merged
+
+    def extended_color(params):
+        """
+            Reads the rest of a 256 color (5;n) or 24-bit color (2;r;g;b)
+            code from a graphics escape sequence's parameters, and returns it
+            as a peacock color
+            ex: iter(["2", "255", "136", "0"]) will return "#ff8800"
+            :param params: iter - the parameters after the 38 or 48
+            :return: str
+        """
+        if next(params, "") == "5":
+            return str(int(next(params, "") or 0))
+        return "#{:02x}{:02x}{:02x}".format(*(int(next(params, "") or 0) 
+                                              for _ in range(3)))
+
+    def compile_template(template):
+        """
+            Splits a format string into its literal text and its fields, once,
+            so that it can be applied to many rows cheaply. Auto-numbered 
+            fields ("{}", "{:.2f}") are numbered, so that each field can be 
+            formatted on its own with the whole row as its arguments
+            ex: "{} = {:.2f|green}" will return (["", " = ", ""], 
+                [("{0}".format, "", ""), 
+                 ("{1:.2f}".format, "\033[32;m", "\033[0;m")])
+            :param template: str - format string
+            :return: ([str], [(method, str, str)]) - the literal text around 
+                the fields, and for each field the function that formats it,
+                and the escape sequences that go before and after it
+        """
+        texts = FMT_RE.split(template)
+        fields = []
+        auto = count()
+        for fmt_spec in FMT_RE.findall(template):
+            prefix = suffix = ""
+            if "|" in fmt_spec:
+                prefix = style(PEACOCK_ATTRS_RE.search(fmt_spec).group())
+                suffix = STYLE_OFF if prefix else ""
+                fmt_spec = REMOVE_PEACOCK_RE.sub("", fmt_spec)
+            inner = fmt_spec[1:-1]
+            if inner[:1] in ("", ":", "!"):
+                fmt_spec = "{" + str(next(auto)) + inner + "}"
+            fields.append((fmt_spec.format, prefix, suffix))
+        return texts, fields
+
+    def width(text):
+        """
+            Returns the number of terminal columns text takes up, ignoring
+            any graphics escape sequences in it and counting wide characters
+            as two columns
+            :param text: str
+            :return: int
+        """
+        if "\033" in text:
+            text = SGR_RE.sub("", text)
+        if text.isascii():
+            return len(text)
+        return wide_width(text)
+
+    @lru_cache(maxsize=4096)
+    def wide_width(text):
+        # Imported here, as peacock.interact depends on this module
+        from peacock.interact.width import ColumnMap
+        return ColumnMap(text).width
+
+    def rows(template, rows, align="<", widths=None):
+        """
+            Formats many rows with the same template, lining their fields up
+            into columns. The template is compiled once, and each field is
+            padded to the widest value in its column, measured in terminal
+            columns, so escape sequences and wide characters don't throw the
+            columns off. Lines are generated lazily; the rows are formatted
+            and measured in a single pass the first time a line is needed, 
+            or not at all ahead of time when the widths are given
+            ex: list(format.rows("{} | {:.1f|green}", [("a", 1), ("bcd", 10)],
+                                 align="<>"))
+                will return ["a   |  \033[32;m1.0\033[0;m", 
+                             "bcd | \033[32;m10.0\033[0;m"]
+            :param template: str - format string with one field per column
+            :param rows: iter - sequences of values, one per row. Mappings
+                are used for named fields
+            :param align: str - "<", ">" or "^" for all of the columns, or one
+                of those per column
+            :param widths: [int] - the width of each column, if known. The 
+                rows are then streamed without being looked at ahead of time
+            :return: generator of str
+        """
+        texts, fields = compile_template(template)
+        if len(align) == 1:
+            align = align * len(fields)
+
+        # A left aligned last column isn't padded if nothing comes after it
+        last = len(fields) - 1 if not texts[-1] else None
+
+        formatters = [fmt for fmt, _, _ in fields]
+
+        def cells(row):
+            if isinstance(row, Mapping):
+                row = [fmt(**row) for fmt in formatters]
+            else:
+                row = [fmt(*row) for fmt in formatters]
+            return row, [width(cell) for cell in row]
+
+        # For each column, the text before it, the styles around it, and how
+        # it is padded: 0 on the right, 1 on the left, 2 on both sides, and
+        # 3 not at all
+        layout = []
+        for i, (text, (_, prefix, suffix)) in enumerate(zip(texts, fields)):
+            side = {">": 1, "^": 2}.get(align[i], 3 if i == last else 0)
+            layout.append((text, prefix, suffix, side))
+
+        def lines(table, widths):
+            end = texts[-1]
+            for row, row_widths in table:
+                parts = []
+                for cell, cell_width, column_width, (text, prefix, suffix, 
+                        side) in zip(row, row_widths, widths, layout):
+                    # The padding goes outside the styles, so that underlines
+                    # and backgrounds stop where the text does
+                    pad = column_width - cell_width
+                    if side == 0:
+                        parts += text, prefix, cell, suffix, " " * pad
+                    elif side == 1:
+                        parts += text, " " * pad, prefix, cell, suffix
+                    elif side == 2:
+                        parts += (text, " " * (pad // 2), prefix, cell, suffix,
+                                  " " * (pad - pad // 2))
+                    else:
+                        parts += text, prefix, cell, suffix
+                parts.append(end)
+                yield "".join(parts)
+
+        if widths is not None:
+            return lines(map(cells, rows), widths)
+
+        def measured():
+            # Format and measure every row in one pass, keeping the results
+            # so the second pass only has to pad and join them
+            table = []
+            widths = [0] * len(fields)
+            for row in rows:
+                row = cells(row)
+                table.append(row)
+                widths = list(map(max, widths, row[1]))
+            yield from lines(table, widths)
+        return measured()
 
     def format(fmt, *args):
         """
@@ -115,5 +446,14 @@ def _format_factory():
         # string, pass the call to str.format
         return "".join(fmt_string).format(*args)
 
+    # The renderers need the raw escape sequences for styles that never pass
+    # through a format string, so they are exposed on the closure
+    format.style = style
+    format.style_off = STYLE_OFF
+    format.transition = transition
+    format.attributes = attributes
+    format.parse = parse
+    format.rows = rows
+    format.width = width
     return format    
 
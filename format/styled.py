@@ -0,0 +1,178 @@
+from functools import lru_cache
+
+from peacock.format import format
+
+class StyledText(str):
+    """
+        A string that carries its own styles, as run-length encoded
+        (length, style) runs, where each style is a peacock specification
+        such as "blue,bold;cyan". Because the styles live beside the text
+        rather than in it, StyledText can be written to an app like any other
+        string, and the buffer never sees an escape sequence. E.g.:
+        >>> text = StyledText("hello world", [(5, "red"), (6, "")])
+        >>> text == "hello world"
+        True
+        >>> app.write(text)
+        >>> app.write(StyledText.from_ansi(format("{|blue}", "!")))
+    """
+
+    def __new__(cls, text, runs=None):
+        """
+            :param text: str - the plain text
+            :param runs: [(int, str)] - (length, style) runs covering the text
+                (newlines included). Any text not covered is unstyled
+        """
+        self = super().__new__(cls, text)
+        self.runs = merge_runs(runs or [])
+        return self
+
+    @classmethod
+    def from_ansi(cls, text):
+        """
+            Builds a StyledText from a string with graphics escape sequences
+            embedded in it, such as the output of format()
+            :param text: str
+            :return: StyledText
+        """
+        return cls(*format.parse(text))
+
+    def line_runs(self):
+        """
+            Splits the runs at each newline, so that there is one list of runs
+            per line of the text. Unstyled lines get None
+            :return: [[(int, str)] or None]
+        """
+        return split_runs(self.runs, [len(line) for line in self.split("\n")])
+
+
+def merge_runs(runs):
+    """
+        Drops empty runs and merges neighbouring runs with the same style
+        :param runs: [(int, str)]
+        :return: [(int, str)]
+    """
+    merged = []
+    for length, style in runs:
+        if length <= 0:
+            continue
+        if merged and merged[-1][1] == style:
+            merged[-1] = (merged[-1][0] + length, style)
+        else:
+            merged.append((length, style))
+    return merged
+
+def slice_runs(runs, start, end):
+    """
+        Returns the runs covering [start, end) of the text that 'runs' covers
+        :param runs: [(int, str)]
+        :param start: int
+        :param end: int
+        :return: [(int, str)]
+    """
+    sliced = []
+    pos = 0
+    for length, style in runs:
+        lo, hi = max(pos, start), min(pos + length, end)
+        pos += length
+        if lo < hi:
+            sliced.append((hi - lo, style))
+        if pos >= end:
+            break
+    return sliced
+
+def split_runs(runs, lengths):
+    """
+        Splits runs over newline separated text into one list of runs per
+        line, given the length of each line. Lines whose runs are all unstyled
+        get None, so that plain text costs nothing to store
+        :param runs: [(int, str)]
+        :param lengths: [int] - length of each line, excluding its newline
+        :return: [[(int, str)] or None]
+    """
+    lines = []
+    pos = 0
+    for length in lengths:
+        line = merge_runs(slice_runs(runs, pos, pos + length))
+        lines.append(line if any(style for _, style in line) else None)
+        pos += length + 1
+    return lines
+
+def join_runs(line_runs, lengths):
+    """
+        The inverse of split_runs: joins per-line runs back into runs over
+        the newline separated text
+        :param line_runs: [[(int, str)] or None]
+        :param lengths: [int] - length of each line, excluding its newline
+        :return: [(int, str)]
+    """
+    runs = []
+    for i, (line, length) in enumerate(zip(line_runs, lengths)):
+        if i:
+            runs.append((1, ""))
+        runs.extend(pad_runs(line or [], length))
+    return merge_runs(runs)
+
+def pad_runs(runs, length):
+    """
+        Returns runs that cover exactly 'length' characters, padding with
+        unstyled text or cutting off the excess
+    """
+    covered = sum(run_length for run_length, _ in runs)
+    if covered < length:
+        return runs + [(length - covered, "")]
+    return slice_runs(runs, 0, length)
+
+def restyle_runs(runs, start, end, style, length):
+    """
+        Returns new runs for a line of 'length' characters, where [start, end)
+        has been given 'style'
+        :param runs: [(int, str)] or None
+        :return: [(int, str)] or None
+    """
+    runs = pad_runs(runs or [], length)
+    restyled = merge_runs(slice_runs(runs, 0, start) + [(end - start, style)] +
+                          slice_runs(runs, end, length))
+    return restyled if any(style for _, style in restyled) else None
+
+@lru_cache(maxsize=1024)
+def blank_look(style):
+    """
+        Returns what the given style looks like on spaces: which of underline
+        and negative are on, and the colors that can be seen
+        :param style: str
+        :return: (frozenset, str or None, str or None)
+    """
+    attrs, fg, bg = format.attributes(style)
+    return attrs & {"4", "7"}, fg if "7" in attrs else None, bg
+
+def render_runs(text, runs, start=0):
+    """
+        Renders 'text', which starts at column 'start' of a line styled by
+        'runs', as a string with the style escape sequences embedded, for
+        writing to a terminal. The style the terminal is in is tracked from
+        run to run, so that only the attributes that change between them are
+        written, and the terminal is left unstyled at the end (erasing fills
+        with the current background). Runs of spaces keep the current style
+        when they would look no different in their own
+        :param text: str - a slice of a line
+        :param runs: [(int, str)] - (length, style) runs for the whole line
+        :param start: int - where in the line 'text' starts
+        :return: str
+    """
+    output = []
+    current = ""
+    pos, end = start, start + len(text)
+    for length, style in slice_runs(runs, start, end):
+        chunk = text[pos - start:pos - start + length]
+        pos += length
+        # Spaces only show the background (and underlines, and the
+        # foreground when negative), so they can be written in whatever style
+        # is current if it looks the same on them
+        if chunk.strip(" ") or blank_look(current) != blank_look(style):
+            output.append(format.transition(current, style))
+            current = style
+        output.append(chunk)
+
+    # Anything the runs didn't cover goes out unstyled
+    output.append(format.transition(current, "") + text[pos - start:])
+    return "".join(output)
@@ -1,2 +1,7 @@
 from .interact import InteractANSIMac, _BufferInteract
-from .keyboard import MacKeyboard
+from .keyboard import MacKeyboard, KeyDecoder
+from .highlight import Highlighter, PygmentsLineLexer
+from .complete import Completer, WordTrie
+from .window import Buffer, Window, Split, Compositor
+from .stream import Stream
+from .scrollback import Scrollback
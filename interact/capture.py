@@ -0,0 +1,409 @@
+import json
+from re import compile
+import sys
+from time import perf_counter, time
+
+from .width import char_width
+
+class Tee:
+    """
+        Wraps an app's 'out', passing everything through while recording each
+        flushed frame, with its timing, to an asciicast (v2) file that can be
+        played back with asciinema, or broken down with analyze(). E.g.:
+        >>> app = Peacock(out=Tee(sys.stdout, "session.cast"))
+        >>> ...
+        >>> app.out.close()
+    """
+
+    def __init__(self, out, file, width=120, height=24):
+        """
+            :param out: file-descriptor - the real output
+            :param file: str - path of the asciicast file to write
+            :param width: int - columns in the terminal
+            :param height: int - rows in the terminal
+        """
+        self.out = out
+        self.file = open(file, "w", encoding="utf-8")
+        self.file.write(json.dumps({"version": 2, "width": width,
+                                    "height": height,
+                                    "timestamp": int(time())}) + "\n")
+        self._start = perf_counter()
+        self._pending = []
+
+    def write(self, text):
+        self.out.write(text)
+        self._pending.append(text)
+        return len(text)
+
+    def flush(self):
+        """
+            Everything written since the last flush is recorded as one frame
+        """
+        self.out.flush()
+        if self._pending:
+            event = [round(perf_counter() - self._start, 6), "o",
+                     "".join(self._pending)]
+            self.file.write(json.dumps(event) + "\n")
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __getattr__(self, name):
+        # Anything else (fileno, isatty...) goes to the real output
+        return getattr(self.out, name)
+
+
+def load(file):
+    """
+        Reads an asciicast file
+        :param file: str
+        :return: (int, [(float, str)]) - the terminal width, and the time and
+            text of each output event
+    """
+    with open(file, encoding="utf-8") as cast:
+        header = json.loads(cast.readline())
+        frames = []
+        for line in cast:
+            at, kind, text = json.loads(line)
+            if kind == "o":
+                frames.append((at, text))
+    return header.get("width", 80), frames
+
+
+################################################################################
+################################### ANALYSIS ###################################
+################################################################################
+
+# Each match is one escape sequence, control character, or run of text
+TOKEN_RE = compile(r"\033\[([0-9;?]*)([A-Za-z])|\033([78])|([\r\n\b])|"
+                   r"([^\033\r\n\b]+)|(\033)")
+
+# The codes of the tokens that move the cursor, and that erase
+MOVES = set("ABCDGHf\r\n\b78")
+ERASES = set("JK")
+SCROLLS = set("rS")
+
+# The kinds of redundant output analyze() looks for
+ISSUES = ("move after move", "empty erase", "erase and identical rewrite",
+          "unchanged rewrite", "unchanged style")
+
+class Frame:
+    """
+        The breakdown of a single frame: how many sequences of each kind it
+        had, how many bytes they took, and anything redundant in it
+    """
+
+    def __init__(self, at):
+        self.at = at
+        self.counts = {"move": 0, "erase": 0, "style": 0, "text": 0}
+        self.bytes = dict.fromkeys(self.counts, 0)
+
+        # (issue, detail) for each redundancy found, where issue is one of
+        # the ISSUES
+        self.issues = []
+
+    def add(self, kind, token):
+        self.counts[kind] += 1
+        self.bytes[kind] += len(token.encode("utf-8"))
+
+    def flag(self, issue, detail):
+        self.issues.append((issue, detail))
+
+
+class Screen:
+    """
+        Just enough of a terminal to know what is on screen: a cursor, and a
+        (character, style) for each cell that has been written. Used to tell
+        whether an erase or a rewrite actually changed anything
+    """
+
+    def __init__(self, width):
+        self.width = width
+        self.row = self.col = 0
+        self.style = (frozenset(), None, None)
+        self.cells = {}
+        self._saved = (0, 0)
+
+        # (top, bottom) rows of the scrolling region, or None for the whole
+        # screen
+        self._region = None
+
+    def play(self, output):
+        """
+            Applies everything in 'output' to the screen, e.g. to see what
+            an app's output leaves on a terminal
+            :param output: str
+        """
+        for match in TOKEN_RE.finditer(output):
+            params, code, esc, control, text, stray = match.groups()
+            params = params.split(";") if params else []
+            code = code or esc or control
+            if text:
+                self.text(text)
+            elif code in MOVES:
+                self.move(code, params)
+            elif code in ERASES:
+                self.erase(code, params)
+            elif code in SCROLLS:
+                self.scroll(code, params)
+            elif code == "m":
+                self.set_style(params)
+
+    def move(self, code, params):
+        n = int(params[0]) if params and params[0] else 1
+
+        # A cursor waiting to wrap after filling a row is really on its last
+        # column, which is where any move starts from
+        self.col = min(self.col, self.width - 1)
+        if code == "A":
+            self.row = max(0, self.row - n)
+        elif code == "B":
+            self.row += n
+        elif code == "C":
+            self.col = min(self.width - 1, self.col + n)
+        elif code == "D":
+            self.col = max(0, self.col - n)
+        elif code == "G":
+            self.col = min(self.width - 1, n - 1)
+        elif code in "Hf":
+            self.row = int(params[0]) - 1 if params and params[0] else 0
+            self.col = int(params[1]) - 1 if len(params) > 1 and params[1] \
+                       else 0
+        elif code == "\r":
+            self.col = 0
+        elif code == "\n":
+            # Terminals in cbreak mode still translate newlines to CR+LF
+            self.row, self.col = self.row + 1, 0
+        elif code == "\b":
+            self.col = max(0, self.col - 1)
+        elif code == "7":
+            self._saved = (self.row, self.col)
+        elif code == "8":
+            self.row, self.col = self._saved
+
+    def scroll(self, code, params):
+        """
+            Sets the scrolling region ("r"), which also homes the cursor, or
+            scrolls the region's rows up ("S")
+        """
+        if code == "r":
+            self._region = (int(params[0]) - 1, int(params[1]) - 1) \
+                           if len(params) == 2 else None
+            self.row = self.col = 0
+            return
+        n = int(params[0]) if params and params[0] else 1
+        top, bottom = self._region or (0, max(self.cells or [(0, 0)])[0])
+        scrolled = {}
+        for (row, col), value in self.cells.items():
+            if not top <= row <= bottom:
+                scrolled[(row, col)] = value
+            elif row - n >= top:
+                scrolled[(row - n, col)] = value
+        self.cells = scrolled
+
+    def erase(self, code, params):
+        """
+            Clears cells, and returns the cells that had something in them
+            :return: {(int, int): (str, tuple)}
+        """
+        mode = params[0] if params and params[0] else "0"
+
+        # A cursor waiting to wrap is on the last column, which is erased,
+        # and it stops waiting
+        row, col = self.row, min(self.col, self.width - 1)
+        self.col = col
+        if code == "K":
+            def cleared(r, c):
+                return r == row and (mode == "2" or (mode == "0") == (c >= col))
+        else:
+            def cleared(r, c):
+                return mode in ("2", "3") or \
+                       ((r, c) >= (row, col)) == (mode == "0")
+        erased = {cell: value for cell, value in self.cells.items()
+                  if cleared(*cell) and value[0] != " "}
+        for cell in [cell for cell in self.cells if cleared(*cell)]:
+            del self.cells[cell]
+        return erased
+
+    def set_style(self, params):
+        """
+            Applies a graphics sequence to the current style, which is kept
+            as (attributes, foreground, background) so that turning an
+            attribute off, or a color back to the default, is understood
+        """
+        attrs, fg, bg = self.style
+
+        # Like parse(), the trailing ';' that format() leaves isn't a reset
+        params = iter([param for param in params if param] or ["0"])
+        for param in params:
+            if param == "0":
+                attrs, fg, bg = frozenset(), None, None
+            elif param in ("38", "48"):
+                # 256 color (5;n) and 24-bit color (2;r;g;b)
+                kind = next(params, "")
+                color = ";".join([param, kind] + [next(params, "") for _ in
+                                                  range(1 if kind == "5" 
+                                                        else 3)])
+                if param == "38":
+                    fg = color
+                else:
+                    bg = color
+            elif param in ("39", "49"):
+                if param == "39":
+                    fg = None
+                else:
+                    bg = None
+            elif len(param) == 2 and param[0] in "349" or \
+                 param.startswith("10"):
+                if param[0] in "39":
+                    fg = param
+                else:
+                    bg = param
+            elif len(param) == 2 and param[0] == "2":
+                # 22 turns off both bold (1) and faint (2)
+                attrs = attrs - ({"1", "2"} if param == "22" else {param[1]})
+            else:
+                attrs = attrs | {param}
+        self.style = (attrs, fg, bg)
+
+    def text(self, text):
+        """
+            Prints text at the cursor
+            :return: [((int, int), (str, tuple), (str, tuple))] - each cell
+                written, with what was there before and what is there now
+        """
+        written = []
+        for ch in text:
+            width = char_width(ch)
+            if not width:
+                continue
+            if self.col + width > self.width:
+                self.row, self.col = self.row + 1, 0
+            cell = (self.row, self.col)
+            new = (ch, self.style)
+            written.append((cell, self.cells.get(cell), new))
+            self.cells[cell] = new
+
+            # Filling the last column leaves the cursor there, until the next
+            # character wraps it
+            self.col += width
+        return written
+
+
+def analyze(frames, width=120):
+    """
+        Breaks each frame down into cursor moves, erases, style changes and
+        text, and flags redundant output:
+            * a cursor move straight after another move
+            * an erase that cleared nothing
+            * an erase followed by rewriting exactly what it erased
+            * text that rewrote identical content
+            * a style change to the style already in effect
+        Moves and erases are judged against a model of the screen built up
+        from every frame before
+        :param frames: [(float, str)] - time and text of each frame, as
+            returned by load()
+        :param width: int - columns in the terminal
+        :return: [Frame]
+    """
+    screen = Screen(width)
+    analyzed = []
+    for at, output in frames:
+        frame = Frame(at)
+        previous = None
+
+        # Cells erased in this frame -> (the erase, what they held), and for
+        # each erase, [cells rewritten differently, cells rewritten the same,
+        # cells erased]
+        erased = {}
+        rewrites = []
+        for match in TOKEN_RE.finditer(output):
+            token = match.group(0)
+            params, code, esc, control, text, stray = match.groups()
+            params = params.split(";") if params else []
+            code = code or esc or control
+            if text:
+                frame.add("text", token)
+                written = screen.text(text)
+                if written and all(old == new for _, old, new in written):
+                    frame.flag("unchanged rewrite", text)
+                for cell, _, new in written:
+                    if cell in erased:
+                        number, value = erased.pop(cell)
+                        rewrites[number][1 if value == new else 0] += 1
+                kind = "text"
+            elif stray:
+                frame.add("text", token)
+                kind = "text"
+            elif code in MOVES:
+                frame.add("move", token)
+                if previous == "move" and not (control and control in "\r\n"):
+                    frame.flag("move after move", token)
+                screen.move(code, params)
+                kind = "move"
+            elif code in ERASES:
+                frame.add("erase", token)
+                cleared = screen.erase(code, params)
+                if not cleared:
+                    frame.flag("empty erase", token)
+                for cell, value in cleared.items():
+                    erased[cell] = (len(rewrites), value)
+                rewrites.append([0, 0, len(cleared)])
+                kind = "erase"
+            elif code in SCROLLS:
+                frame.add("move", token)
+                screen.scroll(code, params)
+                kind = "other"
+            elif code == "m":
+                frame.add("style", token)
+                style = screen.style
+                screen.set_style(params)
+                if screen.style == style:
+                    frame.flag("unchanged style", token)
+                kind = "style"
+            else:
+                # Anything else (e.g. showing or hiding the cursor) is rare
+                # enough to lump in with the moves
+                frame.add("move", token)
+                kind = "other"
+            previous = kind
+
+        for different, same, count in rewrites:
+            if count and same == count and not different:
+                frame.flag("erase and identical rewrite",
+                           "{} cells".format(count))
+        analyzed.append(frame)
+    return analyzed
+
+def report(frames):
+    """
+        Summarises analyzed frames as text: the bytes spent on each kind of
+        output, and how often each kind of redundancy occurred
+        :param frames: [Frame]
+        :return: str
+    """
+    counts = {kind: 0 for kind in ("move", "erase", "style", "text")}
+    sizes = dict(counts)
+    issues = dict.fromkeys(ISSUES, 0)
+    for frame in frames:
+        for kind in counts:
+            counts[kind] += frame.counts[kind]
+            sizes[kind] += frame.bytes[kind]
+        for issue, _ in frame.issues:
+            issues[issue] += 1
+
+    total = sum(sizes.values()) or 1
+    lines = ["{} frames, {} bytes".format(len(frames), sum(sizes.values()))]
+    for kind in counts:
+        lines.append("  {:<6} {:>7} sequences {:>9} bytes {:>5.1f}%".format(
+            kind, counts[kind], sizes[kind], 100 * sizes[kind] / total))
+    for issue, count in issues.items():
+        if count:
+            lines.append("  {:>7} x {}".format(count, issue))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    width, frames = load(sys.argv[1])
+    print(report(analyze(frames, width)))
@@ -0,0 +1,301 @@
+from collections import Counter
+import re
+
+from .ring import LineRing
+
+# What counts as a word: an identifier, in any script
+WORD = re.compile(r"[^\W\d]\w*")
+
+class _Node:
+    """
+        One node of a WordTrie. Nodes are made for every prefix of a word
+        that was counted, so they are kept as small as possible
+    """
+    __slots__ = ("children", "count", "best")
+
+    def __init__(self):
+        # str -> _Node, or None until the node has a child
+        self.children = None
+
+        # How many times the word ending here was counted
+        self.count = 0
+
+        # The most frequent words under this node, as (-count, word), most
+        # frequent first, or None when it has to be worked out again
+        self.best = None
+
+
+class WordTrie:
+    """
+        Prefix trie of words and how often each occurs. Every node caches
+        the most frequent words under it, so the top candidates for a
+        prefix are one walk down the trie, plus re-merging the caches on the
+        paths of the words whose counts changed since the last lookup. E.g.:
+        >>> trie = WordTrie()
+        >>> trie.add("peacock", 2)
+        >>> trie.add("peahen")
+        >>> trie.top("pea")
+        ['peacock', 'peahen']
+    """
+
+    def __init__(self, limit=10):
+        """
+            :param limit: int - the most candidates a lookup can return
+        """
+        self.limit = limit
+
+        # Private Variables
+        self._root = _Node()
+
+    def __contains__(self, word):
+        node = self._find(word)
+        return node is not None and node.count > 0
+
+    def count(self, word):
+        """
+            Returns how many times 'word' was counted
+        """
+        node = self._find(word)
+        return node.count if node else 0
+
+    def add(self, word, count=1):
+        """
+            Counts 'word' 'count' more times. Negative counts uncount it, and
+            words counted down to zero are removed
+            :param word: str
+            :param count: int
+        """
+        node, path = self._root, []
+        for ch in word:
+            path.append((node, ch))
+            node.best = None
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _Node()
+            node = child
+        node.best = None
+        node.count = max(0, node.count + count)
+
+        # Prune the nodes that no longer lead to any word
+        while path and not node.count and not node.children:
+            parent, ch = path.pop()
+            del parent.children[ch]
+            if not parent.children:
+                parent.children = None
+            node = parent
+
+    def update(self, counts):
+        """
+            Adds the counts of many words at once
+            :param counts: {str: int} - e.g. a collections.Counter
+        """
+        for word, count in counts.items():
+            if count:
+                self.add(word, count)
+
+    def top(self, prefix="", k=None):
+        """
+            Returns the most frequent words starting with 'prefix', most
+            frequent first, and alphabetically among words that are as
+            frequent
+            :param prefix: str
+            :param k: int - how many to return, at most 'limit'
+            :return: [str]
+        """
+        node = self._find(prefix)
+        if node is None:
+            return []
+        k = self.limit if k is None else min(k, self.limit)
+        return [word for _, word in self._best(node, prefix)[:k]]
+
+    def _find(self, prefix):
+        """
+            Returns the node reached by 'prefix', or None
+        """
+        node = self._root
+        for ch in prefix:
+            if node.children is None:
+                return None
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def _best(self, node, word):
+        """
+            Returns the cached best words under 'node', which is reached by
+            'word', merging its children's caches if it was invalidated
+        """
+        if node.best is None:
+            best = [(-node.count, word)] if node.count else []
+            if node.children:
+                for ch, child in node.children.items():
+                    best += self._best(child, word + ch)
+                best.sort()
+            node.best = best[:self.limit]
+        return node.best
+
+
+class Completer:
+    """
+        Keeps a WordTrie of the words in a buffer up to date as the buffer
+        is edited, so that completing a word never rescans the buffer. Like
+        the Highlighter, it's told about each edit, and counts the edited
+        lines lazily: the words of the lines an edit replaces are uncounted
+        straight away, and the lines that replaced them are only counted on
+        the next lookup. The first lookup counts the whole buffer. E.g.:
+        >>> completer = Completer()
+        >>> completer.complete(["import peacock", "pea"], "pea")
+        ['peacock']
+    """
+
+    # Words longer than this are never worth completing
+    MAX_LENGTH = 64
+
+    def __init__(self, limit=10, pattern=WORD):
+        """
+            :param limit: int - the most candidates complete() returns
+            :param pattern: str or re.Pattern - what counts as a word
+        """
+        self.limit = limit
+        self.pattern = re.compile(pattern)
+
+        # Private Variables
+        # The trie is asked for one more word than is returned, since the
+        # prefix being completed is usually a word of its own
+        self._trie = WordTrie(limit + 1)
+
+        # The text each line's words were counted from, or None for lines
+        # that haven't been counted since they were edited. None until the
+        # buffer is first counted, as there is nothing to keep up to date
+        self._texts = None
+
+        # [(start, stop)] - the ranges of lines that are None in _texts,
+        # sorted and apart
+        self._stale = []
+
+        # Matches the word that ends at the end of the text searched
+        self._tail = re.compile("(?:{})$".format(self.pattern.pattern),
+                                self.pattern.flags)
+
+    def reset(self, lines=0, first=0):
+        """
+            Forgets every word, and makes room for 'lines' lines, none of
+            which have been counted
+            :param lines: int - number of lines in the buffer
+            :param first: int - index of the first line kept in the buffer,
+                when it's a LineRing
+        """
+        self._trie = WordTrie(self.limit + 1)
+        self._texts = LineRing([None] * (lines - first), first) if first \
+                      else [None] * lines
+        self._stale = [(first, lines)] if lines > first else []
+
+    def evict(self, count):
+        """
+            Notifies the completer that the oldest 'count' lines of the
+            buffer are about to be evicted (see Scrollback). Their words are
+            uncounted, and the lines kept keep their indices
+            :param count: int - number of lines evicted
+        """
+        if self._texts is None:
+            return
+        if not isinstance(self._texts, LineRing):
+            self._texts = LineRing(self._texts)
+        self._trie.update(self._counts(self._texts.evict(count), -1))
+        first = self._texts.first
+        self._stale = [(max(a, first), b) for a, b in self._stale 
+                       if b > first]
+
+    def edit(self, start, removed, inserted):
+        """
+            Notifies the completer that 'removed' lines starting at 'start'
+            are replaced by 'inserted' new lines. It doesn't matter whether
+            the buffer has been changed yet
+            :param start: int - first line that was edited
+            :param removed: int - number of lines that were replaced
+            :param inserted: int - number of lines that replaced them
+        """
+        if self._texts is None:
+            return
+        stop = start + removed
+        self._trie.update(self._counts(self._texts[start:stop], -1))
+        self._texts[start:stop] = [None] * inserted
+
+        # Stale ranges after the edit move with their lines, and the lines
+        # it inserted are stale
+        shift, stale = inserted - removed, []
+        for a, b in self._stale:
+            if b <= start:
+                stale.append((a, b))
+            elif a >= stop:
+                stale.append((a + shift, b + shift))
+            else:
+                if a < start:
+                    stale.append((a, start))
+                if b > stop:
+                    stale.append((stop + shift, b + shift))
+        stale.append((start, start + inserted))
+        stale.sort()
+
+        self._stale = []
+        for a, b in stale:
+            if a == b:
+                continue
+            if self._stale and a <= self._stale[-1][1]:
+                a, end = self._stale.pop()
+                b = max(b, end)
+            self._stale.append((a, b))
+
+    def complete(self, lines, prefix, k=None):
+        """
+            Returns the words in the buffer that 'prefix' could be completed
+            to, most frequent first, counting any edited lines first. The
+            prefix itself isn't one of them
+            :param lines: [str] - the buffer
+            :param prefix: str - the start of the word
+            :param k: int - how many to return, at most 'limit'
+            :return: [str]
+        """
+        self._count(lines)
+        k = self.limit if k is None else min(k, self.limit)
+        return [word for word in self._trie.top(prefix, k + 1)
+                if word != prefix][:k]
+
+    def prefix(self, line, x):
+        """
+            Returns the part of the word ending at 'x' in 'line' that comes
+            before 'x', which is what gets completed there
+            :param line: str
+            :param x: int
+            :return: str
+        """
+        match = self._tail.search(line, 0, x)
+        return match.group() if match else ""
+
+    def _count(self, lines):
+        """
+            Counts the words of every stale line
+        """
+        if self._texts is None or len(self._texts) != len(lines):
+            # We missed an edit notification. There is no telling which
+            # lines moved, so start from scratch
+            self.reset(len(lines), getattr(lines, "first", 0))
+        for a, b in self._stale:
+            self._texts[a:b] = lines[a:b]
+            self._trie.update(self._counts(lines[a:b], 1))
+        self._stale = []
+
+    def _counts(self, lines, sign):
+        """
+            Returns how many times each word occurs in 'lines', times 'sign'.
+            Lines that are None are skipped
+        """
+        findall, counts = self.pattern.findall, Counter()
+        for line in lines:
+            if line:
+                counts.update(findall(line))
+        return {word: sign * count for word, count in counts.items()
+                if len(word) <= self.MAX_LENGTH}
@@ -0,0 +1,291 @@
+from .ring import LineRing
+
+class Highlighter:
+    """
+        Incremental syntax highlighter. Rather than lexing the whole buffer
+        on every render, the highlighter caches the lexer state at the start
+        and end of every line along with that line's style runs. After an
+        edit, only the edited lines are re-lexed, and re-lexing stops as soon
+        as a line starts in the same state it started in last time, since
+        everything after it must lex identically.
+        Lines are only lexed when someone asks for their runs, so lines that
+        are never shown are never lexed. E.g.:
+        >>> lexer = PygmentsLineLexer(PythonLexer())
+        >>> highlighter = Highlighter(lexer, {Token.Keyword: "yellow,bold"})
+        >>> highlighter.runs(["def f():", "    pass"], 1)
+        [(4, ''), (4, 'yellow,bold')]
+    """
+
+    def __init__(self, lexer, styles):
+        """
+            :param lexer: (str, state) -> ([(str, token)], state) - callable
+                that lexes a single line starting in the given state, and
+                returns the line's tokens and the state the next line starts
+                in. States must be comparable with '=='. If the lexer has an
+                'initial' attribute, it is used as the state of the first line
+            :param styles: dict: token -> str - maps tokens to peacock style
+                specifications (e.g. "blue,bold;cyan"). Tokens that are not
+                in the map are looked up by their 'parent', if they have one
+        """
+        self.lexer = lexer
+        self.styles = styles
+        self.initial = getattr(lexer, "initial", None)
+
+        # Private Variables
+        # For each line we cache the text it was lexed from, the state it
+        # started and ended in, and the resulting style runs. The first
+        # '_valid' lines are known to be up to date
+        self._texts = []
+        self._starts = []
+        self._ends = []
+        self._runs = []
+        self._valid = 0
+
+        # The first line still in the buffer, once a scrollback has evicted
+        # the lines before it, and the state it starts in. The caches are 
+        # LineRings then, like the buffer, so lines keep their indices
+        self._first = 0
+        self._first_state = self.initial
+
+        # token -> style cache, so the parent chain is only walked once per
+        # token type
+        self._resolved = {}
+
+    def reset(self, lines=0, first=0):
+        """
+            Drops every cached line, and makes room for 'lines' lines
+            :param lines: int - number of lines in the buffer
+            :param first: int - index of the first line kept in the buffer,
+                when it's a LineRing
+        """
+        if first != self._first:
+            # The state the first line kept starts in is only known from 
+            # lexing the lines before it
+            self._first, self._first_state = first, self.initial
+        if first:
+            self._texts, self._starts, self._ends, self._runs = (
+                LineRing([None] * (lines - first), first) for _ in range(4))
+        else:
+            self._texts = [None] * lines
+            self._starts = [None] * lines
+            self._ends = [None] * lines
+            self._runs = [None] * lines
+        self._valid = first
+
+    def evict(self, lines, count):
+        """
+            Notifies the highlighter that the oldest 'count' lines of 'lines'
+            are about to be evicted (see Scrollback). Lines that weren't 
+            lexed yet are lexed first, to find the state the first line kept
+            starts in
+            :param lines: [str] or LineRing - the buffer
+            :param count: int - number of lines evicted
+        """
+        first = getattr(lines, "first", 0) + count
+        self._lex_through(lines, first - 1)
+        self._first, self._first_state = first, self._ends[first - 1]
+        if not isinstance(self._runs, LineRing):
+            self._texts, self._starts, self._ends, self._runs = (
+                LineRing(cache) for cache in (self._texts, self._starts, 
+                                              self._ends, self._runs))
+        for cache in (self._texts, self._starts, self._ends, self._runs):
+            cache.evict(count)
+        self._valid = max(self._valid, first)
+
+    def edit(self, start, removed, inserted):
+        """
+            Notifies the highlighter that 'removed' lines starting at 'start'
+            were replaced by 'inserted' new lines. The cache entries for the
+            lines after the edit are shifted, not dropped, so they can be
+            reused if their starting state turns out to be unchanged
+            :param start: int - first line that was edited
+            :param removed: int - number of lines that were replaced
+            :param inserted: int - number of lines that replaced them
+        """
+        stop = start + removed
+        for cache in (self._texts, self._starts, self._ends, self._runs):
+            cache[start:stop] = [None] * inserted
+        self._valid = min(self._valid, start)
+
+    def runs(self, lines, y):
+        """
+            Returns the style runs of line 'y', lexing any stale lines before
+            it first
+            :param lines: [str] - the buffer
+            :param y: int - index of the line to highlight
+            :return: [(int, str)] - (length, style) runs covering the line
+        """
+        self._lex_through(lines, y)
+        return self._runs[y]
+
+    def highlight(self, lines, first, last):
+        """
+            Returns the style runs of the lines from 'first' up to but not
+            including 'last'. Nothing after 'last' is lexed, so a renderer
+            should only ask for the lines in its viewport
+            :param lines: [str] - the buffer
+            :param first: int - index of the first line to highlight
+            :param last: int - index after the last line to highlight
+            :return: [[(int, str)]]
+        """
+        last = min(last, len(lines))
+        self._lex_through(lines, last - 1)
+        return self._runs[first:last]
+
+    def _lex_through(self, lines, y):
+        """
+            Brings the cache up to date for every line up to and including 'y'
+        """
+        if len(self._runs) != len(lines):
+            # We missed an edit notification. There is no telling which
+            # lines moved, so start from scratch
+            self.reset(len(lines), getattr(lines, "first", 0))
+
+        i = max(self._valid, self._first)
+        state = self._ends[i - 1] if i > self._first else self._first_state
+        while i <= y:
+            line = lines[i]
+            if self._starts[i] != state or self._texts[i] != line:
+                # Either the line changed, or the line before it ended in a
+                # different state than it used to; either way re-lex
+                tokens, end = self.lexer(line, state)
+                self._texts[i] = line
+                self._starts[i] = state
+                self._ends[i] = end
+                self._runs[i] = self._to_runs(tokens)
+            state = self._ends[i]
+            i += 1
+        self._valid = max(self._valid, i)
+
+    def _to_runs(self, tokens):
+        """
+            Converts a line's tokens into run-length encoded styles, merging
+            adjacent tokens that share a style
+            :param tokens: [(str, token)]
+            :return: [(int, str)]
+        """
+        runs = []
+        for text, token in tokens:
+            if not text:
+                continue
+            style = self._style(token)
+            if runs and runs[-1][1] == style:
+                runs[-1] = (runs[-1][0] + len(text), style)
+            else:
+                runs.append((len(text), style))
+        return runs
+
+    def _style(self, token):
+        """
+            Looks up the style for the given token, walking up the token's
+            parents until a token with a style is found
+        """
+        try:
+            return self._resolved[token]
+        except KeyError:
+            pass
+        tok = token
+        while tok is not None and tok not in self.styles:
+            tok = getattr(tok, "parent", None)
+        style = self._resolved[token] = self.styles.get(tok, "")
+        return style
+
+
+class PygmentsLineLexer:
+    """
+        Adapts a Pygments RegexLexer so that it can be run one line at a time.
+        The state between lines is the lexer's state stack, so constructs
+        that span lines (e.g. triple quoted strings) are highlighted correctly
+        NOTE: Pygments is only imported by the caller, peacock itself does not
+        depend on it
+    """
+    initial = ("root",)
+
+    def __init__(self, lexer):
+        """
+            :param lexer: pygments.lexer.RegexLexer - an instantiated lexer
+        """
+        self.lexer = lexer
+
+        # RegexLexer compiles its token definitions into '_tokens' when it is
+        # instantiated
+        self.tokendefs = lexer._tokens
+
+    def __call__(self, line, state):
+        """
+            Lexes 'line', starting with the state stack 'state'. Mirrors the
+            loop in RegexLexer.get_tokens_unprocessed, but stops at the end
+            of the line and returns the state stack instead of discarding it
+            :param line: str - one line of text, without the newline
+            :param state: (str) - the state stack at the start of the line
+            :return: ([(str, token)], (str))
+        """
+        from pygments.token import Error
+
+        # Patterns are written against whole files, so give them the newline
+        # they expect, then trim it back off of the tokens
+        text = line + "\n"
+        stack = list(state)
+        statetokens = self.tokendefs[stack[-1]]
+        tokens = []
+        pos = 0
+        while pos < len(text):
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if not m:
+                    continue
+                if action is not None:
+                    if isinstance(action, tuple):
+                        # Token types are tuples, everything else is a
+                        # callback such as 'bygroups'
+                        tokens.append((m.group(), action))
+                    else:
+                        tokens.extend((value, token) for _, token, value
+                                      in action(self.lexer, m))
+                pos = m.end()
+                if new_state is not None:
+                    self._transition(stack, new_state)
+                    statetokens = self.tokendefs[stack[-1]]
+                break
+            else:
+                # No rule matched; emit an error token for the character and
+                # move on, like pygments does
+                tokens.append((text[pos], Error))
+                pos += 1
+        return self._trim(tokens, len(line)), tuple(stack)
+
+    @staticmethod
+    def _transition(stack, new_state):
+        """
+            Applies a pygments state transition to the state stack in place
+        """
+        if isinstance(new_state, tuple):
+            for st in new_state:
+                if st == "#pop":
+                    if len(stack) > 1:
+                        stack.pop()
+                elif st == "#push":
+                    stack.append(stack[-1])
+                else:
+                    stack.append(st)
+        elif isinstance(new_state, int):
+            if abs(new_state) >= len(stack):
+                del stack[1:]
+            else:
+                del stack[new_state:]
+        elif new_state == "#push":
+            stack.append(stack[-1])
+
+    @staticmethod
+    def _trim(tokens, length):
+        """
+            Cuts the tokens off after 'length' characters
+        """
+        trimmed = []
+        for text, token in tokens:
+            if length <= 0:
+                break
+            trimmed.append((text[:length], token))
+            length -= len(text)
+        return trimmed
+
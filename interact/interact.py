@@ -1,11 +1,129 @@
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
 from io import StringIO
-from itertools import count
+from itertools import count, islice
+import re
+
+from peacock.format.styled import (StyledText, join_runs, pad_runs, 
+                                   render_runs, restyle_runs, slice_runs, 
+                                   split_runs)
+from .line import Line
+from .motion import csi, plan_move
+from .ring import LineRing
+from .width import ColumnMap
+from .wrap import Wrap
+
+def framed(method):
+    """
+        Makes each call to an Interact method a single frame (see
+        Interact.frame), unless it's made inside a frame already
+    """
+    @wraps(method)
+    def framed_method(self, *args, **kwargs):
+        with self.frame():
+            return method(self, *args, **kwargs)
+    return framed_method
+
+def fits(line, line_length):
+    """
+        Whether 'line' is plain ASCII that fits on one row, which is all 
+        there is to know about how most lines are displayed
+    """
+    return len(line) <= line_length and line.isascii() and line.isprintable()
+
+def _shared_prefix(a, b):
+    """
+        Returns the length of the longest prefix strings 'a' and 'b' share,
+        comparing halves of what's left rather than a character at a time
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+class _Discard(StringIO):
+    """
+        Stands in for 'out' while rendering is suspended, so that anything
+        written goes nowhere
+    """
+
+    def write(self, text):
+        return len(text)
+
+
+class _Changes:
+    """
+        The block of lines that edits have touched since it was opened, and
+        what those lines were beforehand, so that what changed can be found
+        without copying the rest of the buffer. The block runs from line 
+        'first' up to the last 'after' lines of the buffer, and every line
+        outside of it is as it was. It only ever grows, and the lines it
+        takes in are copied from the buffer just before they're edited, so
+        keeping it costs as much as the lines edited, not the buffer
+    """
+    __slots__ = ("first", "after", "lines", "records")
+
+    def __init__(self):
+        # None until something is touched
+        self.first = self.after = None
+
+        # The text and Line records the block's lines had when it was 
+        # opened. Deques, as lines are taken in at either end
+        self.lines, self.records = deque(), deque()
+
+    def touch(self, buffer, records, start, after):
+        """
+            Widens the block to take in the lines from 'start' up to the 
+            last 'after' lines of the buffer, which are about to be edited
+            :param buffer: [str] - the buffer, as it is before the edit
+            :param records: [Line] - its Line records
+        """
+        end = len(buffer) - after
+        if self.first is None:
+            self.first, self.after = start, after
+            self.lines.extend(buffer[start:end])
+            self.records.extend(records[start:end])
+            return
+        if start < self.first:
+            self.lines.extendleft(reversed(buffer[start:self.first]))
+            self.records.extendleft(reversed(records[start:self.first]))
+            self.first = start
+        if after < self.after:
+            # The lines between the block's end and the edit's are as they
+            # were, wherever edits in the block have moved them to
+            block_end = len(buffer) - self.after
+            self.lines.extend(buffer[block_end:end])
+            self.records.extend(records[block_end:end])
+            self.after = after
+
+    def before(self, buffer, records, y):
+        """
+            Returns line y of the buffer as it was when the block was opened,
+            and its Line record
+        """
+        if self.first is not None and y >= self.first:
+            i = y - self.first
+            if i < len(self.lines):
+                return self.lines[i], self.records[i]
+            # After the block, lines have only moved
+            y += len(buffer) - self.after - self.first - len(self.lines)
+        return buffer[y], records[y]
+
 
 class Interact:
     """
         Abstract base class for the interactions. Supports a few common
         utility functions
     """
+
+    # How many changes undo() can go back through
+    UNDO_LIMIT = 100
  
     def __init__(self, keyboard, out, line_length):
         """
@@ -13,11 +131,28 @@ class Interact:
             :param out: file-descriptor - should be a TTY or PTY fd that is
                 connected to a terminal-emulator that supports ANSI control
                 sequences
-            :param line-length: int - line length supported in 'out'
+            :param line-length: int - line length supported in 'out'. Lines
+                longer than this are soft wrapped onto several display rows
         """
         self.keyboard = keyboard
         self.out = out
         self.line_length = line_length
+
+        # Optional peacock.interact.highlight.Highlighter. When set, lines are
+        # styled as they are written to 'out', but the buffer stays plain text
+        self.highlighter = None
+
+        # Optional peacock.interact.complete.Completer, kept up to date with
+        # the words in the buffer as it's edited
+        self.completer = None
+
+        # The items of the popup shown below the cursor's line, if any (see
+        # show_popup)
+        self.popup = None
+
+        # Optional peacock.interact.scrollback.Scrollback, capping how many
+        # of the oldest lines are kept
+        self.scrollback = None
     
         # Private Variables
         # Because the 'out' fd is a TTY, we can't read from it. In order to 
@@ -28,6 +163,225 @@ class Interact:
         self._buffer = [""]
         self.x, self.y = 0, 0
 
+        # A Line record for each line in the buffer, holding its style runs
+        # and its cached ColumnMap and Wrap, or None if there is nothing to
+        # keep for the line yet. Styles are kept beside the text so that
+        # escape sequences never end up in the buffer and throw off the 
+        # cursor math. _lines is edited alongside _buffer, so each record
+        # stays with its line
+        self._lines = [None]
+
+        # The index of the oldest line kept. Lines before it were evicted by
+        # the scrollback, and _buffer and _lines become LineRings, so that 
+        # the lines that are kept keep their indices (see _trim_scrollback)
+        self._first = 0
+
+        # Number of wrapped rows below the cursor's row that the next call to
+        # _delete_line_out must also clear
+        self._rows_below = 0
+
+        # While non-zero, edits are not reported to the per-line caches.
+        # Used by compound operations that report their net edit themselves
+        self._muted = 0
+
+        # How many frames deep the current call is. Output is only finished
+        # off when the outermost frame ends
+        self._depth = 0
+
+        # While non-zero, edits and moves only change the buffer and the
+        # cursor position, and nothing is written to 'out' (see suspended)
+        self._suspended = 0
+
+        # The _Changes of the current suspension, then those of each batch
+        # open inside it, innermost last. Every edit made while suspended
+        # is recorded in all of them
+        self._changes = []
+
+        # The changes undo() can revert, most recent last, as (first line, 
+        # the lines and Line records it replaced, the lines it put there, 
+        # and where the cursor was)
+        self._history = deque(maxlen=self.UNDO_LIMIT)
+
+        # The item of the popup that is highlighted, and how many of its 
+        # rows are on screen. Only what was drawn can be erased
+        self._popup_selected = None
+        self._popup_drawn = 0
+
+    @contextmanager
+    def frame(self):
+        """
+            Groups everything done inside it into one frame of output: the
+            cursor moves made are merged into one move, emitted only when
+            something is written or the frame ends, and 'out' is flushed
+            once at the end. Frames can be nested. E.g.:
+            >>> with interact.frame():
+            ...     interact.move_cursor(-1)
+            ...     interact.move_cursor(cols=4)
+        """
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self._end_frame()
+
+    def _end_frame(self):
+        """
+            Called when the outermost frame ends, for subclasses that buffer
+            output
+        """
+        pass
+
+    @contextmanager
+    def suspended(self):
+        """
+            Applies everything done inside it to the buffer alone, without
+            rendering anything, then brings 'out' up to date with a single
+            redraw of the lines that changed. Long runs of edits, 
+            such as a macro played many times, then cost only the edits 
+            themselves. Suspensions can be nested, and only the outermost
+            one redraws. E.g.:
+            >>> with interact.suspended():
+            ...     for y in range(1000):
+            ...         interact.move_cursor_to(0, y)
+            ...         interact.write("# ")
+        """
+        if self._suspended:
+            self._suspended += 1
+            try:
+                yield
+            finally:
+                self._suspended -= 1
+            return
+
+        with self.frame():
+            # The terminal's cursor has to be where the buffer's cursor is,
+            # so that the redraw knows where it starts from. The popup hides
+            # rows the redraw doesn't know about, so it's put back after
+            self._place_cursor()
+            self._erase_popup()
+            changes, x, y = _Changes(), self.x, self.y
+            self._changes = [changes]
+            out, self.out = self.out, _Discard()
+            self._suspended += 1
+            try:
+                yield
+            finally:
+                self._suspended -= 1
+                self._changes = []
+                self.out = out
+                self._redraw(changes, x, y)
+                self._draw_popup()
+                self._trim_scrollback()
+
+    @contextmanager
+    def batch(self):
+        """
+            Makes everything done inside it one change: like suspended(), 
+            nothing is drawn until it ends, and then only the lines that 
+            changed are redrawn. If it ends with an exception, the buffer 
+            and the cursor are put back as they were when it began, so 
+            there is nothing to redraw, and the exception is raised again.
+            Batches can be nested, and one that fails inside another only
+            undoes its own changes. Only Exceptions undo anything: when 
+            KeyboardInterrupt, SystemExit or GeneratorExit end a batch, what
+            it did is kept and drawn. E.g.:
+            >>> with interact.batch():
+            ...     interact.delete_line()
+            ...     interact.write(transposed)
+        """
+        with self.suspended():
+            # Like the suspension's, the batch's _Changes only takes in the
+            # lines that are edited inside it, which is all there is to put
+            # back
+            changes, x, y = _Changes(), self.x, self.y
+            self._changes.append(changes)
+            try:
+                yield
+            except Exception:
+                if changes.first is not None:
+                    first = changes.first
+                    end = len(self._buffer) - changes.after
+                    self._edited(first, end - first, len(changes.lines))
+                    self._buffer[first:end] = changes.lines
+                    self._lines[first:end] = changes.records
+                self.x, self.y = x, y
+                raise
+            finally:
+                self._changes.pop()
+
+    def _place_cursor(self):
+        """
+            Emits any cursor move that a subclass has queued
+        """
+        pass
+
+    def _redraw(self, changes, x, y):
+        """
+            Brings 'out' up to date with the buffer, after a suspension
+            changed it without rendering anything
+            :param changes: _Changes - what the suspension changed, from the
+                buffer that 'out' still shows
+            :param x, y: int - where the cursor was
+        """
+        raise NotImplementedError("All subclasses of Interact must "
+                                  "implement _redraw")
+
+    def _popup_out(self, items, selected):
+        """
+            Draws the popup's items on the rows below the cursor's line, and
+            returns the cursor to where it was
+        """
+        raise NotImplementedError("All subclasses of Interact must "
+                                  "implement _popup_out")
+
+    def _erase_popup_out(self, rows):
+        """
+            Puts back the text of the buffer on the 'rows' rows below the
+            cursor's line that the popup was drawn on
+        """
+        raise NotImplementedError("All subclasses of Interact must "
+                                  "implement _erase_popup_out")
+
+    def _changed_lines(self, changes):
+        """
+            Finds the block of lines that differ, in their text or their 
+            styles, between the current buffer and the buffer as it was when
+            'changes' was opened. Only the lines in its block can differ, and
+            lines that weren't touched are the same objects, so comparing 
+            them is cheap
+            :return: (int, int, int) or None - the first line that differs,
+                and where the lines that are the same again at the end of 
+                both begin, in the earlier buffer and then in this one. None
+                if nothing differs
+        """
+        first = changes.first
+        if first is None:
+            return None
+        old_end = first + len(changes.lines)
+        new_end = len(self._buffer) - changes.after
+        end = min(old_end, new_end)
+        while first < end and self._unchanged(changes, first, first):
+            first += 1
+        if first == end and old_end == new_end:
+            return None
+        while (old_end > first and new_end > first and 
+               self._unchanged(changes, old_end - 1, new_end - 1)):
+            old_end, new_end = old_end - 1, new_end - 1
+        return first, old_end, new_end
+
+    def _unchanged(self, changes, old, new):
+        # Whether line 'old' of the earlier buffer, which is in the block of
+        # 'changes', is line 'new' of the buffer
+        line = changes.lines[old - changes.first]
+        record = changes.records[old - changes.first]
+        if line is not self._buffer[new] and line != self._buffer[new]:
+            return False
+        now = self._lines[new]
+        return record is now or (record and record.styles) == (now and 
+                                                               now.styles)
+
     def reset(self):
         """
             Resets this application object and the terminal to the state
@@ -36,11 +390,18 @@ class Interact:
         self.move_cursor_to(0, 0)
         self.out.truncate(0)
         self.out.seek(0)
+        self._edited(self._first, len(self._buffer) - self._first, 1)
         self._buffer = [""]
+        self._lines = [None]
+        self._first = 0
+        self._history.clear()
+        self.popup = self._popup_selected = None
+        self._popup_drawn = 0
     
     ############################################################################
     ############################### CURSOR METHODS #############################
     ############################################################################
+    @framed
     def move_cursor(self, rows=0, cols=0):
         """
             Moves the cursor the given number of rows, THEN the given number
@@ -53,8 +414,8 @@ class Interact:
         """
 
         # New y value after translation. Clipped within the range of 
-        # 0 - last-line
-        y = min(max(0, self.y + rows), len(self._buffer) - 1)
+        # first-line - last-line
+        y = min(max(self._first, self.y + rows), len(self._buffer) - 1)
          
         # length of the current line, assuming the translation to new 
         # y has already happened
@@ -63,6 +424,9 @@ class Interact:
         #New x value after translation. Clipped within the range of 
         # 0 - line length
         x = min(max(0, self.x + cols), curr_line_length)
+        if self._suspended:
+            self.x, self.y = x, y
+            return
         
         # Moves the cursor the delta between _x, _y and x, y
         self._move_cursor(y - self.y, x - self.x)
@@ -74,9 +438,9 @@ class Interact:
         """
         delta_x = delta_y = 0
         if y > -1:
-            # If y is non-negative, Set _y to y, clipped between 0 and 
-            # buffer length 
-            delta_y = min(y, len(self._buffer) - 1) - self.y
+            # If y is non-negative, Set _y to y, clipped between the first
+            # line kept and buffer length 
+            delta_y = min(max(y, self._first), len(self._buffer) - 1) - self.y
         if x > -1:
             # If x is non-negative, Set _x to x, clipped between 0 and 
             # current line length
@@ -91,11 +455,7 @@ class Interact:
             Moves the cursor to the "absolute" x position in the current line
             However, values are still clipped between 0 and line length 
         """
-        line_length = line_length or self.line_length
-         
-        # move it to the beginning of the line, then move it forward x
-        self.move_cursor(cols=-line_length)
-        self.move_cursor(cols=x)
+        self.move_cursor(cols=x - self.x)
     
     def move_cursor_to_eol(self, rows=0, line_length=None):
         """
@@ -104,7 +464,10 @@ class Interact:
             So app.move_cursor_to_eol(-3) moves it to eol of the 3 lines 
             before the current position
         """
-        self.move_cursor(rows=rows, cols=self.line_length)
+        # Lines can be longer than line_length when they are soft wrapped, so
+        # move by the length of the line we end up on
+        y = min(max(self._first, self.y + rows), len(self._buffer) - 1)
+        self.move_cursor(rows=rows, cols=len(self._buffer[y]) - self.x)
 
     def move_cursor_to_beginning(self, rows=0, line_length=None):
         """
@@ -113,7 +476,7 @@ class Interact:
             of buffer. So app.move_cursor_to_beginning(-3) moves it to beginning
             of the 3 lines before the current position
         """
-        self.move_cursor(rows=rows, cols=-self.line_length)
+        self.move_cursor(rows=rows, cols=-self.x)
 
     def move_cursor_to_eof(self):
         """
@@ -148,46 +511,62 @@ class Interact:
     ############################################################################
     ##############################  IO METHODS  ################################
     ############################################################################
+    @framed
     def write(self, msg):
         """
             Interface for writing messages to the `out` file descriptor. This 
             class (attempts to) maintain a sychronized buffer of what has been
             written out, so that it can simulate text insertion
-            :param msg: str -- the message to write out
+            :param msg: str -- the message to write out. May be a 
+                peacock.format.StyledText, or contain graphics escape 
+                sequences (e.g. the output of format()), in which case the
+                styles are stored beside the text rather than in it
         """
+        if "\033[" in msg and not isinstance(msg, StyledText):
+            msg = StyledText.from_ansi(msg)
+        if self.scrollback:
+            self.scrollback.grew(len(msg))
+
+        if self._suspended:
+            # Only the buffer changes, and the cursor ends up after the 
+            # message
+            lines = self._splice(msg)
+            last = msg.rsplit("\n", 1)[-1]
+            self.x = len(last) if len(lines) > 1 else self.x + len(msg)
+            self.y += len(lines) - 1
+            return
+
         # The message that we're ACTUALLY going to write is the given message 
         # plus all the text that was after the cursor, which must be shifted
         trailing_output = self.trailing_output()
         output = msg + trailing_output
         
         ########################## WRITE TO BUFFER ############################
-        # We will append the text before the cursor on this line to the text 
-        # in the first line of the output, and that becomes the new current 
-        # line in the buffer, and the rest of lines become the contents of the
-        # rest of the buffer (remember, this contains all of the text that was
-        # after the cursor in the first place)
-        first_line, *rest_lines = output.split("\n")
-        self._buffer[self.y] = self.text_before_cursor() + first_line
-        self._buffer[self.y + 1:] = rest_lines
+        # The message is spliced into the current line between the text 
+        # before and after the cursor, and any newlines in it split that line
+        # into several. The lines after the current line don't change, so 
+        # they are left alone in the buffer
+        self._splice(msg)
         
         
         ############################ WRITE TO OUT #############################
         # Next, we write the message to the `out` fd. Note that if any of the 
         # lines in the new buffer are shorter than the line that was previously 
-        # there, the difference will remain on the line. Thus we must first 
-        # delete the line, THEN write the new one
+        # there (or wrap onto fewer rows), the difference would remain on 
+        # screen. Since everything from the cursor on is being rewritten, we
+        # first delete all of it, THEN write the new text
+        self._delete_trailing_out()
         *lines, last = output.split("\n")
         for line in lines:
-            self._delete_line_out()
-            self.out.write(line + "\n")
+            self._write_out(line)
+            self._newline_out()
             self.y += 1
             self.x = 0
 
-        # Delete the last line, and write out the new one. If there was no 
-        # newline character in the text, this is the only code that would be
-        # run, and it will still work
-        self._delete_line_out()
-        self.out.write(last)
+        # Write out the last line. If there was no newline character in the
+        # text, this is the only code that would be run, and it will still 
+        # work
+        self._write_out(last)
 
         # x increases by the length of the last line
         self.x += len(last)
@@ -202,7 +581,9 @@ class Interact:
         first, *rest = trailing_output.split("\n")
         self.move_cursor_to_eol(-len(rest))
         self.move_cursor(cols=-len(first))
+        self._trim_scrollback()
 
+    @framed
     def delete(self, chars):
         """
             Deletes `chars` characters from the `out` text, by moving the 
@@ -214,40 +595,60 @@ class Interact:
         # Absolute X, Y coordinates in the text where the cursor will be after
         # deleting `chars` characters
         x, y = self._calculate_ending_position(chars)
+
+        # The net effect is that lines y through the current line are merged
+        # into one
+        removed = self.y - y + 1
+        if self._suspended:
+            self._merge(x, y)
+            self.x, self.y = x, y
+            return
         
         # Current trailing text, which will be written at x, y
-        trailing_output = self.trailing_output()
+        trailing_output = self._styled_trailing_output()
+
+        # The lines after the current one only move up. Their text and
+        # records are put back after rewriting them, so that nothing cached
+        # about them is lost
+        after = self.y + 1
+        text, lines = self._buffer[after:], self._lines[after:]
         self.move_cursor_to(x, y)
 
         # Save the location at x, y before we write
         restore = self.save_cursor()
 
-        # Delete all text from x, y down, and then write the trailing text
-        self.delete_trailing()
-        self.write(trailing_output)
+        # Delete all text from x, y down, and then write the trailing text.
+        # On their own, those steps look like every line after y changed, so
+        # report the real edit up front and mute the steps
+        self._edited(y, removed, 1)
+        self._muted += 1
+        try:
+            self.delete_trailing()
+            self.write(trailing_output)
+        finally:
+            self._muted -= 1
+        self._buffer[y + 1:] = text
+        self._lines[y + 1:] = lines
         
         # Restore the cursor position to x, y
         restore()
 
+    @framed
     def delete_trailing(self):
         """
             Deletes all trailing text from the cursor location to EOF
-            Relies on delete_line 
         """
-        # Save cursor location
-        restore = self.save_cursor()
-        for _ in self._buffer[self.y:]:
-            # For each line in the buffer, delete the line, and move the next
-            self.delete_line()
-            self.move_cursor_to_beginning(1)
+        self._truncate()
+        self._edited(self.y + 1, len(self._buffer) - self.y - 1, 0)
+        del self._buffer[self.y + 1:]
+        del self._lines[self.y + 1:]
 
-        # restore the cursor position
-        restore()
-        
-        # Remove the trailing empties from the buffer. Once a user has deleted
-        # line, they shouldn't be able to enter it without writing a newline
-        del self._buffer[self.y + 1:]  
+        # Everything after the cursor is cleared at once. Erasing it line by
+        # line would move between lines whose rows have already changed
+        if not self._suspended:
+            self._delete_trailing_out()
     
+    @framed
     def delete_line(self):
         """
             Deletes all the text in the current line after the cursor from 
@@ -256,12 +657,405 @@ class Interact:
             NOTE: this method is not implemented. Each subclass must implement
             it for the file type they are targetting
         """
+        if self._suspended:
+            self._truncate()
+            return
+
+        # If the line is soft wrapped, the rows below the cursor's row hold 
+        # the rest of it, and must be erased too. At the end of a line that
+        # exactly fills its last row, the cursor is on the row after it, 
+        # and there's nothing of the line left to erase
+        rows = self.rows(self.y)
+        self._truncate()
+        row, _ = self.display_position()
+        if row < rows:
+            self._rows_below = rows - row - 1
+            self._delete_line_out()
+
+    @framed
+    def restyle(self, x0, y0, x1, y1, style=""):
+        """
+            Gives the text from (x0, y0) up to (x1, y1) the given style, and
+            redraws just that text. Nothing is erased or shifted, so this is
+            far cheaper than deleting and rewriting the text
+            :param x0, y0: int - start of the range
+            :param x1, y1: int - end of the range (exclusive)
+            :param style: str - peacock style specification, e.g. "red;white".
+                The empty string removes all styling
+        """
+        restore = self.save_cursor()
+        if y0 < self._first:
+            # The range starts in lines that were evicted
+            x0, y0 = 0, self._first
+        y1 = min(y1, len(self._buffer) - 1)
+        for y in range(y0, y1 + 1):
+            line = self._buffer[y]
+            start = max(0, x0) if y == y0 else 0
+            end = min(x1, len(line)) if y == y1 else len(line)
+            if start >= end:
+                continue
+            # Only the styles change, so the line's other cached metadata
+            # is carried over. The record is replaced rather than changed, 
+            # as a suspension may be holding on to the old one
+            runs = restyle_runs(self._line_styles(y), start, end, style, 
+                                len(line))
+            old = self._lines[y]
+            if self._suspended:
+                self._touched(y, len(self._buffer) - y - 1)
+            self._lines[y] = Line(runs) if runs or old else None
+            if old:
+                self._lines[y].colmap, self._lines[y].wrap = old.colmap, \
+                                                             old.wrap
+            if self._suspended:
+                continue
+            self.move_cursor_to(start, y)
+            self._rewrite(end - start)
+        restore()
+
+    def replace_all(self, pattern, repl, region=None):
+        """
+            Replaces every match of 'pattern' in the buffer, or in a region 
+            of it, as re.sub would, in a single pass over the lines. Lines 
+            without a match are left as they are, with everything cached 
+            about them, and only the lines that changed are redrawn, once.
+            The whole replacement is one change, which undo() reverts. E.g.:
+            >>> interact.replace_all(r"\bfoo\b", "bar")
+            :param pattern: str or re.Pattern - matched against each line, 
+                so a match never spans lines
+            :param repl: str or (re.Match) -> str - the replacement, as 
+                re.sub takes it. Newlines in it split the line
+            :param region: (int, int, int, int) - (x0, y0, x1, y1), to only 
+                replace matches from (x0, y0) up to (x1, y1) (exclusive).
+                Defaults to the whole buffer
+            :return: int - the number of matches replaced
+        """
+        pattern = re.compile(pattern)
+        last, first = len(self._buffer) - 1, self._first
+        x0, y0, x1, y1 = region or (0, first, len(self._buffer[last]), last)
+        if y0 < first:
+            # The region starts in lines that were evicted
+            x0, y0 = 0, first
+        y1 = min(y1, last)
+        if y0 > y1:
+            return 0
+
+        # Most lines don't match, so finding the ones that do is kept to a
+        # search per line. The region's first and last lines are searched
+        # within its bounds, but not cut at them, so that anchors, word 
+        # boundaries and lookbehinds see the text around the region, as 
+        # they would in re.sub
+        search, buffer = pattern.search, self._buffer
+        bounds = {y0: (max(0, x0), len(buffer[y0]))}
+        end = min(x1, len(buffer[y1]))
+        bounds[y1] = (bounds[y1][0] if y1 == y0 else 0, end)
+        def edge(y):
+            return [y] if search(buffer[y], *bounds[y]) else []
+        # Iterating the buffer starts at its first line kept
+        middle = islice(buffer, y0 + 1 - first, y1 - first)
+        hits = edge(y0) + [y for y, line in enumerate(middle, y0 + 1) 
+                           if search(line)] + (edge(y1) if y1 > y0 else [])
+        if not hits:
+            return 0
+
+        # The new lines, and their records, from the first line with a match
+        # to the last
+        first, stop = hits[0], hits[-1] + 1
+        lines, records = buffer[first:stop], self._lines[first:stop]
+        replaced = 0
+        for y in reversed(hits):
+            start, end = bounds.get(y, (0, len(buffer[y])))
+            text, runs, matches = self._replaced(pattern, repl, y, start, 
+                                                 end)
+            replaced += matches
+            split = text.split("\n")
+            if runs:
+                runs = split_runs(runs, [len(line) for line in split])
+            else:
+                runs = [None] * len(split)
+            lines[y - first:y - first + 1] = split
+            records[y - first:y - first + 1] = [Line(line_runs) if line_runs
+                                                else None 
+                                                for line_runs in runs]
+
+        with self.suspended():
+            self._history.append((first, buffer[first:stop], 
+                                  self._lines[first:stop], lines, 
+                                  (self.x, self.y)))
+            self._edited(first, stop - first, len(lines))
+            buffer[first:stop] = lines
+            self._lines[first:stop] = records
+
+            # The cursor stays on its line, or on the last line of the 
+            # block if its own was split up
+            y = self.y
+            if y >= stop:
+                y += len(lines) - (stop - first)
+            elif y >= first:
+                y = min(y, first + len(lines) - 1)
+            self.y, self.x = y, min(self.x, len(buffer[y]))
+        return replaced
+
+    def _replaced(self, pattern, repl, y, start, end):
+        """
+            Returns line y with the matches of 'pattern' between 'start' and
+            'end' replaced, and the runs of its styles, if it has any. The 
+            replacements themselves are unstyled, as written text is
+            :return: (str, [(int, str)] or None, int) - the line, its runs, 
+                and the number of matches replaced
+        """
+        line, old = self._buffer[y], self._line_styles(y)
+        if not old and (start, end) == (0, len(line)):
+            text, matches = pattern.subn(repl, line)
+            return text, None, matches
+
+        # Matches are found in the whole line, between 'start' and 'end', 
+        # rather than in a slice of it, which would make its ends look like
+        # the ends of the line
+        old = pad_runs(old, len(line)) if old else None
+        pieces, runs = [line[:start]], old and slice_runs(old, 0, start)
+        pos, matches = start, 0
+        for match in pattern.finditer(line, start, end):
+            begin = match.start()
+            text = match.expand(repl) if isinstance(repl, str) else \
+                   repl(match)
+            pieces += [line[pos:begin], text]
+            if old:
+                runs += slice_runs(old, pos, begin) + [(len(text), "")]
+            pos, matches = match.end(), matches + 1
+        pieces.append(line[pos:])
+        if old:
+            runs += slice_runs(old, pos, len(line))
+        return "".join(pieces), runs, matches
+
+    def undo(self):
+        """
+            Reverts the most recent change that can be undone (each 
+            replace_all is one), and redraws the lines it changed. Edits 
+            made since then, to the lines it changed or above them, move 
+            those lines, in which case it can't be undone
+            :return: bool - whether a change was undone
+        """
+        if not self._history:
+            return False
+        first, lines, records, new, (x, y) = self._history.pop()
+        if self._buffer[first:first + len(new)] != new:
+            return False
+        with self.suspended():
+            self._edited(first, len(new), len(lines))
+            self._buffer[first:first + len(new)] = lines
+            self._lines[first:first + len(new)] = records
+            self.y = min(max(y, self._first), len(self._buffer) - 1)
+            self.x = min(x, len(self._buffer[self.y]))
+        return True
+
+    @framed
+    def show_popup(self, items, selected=None):
+        """
+            Shows a list of items, one per row, on the rows below the 
+            cursor's line, over whatever text is there, until hide_popup()
+            is called. The buffer and the cursor are left as they are, so 
+            the caller has to hide the popup before editing or moving. While
+            rendering is suspended, the popup is drawn once the suspension 
+            ends. E.g.:
+            >>> interact.show_popup(["peacock", "peahen"], selected=0)
+            :param items: [str] - what to show, cut off at the line length
+            :param selected: int - index of the item to highlight, if any
+        """
+        # Showing the same number of rows again just writes over them
+        if self._popup_drawn != len(items):
+            self._erase_popup()
+        self.popup, self._popup_selected = list(items), selected
+        if not self._suspended:
+            self._draw_popup()
+
+    @framed
+    def hide_popup(self):
+        """
+            Hides the popup, if there is one, putting back the text it hid
+        """
+        self._erase_popup()
+        self.popup = self._popup_selected = None
+
+    def _draw_popup(self):
+        if self.popup:
+            self._popup_out(self.popup, self._popup_selected)
+            self._popup_drawn = len(self.popup)
+
+    def _erase_popup(self):
+        if self._popup_drawn:
+            self._erase_popup_out(self._popup_drawn)
+            self._popup_drawn = 0
+
+    def _trim_scrollback(self):
+        """
+            Evicts the oldest lines of the buffer if it's over the 
+            scrollback's cap. The cursor's line and the lines after it are 
+            always kept. Nothing is written, since the lines evicted are 
+            above the cursor, and every move is relative to it. The lines 
+            kept keep their indices, so the cursor and anything else holding
+            a y stay where they were
+        """
+        if not self.scrollback or self._suspended or self._muted:
+            return
+        count = min(self.scrollback.excess(self._buffer), self.y - self._first)
+        if not count:
+            return
+        if self._first == 0:
+            # The buffer starts out as plain lists, which are faster to 
+            # index, and only needs to keep indices from its first eviction
+            self._buffer = LineRing(self._buffer)
+            self._lines = LineRing(self._lines)
+        if self.highlighter:
+            self.highlighter.evict(self._buffer, count)
+        if self.completer:
+            self.completer.evict(count)
+        self.scrollback.evict(self._buffer.evict(count))
+        self._lines.evict(count)
+        self._first = first = self._buffer.first
+
+        # Changes to lines that were evicted can't be undone
+        self._history = deque((change for change in self._history 
+                               if change[0] >= first), maxlen=self.UNDO_LIMIT)
+
+    def _splice(self, msg):
+        """
+            Splices 'msg' into the buffer at the cursor, without moving the
+            cursor
+            :return: [str] - the lines that replaced the cursor's line
+        """
+        lines = (self.text_before_cursor() + msg + 
+                 self.text_after_cursor()).split("\n")
+        records = [Line(runs) if runs else None 
+                   for runs in self._spliced_styles(msg, lines)]
+        self._edited(self.y, 1, len(lines))
+        self._lines[self.y:self.y + 1] = records
+        self._buffer[self.y:self.y + 1] = lines
+        return lines
+
+    def _merge(self, x, y):
+        """
+            Removes the text from (x, y) up to the cursor from the buffer, 
+            joining what is left of line y and the cursor's line
+        """
+        end = self._buffer[self.y]
+        old, new = self._line_styles(y), self._line_styles(self.y)
+        runs = None
+        if old or new:
+            runs = (pad_runs(slice_runs(old or [], 0, x), x) + 
+                    slice_runs(new or [], self.x, len(end)))
+        self._edited(y, self.y - y + 1, 1)
+        self._lines[y:self.y + 1] = [Line(runs) if runs and 
+                                     any(s for _, s in runs) else None]
+        self._buffer[y:self.y + 1] = [self._buffer[y][:x] + end[self.x:]]
+
+    def _truncate(self):
+        """
+            Removes the text after the cursor in its line from the buffer
+        """
+        runs = self._line_styles(self.y)
+        if runs:
+            runs = slice_runs(runs, 0, self.x)
+        self._edited(self.y, 1, 1)
         self._buffer[self.y] = self.text_before_cursor()
+        self._lines[self.y] = Line(runs) if runs and any(s for _, s in runs) \
+                              else None
+
+    def _rewrite(self, chars):
+        """
+            Writes the next 'chars' characters after the cursor to `out` 
+            again, leaving the cursor after them. Used to redraw text whose
+            styles changed
+        """
+        self._write_out(self.text_after_cursor()[:chars])
+        self.x += chars
+
+    def _delete_trailing_out(self):
+        """
+            Deletes everything from the cursor to the end of the app's text
+            from `out`, without touching the buffer
+        """
         self._delete_line_out()
 
+    def _write_out(self, text):
+        """
+            Writes 'text' to `out` at the cursor. The text must not contain
+            newlines, and must already be in the buffer at the cursor
+            position, so that subclasses can style it
+        """
+        self._out(text)
+
+    def _newline_out(self):
+        """
+            Ends the cursor's line in `out`, after the rest of it has been
+            written, taking the cursor to the start of the next line
+        """
+        self._out("\n")
+
+    def _out(self, text):
+        """
+            Writes raw text or escape sequences to `out`
+        """
+        self.out.write(text)
+
     ############################################################################
     ############################ UTILITY FUNCTIONS #############################
     ############################################################################
+    def line_runs(self, y):
+        """
+            Returns the (length, style) runs that line 'y' should be rendered
+            with, or None if it is unstyled. Styles written with the text take
+            precedence over the highlighter
+        """
+        runs = self._line_styles(y)
+        if runs:
+            return runs
+        if self.highlighter:
+            return self.highlighter.runs(self._buffer, y)
+        return None
+
+    def _line_styles(self, y):
+        """
+            Returns the style runs written with line y, or None
+        """
+        line = self._lines[y]
+        return line.styles if line else None
+
+    def _line(self, y):
+        """
+            Returns the Line record of line y, creating it the first time
+            something is cached for the line
+        """
+        line = self._lines[y]
+        if line is None:
+            line = self._lines[y] = Line()
+        return line
+
+    def _edited(self, start, removed, inserted):
+        """
+            Called whenever `removed` lines of the buffer starting at `start`
+            are about to be replaced by `inserted` lines, so that anything 
+            outside of the Line records caching per-line information (the
+            highlighter and the completer) can shift or drop its entries
+        """
+        if self._suspended:
+            self._touched(start, len(self._buffer) - start - removed)
+        if self._muted:
+            return
+        if self.highlighter:
+            self.highlighter.edit(start, removed, inserted)
+        if self.completer:
+            self.completer.edit(start, removed, inserted)
+
+    def _touched(self, start, after):
+        """
+            Records, in the current suspension and each batch open in it, 
+            that the lines from 'start' up to the last 'after' lines of the
+            buffer are about to be edited, so that finding what to redraw, or
+            to put back, doesn't have to look at the lines outside of them
+        """
+        for changes in self._changes:
+            changes.touch(self._buffer, self._lines, start, after)
+
     def trailing_output(self):
         """
             Returns all text after the current cursor position. Useful for
@@ -276,6 +1070,152 @@ class Interact:
         after_cursor = '\n'.join(self._buffer[self.y:])
         return after_cursor[self.x:]
 
+    def column(self, x=None, y=None):
+        """
+            Returns the display column of position x in line y, which differs
+            from x when the line has wide characters, combining marks or tabs
+            in it. Defaults to the cursor position
+            :param x: int - character index into the line
+            :param y: int - line number
+            :return: int
+        """
+        x = self.x if x is None else x
+        y = self.y if y is None else y
+        return self._column_map(y).column(x)
+
+    def index_at_column(self, column, y=None):
+        """
+            Returns the index of the character in line y that covers the given
+            display column. Defaults to the cursor's line
+        """
+        return self._column_map(self.y if y is None else y).index(column)
+
+    def _column_map(self, y):
+        """
+            Returns the cached ColumnMap for line y, rebuilding it if the line
+            has changed since it was built
+        """
+        record, line = self._lines[y], self._buffer[y]
+        cmap = record.colmap if record else None
+        if cmap is None or cmap.text is not line:
+            cmap = self._line(y).colmap = ColumnMap(line)
+        return cmap
+
+    def rows(self, y=None):
+        """
+            Returns the number of display rows line y takes up once it is
+            soft wrapped at line_length. Defaults to the cursor's line
+        """
+        y = self.y if y is None else y
+        # Plain lines that fit on a row, as most do, need nothing cached
+        if fits(self._buffer[y], self.line_length):
+            return 1
+        return self._wrap(y).rows
+
+    def display_position(self, x=None, y=None):
+        """
+            Returns the display row, relative to the first row of line y, and
+            the display column of position x in line y. Defaults to the cursor
+            :return: (int, int)
+        """
+        x = self.x if x is None else x
+        y = self.y if y is None else y
+        if fits(self._buffer[y], self.line_length):
+            # After the last column is the start of the next row, as Wrap
+            # has it
+            return (1, 0) if x == self.line_length else (0, x)
+        return self._wrap(y).position(self._column_map(y), x)
+
+    def _at_wrap(self, x, y):
+        """
+            Whether position x of line y is at the start of a row that the
+            text before it filled, so that printing up to x leaves the 
+            terminal's cursor waiting to wrap on the row above
+        """
+        return x > 0 and self.display_position(x, y)[1] == 0
+
+    def row_distance(self, y0, y1):
+        """
+            Returns the number of display rows between the first rows of 
+            lines y0 and y1, which is negative if y1 is above y0. Only the
+            lines in between are wrapped
+        """
+        if y1 < y0:
+            return -self.row_distance(y1, y0)
+        return sum(map(self.rows, range(y0, y1)))
+
+    def display_rows(self, y=None, row=0):
+        """
+            Generates the display rows from row 'row' of line y to the end of
+            the buffer, as (line, start, end) tuples giving the slice of the 
+            line shown on that row. Lines are only wrapped as they are 
+            reached, so a viewport that stops after a screenful of rows only 
+            costs a screenful of wrapping. y defaults to the first line kept
+        """
+        if y is None:
+            y = self._first
+        elif y < self._first:
+            # Line y was evicted
+            y, row = self._first, 0
+        for y in range(y, len(self._buffer)):
+            starts = self._wrap(y).starts
+            for i in range(row, len(starts)):
+                end = starts[i + 1] if i + 1 < len(starts) else \
+                      len(self._buffer[y])
+                yield y, starts[i], end
+            row = 0
+
+    def resize(self, line_length):
+        """
+            Changes the line length that lines are wrapped at, e.g. after the
+            terminal was resized. Wraps are stamped with the line length they
+            were built for, so only lines that are looked at again, which 
+            are the visible ones, get re-wrapped
+        """
+        self.line_length = line_length
+
+    def _wrap(self, y):
+        """
+            Returns the cached Wrap for line y, rebuilding it if the line has
+            changed or the line length is different
+        """
+        record = self._lines[y]
+        wrap = record.wrap if record else None
+        if (wrap is None or wrap.text is not self._buffer[y] or 
+                wrap.line_length != self.line_length):
+            wrap = Wrap(self._column_map(y), self.line_length)
+            self._line(y).wrap = wrap
+        return wrap
+
+    def _styled_trailing_output(self):
+        """
+            Same as trailing_output, but keeps the styles of the text, so that
+            it can be written back without losing them
+        """
+        trailing_output = self.trailing_output()
+        styles = [line.styles if line else None 
+                  for line in self._lines[self.y:]]
+        if not any(styles):
+            return trailing_output
+        lengths = [len(line) for line in self._buffer[self.y:]]
+        runs = slice_runs(join_runs(styles, lengths), self.x, 
+                          self.x + len(trailing_output))
+        return StyledText(trailing_output, runs)
+
+    def _spliced_styles(self, msg, lines):
+        """
+            Returns the styles of 'lines', the lines that replace the current
+            line when 'msg' is written at the cursor
+        """
+        old, runs = self._line_styles(self.y), getattr(msg, "runs", None)
+        if not old and not runs:
+            return [None] * len(lines)
+        old = old or []
+        runs = (pad_runs(slice_runs(old, 0, self.x), self.x) + 
+                pad_runs(runs or [], len(msg)) + 
+                slice_runs(old, self.x, len(self._buffer[self.y])))
+        return split_runs(runs, [len(line) for line in lines])
+
     def text_after_cursor(self):
         """
             Returns the text after the cursor in the current line 
@@ -295,15 +1235,16 @@ class Interact:
             into account the length of each intermediary line
         """
         x, y = self.x, self.y
-        while chars > x and y > 0:
+        while chars > x and y > self._first:
             # So long as the number of characters to delete is longer than 
             # the current line, and we aren't at the first line of text yet
             # decrement chars by the number of characters in the current line
             chars -= x + 1
             y -= 1
             x = len(self._buffer[y])
-        # Return the x, y coordinates calculated, but clamped at 0, 0
-        return max(0, x - chars), max(0, y)
+        # Return the x, y coordinates calculated, but clamped at the start 
+        # of the first line kept
+        return max(0, x - chars), y
 
 class InteractANSIMac(Interact):
     """
@@ -314,13 +1255,26 @@ class InteractANSIMac(Interact):
         More info on ANSI escape sequences:
             http://en.wikipedia.org/wiki/ANSI_escape_code
     """
+
+    # Moving right by printing the characters in between is only ever 
+    # cheaper than an escape sequence for a handful of characters
+    MAX_REPRINT = 6
+
     def __init__(self, keyboard, out, line_length):
         super().__init__(keyboard, out, line_length)
         
         # Default ANSI escape sequence is Esc+[
         self.escape_seq = "\033["
 
-    
+        # The cursor move queued in the current frame, if any, as (rows, 
+        # from column, to column, reprint) where reprint is the text that 
+        # could be printed to make the move, or None
+        self._pending = None
+
+        # Whether text was last printed up to the start of a row, which 
+        # leaves the terminal's cursor waiting to wrap on the row above 
+        # rather than where the cursor is (see _unwrap)
+        self._wrapping = False
     
     def _move_cursor(self, rows=0, cols=0):
         """
@@ -329,41 +1283,388 @@ class InteractANSIMac(Interact):
             (rows, cols), but instead moves relatively
             Any values that are too large are clipped to the max possible
             given the constraints (i.e. length of line, length of buffer)
+            The move is only queued: moves made in the same frame are merged
+            into one, which is emitted as cheaply as possible when something 
+            is next written, or the frame ends
             :param rows: int - number of rows to move, negatives allowed 
             :param cols: int - number of cols to move, negatives allowed 
         """
+        # The terminal moves in display rows and columns, not lines and 
+        # characters, so the deltas are worked out from where both positions
+        # land once their lines are soft wrapped
+        row, column = self.display_position()
+        x, y = self.x, self.y
+        self.y += rows
+        self.x += cols
+        new_row, new_column = self.display_position()
+        rows = self.row_distance(y, self.y) + new_row - row
+        reprint = None
+        if (not rows and y == self.y and new_column > column and 
+                self._pending is None):
+            reprint = self._reprint(x, self.x)
+        self._queue_move(rows, column, new_column, reprint)
+        if not self._depth:
+            self._end_frame()
+
+    def _queue_move(self, rows, column, new_column, reprint=None):
+        """
+            Queues a move of the terminal's cursor 'rows' rows from display
+            column 'column' to 'new_column', merged with the move queued
+            already, if any
+        """
+        if self._pending:
+            # Carry on from where the terminal's cursor really is
+            queued, column, _, _ = self._pending
+            rows += queued
+            reprint = None
+        self._pending = (rows, column, new_column, reprint)
 
-        if rows:
-            self.out.write("{}{}{}".format(self.escape_seq, abs(rows), 
-                                           'B' if rows > 0 else 'A'))
-            self.y += rows
-        if cols:
-            self.out.write("{}{}{}".format(self.escape_seq, abs(cols), 
-                                           'C' if cols > 0 else 'D'))
-            self.x += cols
+    def _splice(self, msg):
+        if self._suspended:
+            return super()._splice(msg)
+        before = self.display_position()
+        lines = super()._splice(msg)
+        self._reposition(before)
+        return lines
+
+    def _truncate(self):
+        if self._suspended:
+            return super()._truncate()
+        before = self.display_position()
+        super()._truncate()
+        self._reposition(before)
+
+    def _reposition(self, before):
+        """
+            Queues a move to where the cursor is displayed now that its line
+            has changed, from where it was displayed before. The text before
+            the cursor is the same, but a wide character that didn't fit at
+            the end of a row starts the next one, so the cursor in front of 
+            it moves to the end of the row above once it's gone
+            :param before: (int, int) - the cursor's display row and column
+                in the line as it was
+        """
+        after = self.display_position()
+        if after == before:
+            return
+        if after > before:
+            # A wide character written at the end of a row that it doesn't
+            # fit on goes to the next row, and what was on the rest of this
+            # one is left behind unless it's cleared
+            self._out(self.escape_seq + "K")
+        self._queue_move(after[0] - before[0], before[1], after[1])
+
+    def _reprint(self, x0, x1):
+        """
+            Returns the rendered text between x0 and x1 of the cursor's line,
+            which moves the cursor from x0 to x1 when printed, or None if 
+            that's not worth considering
+        """
+        if x1 - x0 > self.MAX_REPRINT:
+            return None
+        text = self._buffer[self.y][x0:x1]
+        runs = self.line_runs(self.y)
+        return render_runs(text, runs, x0) if runs else text
+
+    def _place_cursor(self):
+        """
+            Emits the queued cursor move, if any
+        """
+        if self._pending:
+            rows, column, new_column, reprint = self._pending
+            self._pending = None
+            self._unwrap()
+            self.out.write(plan_move(rows, column, new_column, reprint))
+
+    def _unwrap(self):
+        """
+            Finishes the wrap the terminal's cursor is waiting to make, if 
+            any, which takes it to the start of the row that the cursor is 
+            at. Until then it's on the last column of the row above, where
+            an erase would clear the last character, and a move would start
+            a row out. Printing makes the wrap itself, so only erases and 
+            moves need this
+        """
+        if self._wrapping:
+            self._wrapping = False
+            self.out.write("\r\n")
+
+    def _end_frame(self):
+        self._place_cursor()
         self.out.flush()
 
+    def _redraw(self, changes, x, y):
+        """
+            Rewrites the lines that changed. When the block of lines that
+            changed takes up the same rows it did before, line for line, 
+            only the lines in it that differ are erased and written again.
+            When it takes up as many rows in all, the whole block is. 
+            Otherwise everything from its first line to the end of the 
+            buffer is, since the lines after it have moved. The move to 
+            where the cursor is now is queued like any other
+        """
+        changed = self._changed_lines(changes)
+        target = self.x, self.y
+        if changed is None:
+            # Only the cursor moved
+            self.x, self.y = x, y
+            self.move_cursor_to(*target)
+            return
+        first, old_end, new_end = changed
+        shift, old = new_end - old_end, None
+
+        # The screen still shows the old buffer, so the way to the first 
+        # changed line, and the rows of the block there, are measured in 
+        # it. Only the block's lines differ from the buffer's
+        new = list(map(self.rows, range(first, new_end)))
+        def old_rows(k):
+            line, record = changes.before(self._buffer, self._lines, k)
+            if fits(line, self.line_length):
+                return 1
+            return self._old_wrap(line, record)[0].rows
+
+        # When the block has as many lines as before, and each of the lines
+        # in it that changed takes up as many rows as before, the rest of 
+        # its lines are still in place
+        if old_end == new_end:
+            changed = [k for k in range(first, new_end) 
+                       if not self._unchanged(changes, k, k)]
+            if all(old_rows(k) == new[k - first] for k in changed):
+                old = new
+        if old is None:
+            old = list(map(old_rows, range(first, old_end)))
+
+        def distance(y0, y1):
+            # Rows between the first rows of lines y0 <= y1 in the old 
+            # buffer. Only the block's lines aren't the same in the new one
+            before = range(y0, min(y1, first))
+            after = range(max(y0, old_end) + shift, y1 + shift)
+            block = old[max(y0, first) - first:max(0, min(y1, old_end) - 
+                                                   first)]
+            return (sum(map(self.rows, before)) + sum(block) + 
+                    sum(map(self.rows, after)))
+
+        # Each segment is (first line, end line, its top row, relative to
+        # the first changed line, and the rows to erase there, or None to 
+        # erase to the end of the screen)
+        if new_end < len(self._buffer) and old is new:
+            segments, top, previous = [], 0, first
+            for k in changed:
+                top += sum(new[previous - first:k - first])
+                previous, rows = k, new[k - first]
+                if segments and segments[-1][1] == k:
+                    start, _, at, erase = segments.pop()
+                    segments.append((start, k + 1, at, erase + rows))
+                else:
+                    segments.append((k, k + 1, top, rows))
+        elif new_end < len(self._buffer) and sum(old) == sum(new):
+            segments = [(first, new_end, 0, sum(new))]
+        else:
+            # When lines were only removed from the end, the last line left
+            # is redrawn, to have somewhere to erase from
+            start = min(first, len(self._buffer) - 1)
+            segments = [(start, len(self._buffer), -distance(start, first), 
+                         None)]
+
+        wrap, cmap = self._old_wrap(*changes.before(self._buffer, 
+                                                    self._lines, y))
+        row, column = wrap.position(cmap, x)
+        current = (distance(first, y) if y >= first else 
+                   -distance(y, first)) + row
+
+        # The rows at the start of the first changed line that nothing in
+        # them changed are left alone, e.g. when text was added to the end
+        # of a long line
+        skip = (self._kept_rows(changes, first) 
+                if first < min(old_end, new_end) else 0)
+
+        self._unwrap()
+        output, wrapping = [], False
+        for start, end, top, erase in segments:
+            if wrapping:
+                output.append("\r\n")
+            kept = skip if start == first else 0
+            output.append(plan_move(top + kept - current, column, 0))
+            if erase is not None:
+                erase -= kept
+            if erase is None:
+                output += [self.escape_seq, "J"]
+            else:
+                # Every row is cleared first, so nothing that was in a row's
+                # last columns survives a shorter line
+                clear = self.escape_seq + "2K"
+                output.append(clear)
+                for _ in range(erase - 1):
+                    output += [self.escape_seq, "B", clear]
+                if erase > 1:
+                    output.append(csi(erase - 1, "A"))
+            for k in range(start, end):
+                if k > start:
+                    output.append("\n")
+                runs = self.line_runs(k)
+                line = self._buffer[k]
+                offset = self._wrap(k).starts[kept] if k == start else 0
+                output.append(render_runs(line[offset:], runs, offset) if runs
+                              else line[offset:])
+
+            # The terminal's cursor is now at the end of the last line 
+            # written, or waiting to wrap there
+            row, column = self.display_position(len(self._buffer[end - 1]),
+                                                end - 1)
+            current = top + self.row_distance(start, end - 1) + row
+            wrapping = self._at_wrap(len(self._buffer[end - 1]), end - 1)
+        self.out.write("".join(output))
+        self._wrapping = wrapping
+
+        self.y = segments[-1][1] - 1
+        self.x = len(self._buffer[self.y])
+        self.move_cursor_to(*target)
+
+    def _kept_rows(self, changes, y):
+        """
+            Returns how many of the first display rows of line y are shown
+            as they were before the suspension that 'changes' belongs to: 
+            the rows, and the break after each, that only hold text the old
+            and the new line start with. Only plain lines are compared
+        """
+        old, record = changes.before(self._buffer, self._lines, y)
+        if (fits(self._buffer[y], self.line_length) or self.line_runs(y) or
+                self.highlighter or (record and record.styles)):
+            return 0
+        starts = self._wrap(y).starts
+        return max(0, bisect_left(starts, _shared_prefix(old, 
+                                                         self._buffer[y])) - 1)
+
+    def _old_wrap(self, line, record):
+        """
+            Returns the Wrap and ColumnMap of a line from an earlier copy of
+            the buffer, from its record if they are still good
+            :param line: str
+            :param record: Line or None
+            :return: (Wrap, ColumnMap)
+        """
+        cmap = record and record.colmap
+        if cmap is None or cmap.text is not line:
+            cmap = ColumnMap(line)
+        wrap = record and record.wrap
+        if (wrap is None or wrap.text is not line or 
+                wrap.line_length != self.line_length):
+            wrap = Wrap(cmap, self.line_length)
+        return wrap, cmap
+
+    def _out(self, text):
+        # The cursor has to be in place before anything is written
+        self._place_cursor()
+        self._unwrap()
+        self.out.write(text)
+
+    @framed
     def delete_display(self):
         """
             Clears the ENTIRE visible terminal view, not just the app
             space, so really, this probably shouldn't even be here
         """
-        self.out.write("{}2J".format(self.escape_seq))
-        self.out.flush()
-    
-    def delete_line(self):
-        """
-            Deletes the text after the cursor to the end of the line 
-        """
-        super().delete_line()
-        self._delete_line_out()
+        self._out("{}2J".format(self.escape_seq))
         
     def _delete_line_out(self):
         """
-            Deletes the text after the cursor to the end of the line 
+            Deletes the text after the cursor to the end of the line, 
+            including the rows below it that the line was wrapped onto
         """
-        self.out.write("{}K".format(self.escape_seq))
-        self.out.flush()
+        self._out("{}K".format(self.escape_seq))
+        rows, self._rows_below = self._rows_below, 0
+        if rows:
+            # Clear each whole row underneath, then come back up
+            self._out("{}1B{}2K".format(self.escape_seq, 
+                                        self.escape_seq) * rows)
+            self._out("{}{}A".format(self.escape_seq, rows))
+
+    def _delete_trailing_out(self):
+        """
+            Deletes everything from the cursor to the end of the screen
+        """
+        self._out("{}J".format(self.escape_seq))
+
+    def _write_out(self, text):
+        """
+            Writes 'text' at the cursor, wrapped in the escape sequences for
+            the styles of the line it's on
+        """
+        if not text:
+            return
+        # Printing makes any wrap the terminal is waiting to make
+        self._place_cursor()
+        self._wrapping = False
+        runs = self.line_runs(self.y)
+        self.out.write(render_runs(text, runs, self.x) if runs else text)
+        self._wrapping = self._at_wrap(self.x + len(text), self.y)
+
+    def _newline_out(self):
+        # A newline makes the wrap the terminal is waiting to make. Without
+        # one to make, at the end of a line that exactly fills its last 
+        # row, the cursor is already where the next line starts
+        self._place_cursor()
+        if self._wrapping:
+            self._wrapping = False
+        elif self._at_wrap(len(self._buffer[self.y]), self.y):
+            return
+        self.out.write("\n")
+
+    def _popup_out(self, items, selected):
+        # Newlines take the cursor down to the rows below the line, and make
+        # room for them at the bottom of the screen. Items stop short of the
+        # last column, so the cursor never waits to wrap
+        row, column = self.display_position()
+        below = self.rows(self.y) - row
+        clear = self.escape_seq + "2K"
+        output = ["\n" * below]
+        for i, item in enumerate(items):
+            text = item[:self.line_length - 1]
+            if i:
+                output.append("\n")
+            output.append(clear)
+            output.append(render_runs(text, [(len(text), "negative")]) 
+                          if i == selected else text)
+        output.append(plan_move(1 - below - len(items), len(text), column))
+        self._out("".join(output))
+
+    def _erase_popup_out(self, rows):
+        # The lines that were under the popup are erased and written again,
+        # like a block of lines in _redraw
+        row, column = self.display_position()
+        below = self.rows(self.y) - row
+        end, covered = self.y + 1, 0
+        while end < len(self._buffer) and covered < rows:
+            covered += self.rows(end)
+            end += 1
+        erase = max(rows, covered)
+
+        clear = self.escape_seq + "2K"
+        output = [plan_move(below, column, 0), clear]
+        for _ in range(erase - 1):
+            output += [self.escape_seq, "B", clear]
+        if end == self.y + 1:
+            # There was nothing under the popup
+            up, at = below + erase - 1, 0
+        else:
+            if erase > 1:
+                output.append(csi(erase - 1, "A"))
+            for k in range(self.y + 1, end):
+                if k > self.y + 1:
+                    output.append("\n")
+                runs = self.line_runs(k)
+                line = self._buffer[k]
+                output.append(render_runs(line, runs) if runs else line)
+
+            # Then back up from the end of the last line written, once
+            # the terminal's cursor has wrapped there
+            row, at = self.display_position(len(self._buffer[end - 1]), 
+                                            end - 1)
+            up = below + self.row_distance(self.y + 1, end - 1) + row
+            if self._at_wrap(len(self._buffer[end - 1]), end - 1):
+                output.append("\r\n")
+        output.append(plan_move(-up, at, column))
+        self._out("".join(output))
 
 class _BufferInteract(Interact):
     """
@@ -409,8 +1710,33 @@ class _BufferInteract(Interact):
         self.out.truncate(0)
         self.out.seek(0)
         self.out.write("\n".join(line if i != self.y else line[:self.x] 
-                                 for i, line in enumerate(self._buffer)))
+                                 for i, line in enumerate(self._buffer,
+                                                          self._first)))
+        self.out.seek(self.off)
+
+    def _redraw(self, changes, x, y):
+        """
+            The mock's output is the text of the buffer, so it's written again
+        """
+        self.out.truncate(0)
+        self.out.seek(0)
+        self.out.write("\n".join(self._buffer))
+
+    def _popup_out(self, items, selected):
+        """
+            The mock's output is only the buffer, so popups aren't drawn
+        """
+        pass
+
+    def _erase_popup_out(self, rows):
+        pass
+
+    def _write_out(self, text):
+        """
+            Writes the text at the cursor's offset. The mock has no styles
+        """
         self.out.seek(self.off)
+        self.out.write(text)
     
     def write(self, msg):
         self.out.seek(self.off)
@@ -1,13 +1,205 @@
-from collections import deque
+from codecs import getincrementaldecoder
+import os
+from select import select
 import sys
-from threading import Thread
+from threading import Lock, Thread
+from time import perf_counter, sleep
 from tty import setcbreak
 import termios 
 
+from .ring import KeyRing
+
 class Keyboard(Thread):
     pass
 
-class MacKeyboard(Keyboard):
+class KeyDecoder:
+    """
+        Turns characters typed by a user into key names, such as 'ctrl+a' or
+        'up'. Characters are fed in as they arrive, and decoded keys come out
+        of get_key_or_none, which is non-blocking. Unlike MacKeyboard, a
+        KeyDecoder has no thread and never touches stdin, so it can decode
+        the input of any PTY or socket, e.g.:
+        >>> decoder = KeyDecoder()
+        >>> decoder.feed(b"a\033[A\xc3")
+        >>> decoder.feed(b"\xa9")
+        >>> [decoder.get_key_or_none() for _ in range(3)]
+        ['a', 'up', 'é']
+
+        Keys are decoded entirely as they're fed, and passed on through a 
+        KeyRing, so whoever takes them out only ever gets whole keys, and
+        can sleep until there are some (see wait)
+    """
+
+    # Seconds an Esc, or Esc [, at the end of what was fed is held for the
+    # rest of an arrow key's escape sequence, before it's taken as the
+    # keys it is made of
+    ESCAPE_TIMEOUT = 0.025
+
+    def __init__(self):
+        self.keys = mac_keys
+        self.direc = mac_direc
+        self._ring = KeyRing()
+
+        # The start of an escape sequence at the end of the last feed, and
+        # when it was fed
+        self._escape = ""
+        self._escape_at = 0.0
+
+        # The held escape can be flushed by whoever waits for keys (see 
+        # wait), which needn't be the thread feeding them, and only one
+        # thread at a time may put keys in the ring
+        self._feeding = Lock()
+
+        # Bytes read from a terminal can end part way through a multi-byte
+        # character, so the decoder holds on to the start of it until the
+        # rest arrives. Invalid bytes become U+FFFD rather than killing the
+        # keyboard
+        self._utf8 = getincrementaldecoder("utf-8")("replace")
+
+    def feed(self, data):
+        """
+            Queues the keys for each character of data. Control and ASCII 
+            characters are looked up in key_table, arrow keys' escape 
+            sequences are looked up in direc, and anything else is its own
+            key. A read can end part way through an escape sequence, so an
+            Esc or Esc [ at the end of 'data' is held for the next feed. If
+            that doesn't finish it, or nothing more is fed within 
+            ESCAPE_TIMEOUT (see escape_timeout), it's the keys it is made 
+            of, e.g. the esc key
+            :param data: bytes or str - input read from a terminal
+        """
+        if isinstance(data, bytes):
+            data = self._utf8.decode(data)
+        with self._feeding:
+            if self._escape:
+                data, self._escape = self._escape + data, ""
+            if "\033" not in data:
+                keys = [key_table[ord(ch)] if ch < "\x80" else ch 
+                        for ch in data]
+            else:
+                held = (1 if data.endswith("\033") else 
+                        2 if data.endswith("\033[") else 0)
+                if held:
+                    self._escape = data[-held:]
+                    self._escape_at = perf_counter()
+                    data = data[:-held]
+                keys = self._decode(data)
+            self._put(keys)
+
+    def escape_timeout(self):
+        """
+            :return: float - seconds left until the escape held at the end
+                of the last feed is flushed, which may be 0 or less if it's
+                due, or None if there isn't one
+        """
+        if not self._escape:
+            return None
+        return self._escape_at + self.ESCAPE_TIMEOUT - perf_counter()
+
+    def flush_escape(self):
+        """
+            Queues the keys of the escape held at the end of the last feed,
+            as nothing more of its sequence is coming, e.g. the esc key
+        """
+        with self._feeding:
+            escape, self._escape = self._escape, ""
+            self._put([key_table[ord(ch)] for ch in escape])
+
+    def _put(self, keys):
+        ring = self._ring
+        put = ring.put
+        for key in keys:
+            while not put(key):
+                self._full()
+        if keys:
+            ring.wakeup.set()
+
+    def _decode(self, data):
+        """
+            Returns the keys in data, which contains escape sequences
+            :param data: str
+            :return: [str]
+        """
+        keys, direc = [], self.direc
+        i, end = 0, len(data)
+        while i < end:
+            ch = data[i]
+            # Esc followed by [ and a direction letter is an arrow key.
+            # Anything else after Esc is a key of its own
+            if ch == "\033" and data[i + 1:i + 2] == "[" and \
+                    data[i + 2:i + 3] in direc:
+                keys.append(direc[data[i + 2]])
+                i += 3
+                continue
+            keys.append(key_table[ord(ch)] if ch < "\x80" else ch)
+            i += 1
+        return keys
+
+    def _full(self):
+        """
+            Called when a key is fed while the ring is full. Whoever feeds a
+            KeyDecoder also takes the keys out, between feeds, so the ring
+            grows to hold them
+        """
+        self._ring.grow()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_key_or_none(self):
+        """
+            primary interface for this class. Dequeues, and returns the last 
+            pressed char if no key has been pressed since the last time this 
+            was called and the queue is empty, returns None
+            NOTE: Your applications event loop must call this frequently, as 
+            this queue is FIFO, so each time the method is called, you will
+            get the first key that was pressed since the last time the
+            method was called
+        """
+        return self._ring.get()
+
+    def take_repeats(self, key):
+        """
+            Dequeues the presses of 'key' that are waiting right behind the
+            one just returned, as when a key is held down and auto-repeats,
+            and returns how many there were. The first other key waiting is
+            left where it was
+            :param key: str - the key that was just returned
+            :return: int
+        """
+        ring, count = self._ring, 0
+        while ring.peek() == key:
+            ring.get()
+            count += 1
+        return count
+
+    def wait(self, timeout=None):
+        """
+            Sleeps until there is a key to get, wake is called, or 'timeout'
+            seconds pass, rather than polling get_key_or_none. An escape
+            held at the end of the last feed is flushed once it's due, so a
+            lone esc isn't held until the next key
+            :param timeout: float - seconds, or None for no limit
+            :return: bool - whether there is a key to get
+        """
+        if not len(self._ring):
+            due = self.escape_timeout()
+            if due is None or (timeout is not None and timeout <= due):
+                self._ring.wakeup.wait(timeout)
+            elif due <= 0 or not self._ring.wakeup.wait(due):
+                self.flush_escape()
+        return bool(len(self._ring))
+
+    def wake(self):
+        """
+            Wakes whoever is in wait, or the next call to it, from any thread
+        """
+        self._ring.wakeup.set()
+
+class MacKeyboard(Keyboard, KeyDecoder):
     """
         Handler for retrieving keyboard keys as they are pressed by a user of a 
         macintosh computer. The primary interface for this class is get_key_or_none
@@ -23,20 +215,39 @@ class MacKeyboard(Keyboard):
     
     def __init__(self):
         """
-            Initiates this keyboard, starts the thread running and catching 
-            user input
+            Initiates this keyboard. Nothing is read from stdin, and the
+            terminal is left as it is, until the keyboard is started
+        """
+        Keyboard.__init__(self)
+        KeyDecoder.__init__(self)
+        self.daemon = True
+        self.settings = None
+        self.running = False
+
+    def _full(self):
+        # The ring is only ever taken from by the event loop, on another
+        # thread, so stdin waits until the loop catches up
+        sleep(0.001)
+
+    def wait(self, timeout=None):
+        # This thread flushes held escapes itself (see run), so the loop
+        # never puts keys in the ring, which it couldn't while this thread
+        # waits in _full for the loop to take some out
+        if not len(self._ring):
+            self._ring.wakeup.wait(timeout)
+        return bool(len(self._ring))
+
+    def start(self):
+        """
+            Saves the terminal's settings, so that stop can restore them, and
+            starts the thread running and catching user input
             NOTE: no other methods will be able to read from stdin, nor will 
             standard terminal behavior apply, as this class puts the terminal 
             into cbreak mode
         """
-        super().__init__()
-        self.daemon = True
-        self.keys = mac_keys
-        self.direc = mac_direc
-        self._deque= deque()
         self.settings = termios.tcgetattr(sys.stdin)
         self.running = True
-        self.start()
+        super().start()
         
     def stop(self):
         """
@@ -45,82 +256,50 @@ class MacKeyboard(Keyboard):
             started, (presumably cooked mode)
         """
         self.running = False
-        termios.tcsetattr(sys.stdin, termios.TCSANOW, self.settings)
+        if self.settings is not None:
+            termios.tcsetattr(sys.stdin, termios.TCSANOW, self.settings)
     
 
     def run(self):
         """
             Puts the keyboard into cbreak mode so it can read char by char
-            from stdin, and places each char into a queue
+            from stdin, and decodes the keys into the ring. An escape held
+            at the end of a read is flushed when no more arrives within
+            ESCAPE_TIMEOUT
         """
         setcbreak(sys.stdin)
-        while self.running:
-            ch = ord(sys.stdin.read(1))
-            self._deque.append(self.keys[ch])
 
-    def get_key_or_none(self):
-        """
-            primary interface for this class. Dequeues, and returns the last 
-            pressed char if no key has been pressed since the last time this 
-            was called and the queue is empty, returns None
-            NOTE: Your applications event loop must call this frequently, as 
-            this queue is FIFO, so each time the method is called, you will
-            get the first key that was pressed since the last time the
-            method was called
-        """
+        # Read raw bytes when we can, so that decoding doesn't depend on the
+        # locale, and take whatever has arrived rather than a byte at a time.
+        # Reading the file descriptor directly also means this thread never
+        # holds stdin's buffer lock, which would abort the interpreter's 
+        # shutdown while it waits for a key
         try:
-            # see if there is an key in the queue
-            ch = self._deque.popleft()
-        except IndexError:
-            # if no keys have been pressed, return None
-            return None
-        
-        if ch != 'esc':
-            # In the typical case where the key wasn't escape, just
-            # return the character
-            return ch
-
-        # If the key was Esc, it could either be the single key
-        # 'Escape', or part of a multicharacter sequence, such as 
-        # the up arrow which is encoded as Esc+[+A
-        
-        # Semi-recursive call to get the next char to see if it is 
-        # part of an escape sequence, or the character Esc itself
-        # adds them to a buffer, in case they need to be readded
-        # to the queue
-        buf = [self.get_key_or_none()]
-
-        # Probably an arrow key
-        if buf[-1] == '[':
-
-            # Same deal, check to see if the next key in the 
-            # queue creates a directional sequence or is just
-            # a poorly polled, unlikely sequence
-            buf.append(self.get_key_or_none())
-            if buf[-1] in self.direc:
-                
-                # Directional key. Look up and return which direction 
-                return self.direc[buf[-1]]
-        
-        # Else it was another sequence; readd the misread chars
-        # and return the original 'Esc'
-        return self.queue_and_return(ch, buf)
-
-    def queue_and_return(self, ch, buf):
-        """
-            Re-adds characters that were accidentally read in anticipation
-            of a multicharacter escape sequence, and returns the original
-            character
-            :param ch: str - the original character read
-            :param buf: [str] - the misread keys, possibly None's
-            :return: str - original character read
-        """
-        for char in buf[::-1]:
-            if char:
-                self._deque.appendleft(char)
-        return ch
+            fd = sys.stdin.fileno()
+        except (AttributeError, OSError, ValueError):
+            # stdin can't be waited on, so a held escape waits for the next
+            # read, which decodes it as its keys unless it finishes it
+            fd = None
+            stdin = getattr(sys.stdin, "buffer", sys.stdin)
+            read = stdin.read1 if hasattr(stdin, "read1") else stdin.read
+        else:
+            def read(size):
+                return os.read(fd, size)
+        while self.running:
+            due = self.escape_timeout()
+            if due is not None and fd is not None and \
+                    not select([fd], [], [], max(due, 0))[0]:
+                self.flush_escape()
+                continue
+            data = read(1024)
+            if not data:
+                # stdin was closed
+                self.flush_escape()
+                break
+            self.feed(data)
 
 mac_keys = {
+    0: 'ctrl+space',
     1: 'ctrl+a',
     2: 'ctrl+b',
     3: 'ctrl+c',
@@ -141,7 +320,8 @@ mac_keys = {
     18: 'ctrl+r',
     19: 'ctrl+s',
     20: 'ctrl+t',
-    22: 'ctrl+u',
+    21: 'ctrl+u',
+    22: 'ctrl+v',
     23: 'ctrl+w',
     24: 'ctrl+x',
     25: 'ctrl+y',
@@ -255,6 +435,10 @@ mac_keys = {
     131: "left"
 }
 
+# mac_keys as a table indexed by character code, covering every control and
+# ASCII character, which is what almost all typing is
+key_table = tuple(mac_keys[code] for code in range(128))
+
 mac_direc = {
         'A': 'up',
         'B': 'down',
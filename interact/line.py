@@ -0,0 +1,24 @@
+class Line:
+    """
+        Everything Interact caches about one line of its buffer, in a single
+        compact record kept beside the line's text:
+            * styles - the line's (length, style) runs, or None if it's plain
+            * colmap - its ColumnMap, which also gives its display width
+            * wrap - where it breaks into display rows at the line length
+        Records move with their lines as lines are inserted and removed
+        around them, and are only replaced when their own line is edited, so
+        nothing about the other lines is recomputed. Lines that nothing has
+        been cached for yet have no record at all (None in Interact._lines),
+        so the lines of a huge buffer that are never shown cost one pointer
+    """
+    __slots__ = ("styles", "colmap", "wrap")
+
+    def __init__(self, styles=None):
+        """
+            :param styles: [(int, str)] - the line's style runs, if any
+        """
+        self.styles = styles
+
+        # Built lazily, the first time the cursor or the renderer needs them
+        self.colmap = None
+        self.wrap = None
@@ -0,0 +1,41 @@
+def csi(n, code):
+    """
+        Returns the ANSI sequence Esc+[+n+code. Terminals take a missing
+        count to be 1, so a count of 1 is left out to save a byte
+    """
+    return "\033[{}{}".format(n if n != 1 else "", code)
+
+def plan_move(rows, col0, col1, reprint=None):
+    """
+        Returns the cheapest sequence, in bytes, that moves the cursor 'rows'
+        rows up or down and from column col0 to column col1. The candidates
+        are:
+            * relative moves (CUU/CUD, then CUF/CUB)
+            * carriage return, then a move right
+            * an absolute column (CHA)
+            * backspaces, for moves left
+            * printing the characters in between again, for short moves
+              right along the same row
+        Absolute rows (CUP) aren't candidates, since an inline app doesn't
+        know which screen row its text starts on. Ties go to the earlier
+        candidate in that list
+        :param rows: int - rows to move, negative for up
+        :param col0: int - current display column
+        :param col1: int - display column to move to
+        :param reprint: str - the rendered text between col0 and col1, if
+            they are on the same row and it can be printed again
+        :return: str
+    """
+    vertical = csi(abs(rows), "B" if rows > 0 else "A") if rows else ""
+    delta = col1 - col0
+    if not delta:
+        return vertical
+
+    candidates = [vertical + csi(abs(delta), "C" if delta > 0 else "D"),
+                  vertical + "\r" + (csi(col1, "C") if col1 else ""),
+                  vertical + csi(col1 + 1, "G")]
+    if delta < 0:
+        candidates.append(vertical + "\b" * -delta)
+    if reprint is not None and not rows:
+        candidates.append(reprint)
+    return min(candidates, key=lambda move: len(move.encode("utf-8")))
@@ -0,0 +1,278 @@
+import os
+from itertools import islice
+from select import select
+from weakref import finalize
+
+class Wakeup:
+    """
+        Lets one thread sleep until another has something for it, e.g. the
+        event loop until a key is typed. It's a file descriptor that becomes
+        readable when set: an eventfd where there are eventfds (Linux), or
+        else the read end of a pipe, the self-pipe trick. Setting it is a
+        single write, which is safe from any thread
+    """
+
+    def __init__(self):
+        if hasattr(os, "eventfd"):
+            self._read = self._write = os.eventfd(
+                0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self._signal = (1).to_bytes(8, "little")
+        else:
+            self._read, self._write = os.pipe()
+            os.set_blocking(self._read, False)
+            os.set_blocking(self._write, False)
+            self._signal = b"\0"
+
+        # The descriptors are closed along with the object
+        self._close = finalize(self, _close, {self._read, self._write})
+
+    def fileno(self):
+        return self._read
+
+    def set(self):
+        """
+            Wakes the thread waiting, or the next one to wait
+        """
+        try:
+            os.write(self._write, self._signal)
+        except BlockingIOError:
+            # The pipe is full of wakeups nobody has woken for yet, so one
+            # more would change nothing
+            pass
+
+    def wait(self, timeout=None):
+        """
+            Sleeps until it is set, or for 'timeout' seconds, and clears it
+            :param timeout: float - seconds, or None to wait for as long as
+                it takes
+            :return: bool - whether it was set
+        """
+        readable, _, _ = select([self._read], [], [], timeout)
+        if readable:
+            self.clear()
+        return bool(readable)
+
+    def clear(self):
+        try:
+            while os.read(self._read, 1024):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        self._close()
+
+def _close(fds):
+    for fd in fds:
+        os.close(fd)
+
+
+class KeyRing:
+    """
+        A ring buffer that passes keys from one thread, which puts them in,
+        to another, which gets them out, without a lock. Each index is only
+        ever moved by one of the two threads: the tail by the producer, once
+        the key is in its slot, and the head by the consumer, once the key
+        is out of it. The consumer can sleep on 'wakeup' until keys arrive,
+        rather than polling for them. E.g.:
+        >>> ring = KeyRing()
+        >>> ring.put("up")                  # on the producer's thread
+        True
+        >>> ring.wakeup.set()
+        >>> ring.wakeup.wait()              # on the consumer's
+        True
+        >>> ring.get()
+        'up'
+    """
+
+    def __init__(self, capacity=1024):
+        """
+            :param capacity: int - the most keys it holds, rounded up to a
+                power of two
+        """
+        size = 1
+        while size < capacity:
+            size *= 2
+        self._slots = [None] * size
+        self._mask = size - 1
+
+        # The index of the next key to get, and of the next slot to put one
+        # in. Neither wraps around, so the ring is empty when they're equal
+        # and full when they're a capacity apart
+        self._head = 0
+        self._tail = 0
+
+        self.wakeup = Wakeup()
+
+    def __len__(self):
+        return self._tail - self._head
+
+    def put(self, key):
+        """
+            Puts a key in the ring. Only the producer calls this
+            :return: bool - False if the ring was full, and the key wasn't
+                put in
+        """
+        tail = self._tail
+        if tail - self._head > self._mask:
+            return False
+        self._slots[tail & self._mask] = key
+        self._tail = tail + 1
+        return True
+
+    def get(self):
+        """
+            Takes the oldest key out of the ring. Only the consumer calls
+            this
+            :return: str, or None if the ring is empty
+        """
+        head = self._head
+        if head == self._tail:
+            return None
+        slot = head & self._mask
+        key, self._slots[slot] = self._slots[slot], None
+        self._head = head + 1
+        return key
+
+    def peek(self):
+        """
+            Returns the oldest key, leaving it in the ring, or None if the
+            ring is empty. Only the consumer calls this
+        """
+        head = self._head
+        if head == self._tail:
+            return None
+        return self._slots[head & self._mask]
+
+    def grow(self):
+        """
+            Doubles the capacity. Only safe when the producer and consumer
+            are the same thread, or aren't running at the same time
+        """
+        size = len(self._slots) * 2
+        keys = [self._slots[i & self._mask]
+                for i in range(self._head, self._tail)]
+        self._slots = keys + [None] * (size - len(keys))
+        self._mask = size - 1
+        self._head, self._tail = 0, len(keys)
+
+
+class LineRing:
+    """
+        The lines of a buffer whose oldest lines get evicted (see 
+        Scrollback), without moving the lines that are kept, or their 
+        indices. Line y stays at index y for as long as it's kept, so a y 
+        held from before an eviction still points at the same line. It's
+        used like the list it replaces: len() is the index after the last
+        line, negative indices count back from it, slices skip the lines
+        that were evicted, and iterating goes over the lines that are kept.
+        Indexing a line that was evicted raises IndexError. E.g.:
+        >>> lines = LineRing(["a", "b", "c"])
+        >>> lines.evict(2)
+        ['a', 'b']
+        >>> lines[2], lines.first, len(lines)
+        ('c', 2, 3)
+
+        Evicted lines leave a gap at the front of the list holding the rest,
+        which is only closed up once it is bigger than what is kept, so each
+        line evicted costs as much as moving one line, however big the
+        buffer is
+    """
+    __slots__ = ("first", "_items", "_offset")
+
+    def __init__(self, lines=(), first=0):
+        """
+            :param lines: [str] - the lines kept, from line 'first' on
+            :param first: int - the index of the oldest line kept
+        """
+        # The index of the oldest line kept. Every line before it was 
+        # evicted
+        self.first = first
+
+        # Private Variables
+        # Line y is at _items[y - _offset]. The items before the first
+        # line kept are the gap
+        self._items = list(lines)
+        self._offset = first
+
+    def __len__(self):
+        return self._offset + len(self._items)
+
+    def __bool__(self):
+        return len(self._items) > self.first - self._offset
+
+    def __iter__(self):
+        return islice(self._items, self.first - self._offset, None)
+
+    def __repr__(self):
+        return "LineRing({!r}, first={})".format(list(self), self.first)
+
+    # Indexing is made as cheap as it can be for lines that are kept, and 
+    # slices of them, as it's done several times for every key
+    def __getitem__(self, index):
+        if index.__class__ is int:
+            if index >= self.first:
+                return self._items[index - self._offset]
+            return self._items[self._index(index)]
+        start, stop = index.start, index.stop
+        if (start is not None and start >= self.first and 
+                (stop is None or stop >= start) and index.step is None):
+            offset = self._offset
+            return self._items[start - offset:
+                               None if stop is None else stop - offset]
+        return self._items[self._slice(index)]
+
+    def __setitem__(self, index, value):
+        if index.__class__ is int and index >= self.first:
+            self._items[index - self._offset] = value
+        elif index.__class__ is int:
+            self._items[self._index(index)] = value
+        else:
+            self._items[self._slice(index)] = value
+
+    def __delitem__(self, index):
+        if index.__class__ is int:
+            del self._items[self._index(index)]
+        else:
+            del self._items[self._slice(index)]
+
+    def evict(self, count):
+        """
+            Evicts the oldest 'count' lines
+            :return: [str] - the lines evicted
+        """
+        start = self.first - self._offset
+        lines = self._items[start:start + count]
+        self._items[start:start + len(lines)] = [None] * len(lines)
+        self.first += len(lines)
+        gap = self.first - self._offset
+        if gap > len(self._items) - gap:
+            del self._items[:gap]
+            self._offset = self.first
+        return lines
+
+    def _index(self, y):
+        """
+            Returns where line y is in _items
+        """
+        if y < 0:
+            y += len(self)
+        if y < self.first:
+            raise IndexError("line {} was evicted".format(y))
+        return y - self._offset
+
+    def _slice(self, index):
+        """
+            Returns the slice of _items that 'index' is, without the lines
+            that were evicted
+        """
+        start, stop, offset = index.start, index.stop, self._offset
+        if (start is not None and start >= self.first and 
+                (stop is None or stop >= start) and index.step is None):
+            return slice(start - offset, 
+                         None if stop is None else stop - offset)
+        start, stop, step = index.indices(offset + len(self._items))
+        if step != 1:
+            raise ValueError("lines can only be sliced in order")
+        start = max(start, self.first)
+        return slice(start - self._offset, max(stop, start) - self._offset)
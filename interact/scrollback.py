@@ -0,0 +1,110 @@
+class Scrollback:
+    """
+        Caps how much of a buffer is kept, for apps that run for days and
+        would otherwise hold every line they ever wrote. Once the buffer
+        goes over the cap, its oldest lines are evicted, and optionally
+        appended to a file. E.g.:
+        >>> app.scrollback = Scrollback(max_lines=100000, spill="old.log")
+
+        Once a buffer has evicted lines, it keeps them in a LineRing, so
+        the lines kept keep their indices: a y held from before an eviction
+        is still the same line after it, and line y is line y of everything
+        ever written to the buffer. Lines are evicted in batches, down to 
+        7/8 of the cap each time it's exceeded, as a cap on characters has
+        the lines counted again before each eviction, and spilled lines are
+        written and flushed once per batch.
+
+        A spill file given by path is opened by the scrollback, and closed
+        by close(), by Peacock.stop, or by using the scrollback as a context
+        manager. Files given as files are left to whoever opened them
+    """
+
+    # Eviction takes the buffer down to (SLACK - 1) / SLACK of the cap
+    SLACK = 8
+
+    def __init__(self, max_lines=None, max_chars=None, spill=None):
+        """
+            :param max_lines: int - the most lines kept
+            :param max_chars: int - the most characters kept, counting a
+                newline for each line. That's the bytes the text takes, for
+                ASCII text
+            :param spill: str or file - where evicted lines are appended,
+                as plain text, or None to drop them
+        """
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self.spill = open(spill, "a") if isinstance(spill, str) else spill
+
+        # How many lines have been evicted in all. For a scrollback the 
+        # buffer had from the start, that's the index of its first line kept
+        self.evicted = 0
+
+        # Private Variables
+        # Whether the spill file was opened here, and is closed here
+        self._owns_spill = isinstance(spill, str)
+
+        # An estimate of the characters in the buffer, which only ever
+        # over-counts what was written since they were last counted, or
+        # None when they haven't been
+        self._chars = None
+
+    def grew(self, chars):
+        """
+            Tells the scrollback that about 'chars' characters were added to
+            the buffer
+        """
+        if self._chars is not None:
+            self._chars += chars
+
+    def excess(self, lines):
+        """
+            Returns how many of the oldest lines to evict from 'lines' to
+            bring it back under the cap, or 0 if it is under
+            :param lines: [str] or LineRing - the buffer
+            :return: int
+        """
+        count, kept = 0, len(lines) - getattr(lines, "first", 0)
+        if self.max_lines is not None and kept > self.max_lines:
+            count = kept - self.max_lines + self.max_lines // self.SLACK
+        if self.max_chars is not None and (self._chars is None or
+                                           self._chars > self.max_chars):
+            # Deletes and edits aren't counted, so the lines are counted
+            # again to see if they're really over
+            self._chars = sum(map(len, lines)) + kept
+            if self._chars > self.max_chars:
+                goal = self.max_chars - self.max_chars // self.SLACK
+                chars, over = self._chars, 0
+                for line in lines:
+                    if chars <= goal:
+                        break
+                    chars -= len(line) + 1
+                    over += 1
+                count = max(count, over)
+        return count
+
+    def evict(self, lines):
+        """
+            Called with the lines that are being evicted
+            :param lines: [str]
+        """
+        self.evicted += len(lines)
+        if self._chars is not None:
+            self._chars -= sum(map(len, lines)) + len(lines)
+        if self.spill:
+            self.spill.write("".join(line + "\n" for line in lines))
+            self.spill.flush()
+
+    def close(self):
+        """
+            Closes the spill file, if the scrollback opened it. Lines 
+            evicted after are dropped
+        """
+        if self._owns_spill and self.spill:
+            self.spill.close()
+        self.spill = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,103 @@
+from collections import deque
+from math import ceil
+from time import perf_counter
+
+from peacock.format.styled import StyledText, pad_runs
+
+class Stream:
+    """
+        Appends text written from any number of threads to a Buffer, a frame
+        at a time. Writers only queue the text, so a thread logging thousands
+        of lines a second never waits on the terminal. Whoever draws (e.g.
+        the app's event loop) flushes the stream at most 'fps' times a
+        second, appending everything queued since the last frame in one go.
+        A window following the buffer then scrolls the rows it has drawn
+        rather than repainting them. E.g.:
+        >>> log = Stream(app.buffer("log"))
+        >>> log.write("connected\\n")      # from any thread
+        >>> if log.due():
+        ...     log.flush()
+        ...     app.render()
+
+        When a frame takes longer to draw than the frame interval, as it does
+        when the terminal can't keep up, the frames that would have been
+        drawn in the meantime are dropped: their text goes into the next one
+    """
+
+    def __init__(self, buffer, fps=30):
+        """
+            :param buffer: Buffer - what the text is appended to
+            :param fps: int - the most frames a second
+        """
+        self.buffer = buffer
+        self.interval = 1 / fps
+
+        # How many frames were drawn, and how many were dropped because the
+        # ones before them took too long
+        self.frames = 0
+        self.dropped = 0
+
+        # Private Variables
+        # Appending to and popping from either end of a deque are atomic, so
+        # writers and the drawing thread never need a lock
+        self._queue = deque()
+
+        # The time the next frame may be drawn at
+        self._due = 0
+
+    def write(self, text):
+        """
+            Queues text to be appended to the buffer. Safe to call from any
+            thread
+            :param text: str - may contain newlines and styles, as
+                Buffer.append takes
+        """
+        self._queue.append(text)
+
+    def due(self, now=None):
+        """
+            Whether there is queued text, and a frame may be drawn now
+            :param now: float - the time, from time.perf_counter
+        """
+        return bool(self._queue) and (perf_counter() if now is None else
+                                      now) >= self._due
+
+    def flush(self):
+        """
+            Appends everything queued to the buffer at once
+            :return: int - the number of writes appended
+        """
+        # Only what was queued when the flush began is taken, so writers 
+        # that keep up with it can't hold the frame back
+        queue = self._queue
+        chunks = [queue.popleft() for _ in range(len(queue))]
+        if chunks:
+            self.buffer.append(self._joined(chunks))
+        return len(chunks)
+
+    def drawn(self, start, end):
+        """
+            Tells the stream that a frame was drawn between times 'start' and
+            'end' (from time.perf_counter), which decides when the next one
+            may be
+        """
+        # Frames keep to the interval's beat, skipping the beats that went
+        # by while this one was drawn
+        beats = max(1, ceil((end - start) / self.interval))
+        self.frames += 1
+        self.dropped += beats - 1
+        self._due = start + beats * self.interval
+
+    @staticmethod
+    def _joined(chunks):
+        """
+            Joins the chunks written into one text. Joining strings drops the
+            runs of any StyledText among them, so those are joined with their
+            runs
+        """
+        if not any(isinstance(chunk, StyledText) for chunk in chunks):
+            return "".join(chunks)
+        texts = [chunk if isinstance(chunk, StyledText) else 
+                 StyledText.from_ansi(chunk) for chunk in chunks]
+        return StyledText("".join(texts), [run for text in texts for run in 
+                                           pad_runs(text.runs, len(text))])
@@ -0,0 +1,106 @@
+from array import array
+from functools import lru_cache
+from unicodedata import category, east_asian_width
+
+# Terminals advance to the next multiple of 8 when they print a tab
+TAB_SIZE = 8
+
+@lru_cache(maxsize=4096)
+def char_width(ch):
+    """
+        Returns the number of terminal columns the given character occupies:
+        0 for combining marks and other zero-width characters, 2 for East
+        Asian wide and full-width characters (which includes most emoji), and
+        1 for everything else. Tabs depend on where they are printed, so they
+        are handled by ColumnMap
+        :param ch: str - a single character
+        :return: int
+    """
+    if " " <= ch < "\x7f":
+        return 1
+    if category(ch) in ("Mn", "Me", "Cf", "Cc"):
+        return 0
+    if east_asian_width(ch) in ("W", "F"):
+        return 2
+    return 1
+
+class ColumnMap:
+    """
+        Maps between character indices in a line and the display columns
+        they start at. Both directions are O(1) once built, and plain ASCII
+        lines (by far the most common) need no table at all, since their
+        columns are their indices. E.g.:
+        >>> cmap = ColumnMap("日本a")
+        >>> cmap.column(2)
+        4
+        >>> cmap.index(3)
+        1
+    """
+    __slots__ = ("text", "width", "_cols", "_indices")
+
+    def __init__(self, text):
+        """
+            :param text: str - the line to map, without a newline
+        """
+        self.text = text
+
+        # _cols[i] is the column character i starts at, with one extra entry
+        # for the end of the line. None means column == index
+        self._cols = None
+
+        # _indices[c] is the index of the character covering column c, built
+        # lazily, since most callers only go from index to column
+        self._indices = None
+
+        if text.isascii() and text.isprintable():
+            self.width = len(text)
+            return
+
+        cols = array("L", [0])
+        col = 0
+        for ch in text:
+            if ch == "\t":
+                col += TAB_SIZE - col % TAB_SIZE
+            else:
+                col += char_width(ch)
+            cols.append(col)
+        self._cols = cols
+        self.width = col
+
+    @property
+    def plain(self):
+        """
+            True if every character in the line is one column wide, so that
+            columns and indices are the same
+        """
+        return self._cols is None
+
+    def column(self, index):
+        """
+            Returns the display column that the character at 'index' starts
+            at. Indices past the end of the line map to the end of the line
+            :param index: int
+            :return: int
+        """
+        if self._cols is None:
+            return min(index, self.width)
+        return self._cols[min(index, len(self.text))]
+
+    def index(self, column):
+        """
+            Returns the index of the character covering the given display
+            column. Columns in the middle of a wide character or a tab map
+            to that character, and columns past the end of the line map to
+            the end of the line
+            :param column: int
+            :return: int
+        """
+        if self._cols is None:
+            return max(0, min(column, self.width))
+        if self._indices is None:
+            indices = array("L")
+            for i in range(len(self.text)):
+                indices.extend([i] * (self._cols[i + 1] - self._cols[i]))
+            indices.append(len(self.text))
+            self._indices = indices
+        return self._indices[max(0, min(column, self.width))]
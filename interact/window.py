@@ -0,0 +1,422 @@
+from peacock.format.styled import StyledText, render_runs
+from .ring import LineRing
+from .width import ColumnMap
+
+class Buffer:
+    """
+        A named piece of text that can be shown in one or more Windows. Any
+        change to the buffer marks just the affected rows of the windows
+        showing it as dirty, so the next frame only repaints those rows. E.g.:
+        >>> log = Buffer("log")
+        >>> log.append("started\\n")
+        >>> log.set_line(0, format("{|green}", "started"))
+    """
+
+    def __init__(self, name, text=""):
+        """
+            :param name: str - the name apps use to refer to this buffer
+            :param text: str - initial contents
+        """
+        self.name = name
+
+        # Optional peacock.interact.Highlighter. Only the lines that are
+        # visible in some window are ever lexed
+        self.highlighter = None
+
+        # Optional peacock.interact.scrollback.Scrollback, capping how many
+        # of the oldest lines are kept
+        self.scrollback = None
+
+        # Private Variables
+        self._lines, self._styles = self._split(text)
+        self._windows = []
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __getitem__(self, y):
+        return self._lines[y]
+
+    @property
+    def first(self):
+        """
+            The index of the first line kept. Lines before it were evicted 
+            by the scrollback, and the lines kept keep their indices
+        """
+        return getattr(self._lines, "first", 0)
+
+    @property
+    def text(self):
+        return "\n".join(self._lines)
+
+    def set_text(self, text):
+        """
+            Replaces the whole contents of the buffer
+        """
+        self._replace(0, len(self._lines), text)
+
+    def set_line(self, y, text):
+        """
+            Replaces line y. If the text has newlines in it, the line is
+            replaced by several lines
+        """
+        self._replace(y, y + 1, text)
+
+    def append(self, text):
+        """
+            Adds text to the end of the buffer, continuing the last line
+        """
+        last = len(self._lines) - 1
+        runs = getattr(text, "runs", None)
+        if "\033[" in text and runs is None:
+            text = StyledText.from_ansi(text)
+            runs = text.runs
+        if self._styles[last] or runs:
+            text = StyledText(self._lines[last] + text,
+                              (self._styles[last] or [(len(self._lines[last]),
+                                                      "")]) + (runs or []))
+        else:
+            text = self._lines[last] + text
+        self._replace(last, last + 1, text)
+
+    def insert_lines(self, y, text):
+        """
+            Inserts text as new lines before line y
+        """
+        self._replace(y, y, text)
+
+    def delete_lines(self, y, count=1):
+        """
+            Deletes 'count' lines starting at line y
+        """
+        self._replace(y, y + count, None)
+
+    def _replace(self, start, stop, text):
+        """
+            Replaces lines [start, stop) with the lines of 'text', and marks
+            the rows of every window that changed as a result
+        """
+        lines, styles = self._split(text) if text is not None else ([], [])
+        self._lines[start:stop] = lines
+        self._styles[start:stop] = styles
+        if not self._lines:
+            # There's always a line, which comes after any that were evicted
+            self._lines[start:], self._styles[start:] = [""], [None]
+        if self.highlighter:
+            self.highlighter.edit(start, stop - start, len(lines))
+
+        # When the number of lines changes, everything below moves
+        end = start + len(lines) if len(lines) == stop - start else None
+        for window in self._windows:
+            window.mark(start, end)
+
+        if self.scrollback:
+            self.scrollback.grew(len(text) if text is not None else 0)
+            self._trim_scrollback()
+
+    def _trim_scrollback(self):
+        """
+            Evicts the oldest lines if the buffer is over the scrollback's
+            cap. The lines kept keep their indices, so windows showing them
+            go on showing them
+        """
+        count = min(self.scrollback.excess(self._lines), 
+                    len(self._lines) - 1 - self.first)
+        if not count:
+            return
+        if not isinstance(self._lines, LineRing):
+            self._lines, self._styles = LineRing(self._lines), \
+                                        LineRing(self._styles)
+        if self.highlighter:
+            self.highlighter.evict(self._lines, count)
+        self.scrollback.evict(self._lines.evict(count))
+        self._styles.evict(count)
+        for window in self._windows:
+            window.evicted(self.first)
+
+    @staticmethod
+    def _split(text):
+        """
+            Splits text into lines and their style runs
+        """
+        if "\033[" in text and not isinstance(text, StyledText):
+            text = StyledText.from_ansi(text)
+        lines = text.split("\n")
+        if isinstance(text, StyledText):
+            return lines, text.line_runs()
+        return lines, [None] * len(lines)
+
+    def _runs(self, y):
+        """
+            Returns the style runs line y should be shown with, if any
+        """
+        if self._styles[y]:
+            return self._styles[y]
+        if self.highlighter:
+            return self.highlighter.runs(self._lines, y)
+        return None
+
+
+class Window:
+    """
+        A rectangular view onto a Buffer. Windows are placed on screen by the
+        Split they belong to, and keep track of which of their rows need to
+        be repainted. Lines wider than the window are cut off.
+    """
+
+    def __init__(self, buffer, scroll=0, follow=False):
+        """
+            :param buffer: Buffer - the buffer to show
+            :param scroll: int - index of the first line shown
+            :param follow: bool - should the window scroll to keep the end
+                of the buffer in view as it grows (e.g. for logs)?
+        """
+        self.buffer = buffer
+        self.scroll = scroll
+        self.follow = follow
+        buffer._windows.append(self)
+
+        # Where the window is on screen, set by its layout
+        self.top = self.left = self.height = self.width = 0
+
+        # (x, y) position in the buffer to put the terminal cursor at when
+        # this window has focus
+        self.cursor = None
+
+        # Rows of the window that need repainting
+        self._dirty = set()
+
+        # How many rows the window's content has moved up since it was last
+        # drawn, when following the end of the buffer. The compositor
+        # scrolls them up on screen rather than repainting them
+        self._scrolled = 0
+
+    def place(self, top, left, height, width):
+        """
+            Moves the window to the given region of the screen, which
+            repaints all of it
+        """
+        self.top, self.left, self.height, self.width = top, left, height, width
+        self._scrolled = 0
+        self.mark(self.scroll)
+
+    def scroll_to(self, y):
+        """
+            Makes line y the first line shown
+        """
+        y = max(self.buffer.first, min(y, len(self.buffer) - 1))
+        if y != self.scroll:
+            self.scroll = y
+            self.mark(y)
+
+    def evicted(self, first):
+        """
+            Called when the lines of the buffer before 'first' were evicted.
+            The lines shown stay where they are on screen, unless some of 
+            them were evicted
+        """
+        if self.cursor and self.cursor[1] < first:
+            self.cursor = (0, first)
+        if self.scroll < first:
+            self.scroll = first
+            self.repaint()
+
+    def mark(self, start, stop=None):
+        """
+            Marks the rows showing lines [start, stop) as needing a repaint.
+            When stop is None, every row from start down is marked
+        """
+        if self.follow:
+            bottom = max(self.buffer.first, len(self.buffer) - self.height)
+            shift = bottom - self.scroll
+            if 0 < shift and self._scrolled + shift < self.height:
+                # Appending moved what is shown up, so the rows that were
+                # already drawn only have to be scrolled
+                self.scroll = bottom
+                self._scrolled += shift
+                self._dirty = {row - shift for row in self._dirty 
+                               if row >= shift}
+            elif shift:
+                self.scroll = bottom
+                self._scrolled = 0
+                start, stop = bottom, None
+        first = max(start - self.scroll, 0)
+        last = self.height if stop is None else \
+               min(stop - self.scroll, self.height)
+        self._dirty.update(range(first, last))
+
+    def repaint(self):
+        """
+            Marks every row as needing a repaint, instead of scrolling the
+            rows already drawn
+        """
+        self._scrolled = 0
+        self._dirty.update(range(self.height))
+
+    def rows(self):
+        """
+            Generates (screen_row, text) for each dirty row, with the text
+            rendered to exactly fill the width of the window, and clears the
+            dirty rows
+        """
+        lines = self.buffer._lines
+        if self.buffer.highlighter and self._dirty:
+            # Lex everything on screen in one go; nothing past it is lexed
+            self.buffer.highlighter.highlight(lines, self.scroll,
+                                              self.scroll + self.height)
+        for row in sorted(self._dirty):
+            y = self.scroll + row
+            text = lines[y] if y < len(lines) else ""
+            cmap = ColumnMap(text)
+
+            # Cut the line off at the edge of the window, and pad it out with
+            # spaces so that whatever was there before is covered
+            end = cmap.index(self.width)
+            runs = self.buffer._runs(y) if y < len(lines) else None
+            shown = render_runs(text[:end], runs) if runs else text[:end]
+            yield self.top + row, shown + " " * (self.width - cmap.column(end))
+        self._dirty.clear()
+
+    def windows(self):
+        yield self
+
+
+class Split:
+    """
+        Lays out windows (or other splits) side by side ("vertical") or one
+        above the other ("horizontal"), dividing the space by weight. E.g.:
+        >>> layout = Split("vertical", [Window(files), Window(preview)], [1, 3])
+    """
+
+    def __init__(self, direction, children, weights=None):
+        """
+            :param direction: str - "vertical" or "horizontal"
+            :param children: [Window or Split]
+            :param weights: [int] - relative size of each child. Defaults to
+                equal sizes
+        """
+        if direction not in ("vertical", "horizontal"):
+            raise ValueError("{} is not a split direction".format(direction))
+        self.direction = direction
+        self.children = children
+        self.weights = weights or [1] * len(children)
+
+    def place(self, top, left, height, width):
+        """
+            Divides the region between the children by weight. Any rounding
+            leftovers go to the last child
+        """
+        total = sum(self.weights)
+        space = width if self.direction == "vertical" else height
+        offset = 0
+        for i, (child, weight) in enumerate(zip(self.children, self.weights)):
+            size = space - offset if i == len(self.children) - 1 else \
+                   space * weight // total
+            if self.direction == "vertical":
+                child.place(top, left + offset, height, size)
+            else:
+                child.place(top + offset, left, size, width)
+            offset += size
+
+    def windows(self):
+        for child in self.children:
+            yield from child.windows()
+
+
+class Compositor:
+    """
+        Draws a layout of windows onto the whole of 'out'. Each call to
+        render() gathers the dirty rows of every window into a single frame,
+        so a change to one window never repaints the others, and the frame
+        goes out in one write and one flush. E.g.:
+        >>> screen = Compositor(sys.stdout, 80, 24, layout)
+        >>> files.append("\\nsetup.py")
+        >>> screen.render()
+    """
+
+    def __init__(self, out, width, height, layout):
+        """
+            :param out: file-descriptor - a TTY that supports ANSI sequences
+            :param width: int - columns on screen
+            :param height: int - rows on screen
+            :param layout: Window or Split - what to draw
+        """
+        self.out = out
+        self.layout = layout
+        self.escape_seq = "\033["
+
+        # The Window whose cursor is shown after each frame, if any
+        self.focus = None
+
+        # What was last drawn at each (screen row, left column), so that rows
+        # that are repainted with identical content can be skipped
+        self._drawn = {}
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        """
+            Lays the windows out again for a screen of the given size
+        """
+        self.width, self.height = width, height
+        self._drawn.clear()
+        self.layout.place(0, 0, height, width)
+
+    def windows(self):
+        return list(self.layout.windows())
+
+    def render(self):
+        """
+            Writes one frame containing every dirty row of every window
+            :return: int - number of rows repainted
+        """
+        frame, rows = [], 0
+        for window in self.layout.windows():
+            scroll = window._scrolled and self._scroll(window)
+            if scroll:
+                frame.append(scroll)
+            for row, text in window.rows():
+                key = (row, window.left)
+                if self._drawn.get(key) == text:
+                    continue
+                self._drawn[key] = text
+                rows += 1
+                frame.append("{}{};{}H{}".format(self.escape_seq, row + 1,
+                                                 window.left + 1, text))
+        if not frame:
+            return 0
+
+        focus = self.focus
+        if focus and focus.cursor:
+            x, y = focus.cursor
+            if 0 <= y - focus.scroll < focus.height:
+                column = ColumnMap(focus.buffer[y]).column(x)
+                frame.append("{}{};{}H".format(
+                    self.escape_seq, focus.top + y - focus.scroll + 1,
+                    focus.left + min(column, focus.width - 1) + 1))
+        self.out.write("".join(frame))
+        self.out.flush()
+        return rows
+
+    def _scroll(self, window):
+        """
+            Returns the sequence that scrolls the rows a window has already
+            drawn up by as many rows as its content moved, using a scrolling
+            region (DECSTBM) so nothing outside of the window moves. Regions
+            span whole rows, so windows that share their rows with others
+            are repainted instead, and "" is returned
+        """
+        shift, window._scrolled = window._scrolled, 0
+        if window.left or window.width != self.width:
+            window.repaint()
+            return ""
+
+        # The terminal now shows each row's text 'shift' rows further up
+        top, bottom = window.top, window.top + window.height
+        for row in range(top, bottom):
+            if row + shift < bottom and (row + shift, 0) in self._drawn:
+                self._drawn[(row, 0)] = self._drawn[(row + shift, 0)]
+            else:
+                self._drawn.pop((row, 0), None)
+        return "{0}{1};{2}r{0}{3}S{0}r".format(self.escape_seq, top + 1, 
+                                               bottom, shift if shift != 1 
+                                               else "")
@@ -0,0 +1,73 @@
+from bisect import bisect_right
+
+# The row starts of every plain line that fits on one row, shared, since
+# most lines do
+ONE_ROW = (0,)
+
+class Wrap:
+    """
+        Records where a line breaks into display rows when it is soft wrapped
+        at a given line length. Built from the line's ColumnMap, so wide 
+        characters that don't fit at the end of a row move to the next row, 
+        as they do in the terminal. E.g.:
+        >>> wrap = Wrap(ColumnMap("hello world"), 4)
+        >>> wrap.rows
+        3
+        >>> wrap.position(ColumnMap("hello world"), 9)
+        (2, 1)
+    """
+    __slots__ = ("text", "line_length", "starts")
+
+    def __init__(self, cmap, line_length):
+        """
+            :param cmap: ColumnMap - column map of the line to wrap
+            :param line_length: int - number of columns in a display row
+        """
+        self.text = cmap.text
+        self.line_length = line_length
+
+        # Index of the first character of each display row. Lines where 
+        # every character is one column wide break every line_length 
+        # characters, which a range describes without storing anything
+        if cmap.plain:
+            if len(cmap.text) <= line_length:
+                self.starts = ONE_ROW
+            else:
+                self.starts = range(0, len(cmap.text), line_length)
+            return
+
+        starts = [0]
+        col = 0
+        for i in range(len(cmap.text)):
+            width = cmap.column(i + 1) - cmap.column(i)
+            if col + width > line_length and col:
+                starts.append(i)
+                col = 0
+            col += width
+        self.starts = starts
+
+    @property
+    def rows(self):
+        """
+            The number of display rows the line takes up
+        """
+        return len(self.starts)
+
+    def position(self, cmap, x):
+        """
+            Returns the display row (relative to the line's first row) and
+            column of position x in the line.
+            The end of a line that exactly fills its last row is at the 
+            start of the row after it, which is where the next character 
+            printed goes. The terminal's cursor waits on the last column 
+            until then, so Interact finishes the wrap before doing anything
+            else from there (see InteractANSIMac._unwrap)
+            :param cmap: ColumnMap - column map of the line
+            :param x: int - character index into the line
+            :return: (int, int)
+        """
+        row = bisect_right(self.starts, x) - 1
+        col = cmap.column(x) - cmap.column(self.starts[row])
+        if col >= self.line_length:
+            return row + 1, 0
+        return row, col
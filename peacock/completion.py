@@ -0,0 +1,101 @@
+from peacock.interact.complete import Completer
+
+class Completion:
+    """
+        Completes the word before the cursor from the words already in the
+        buffer, in a popup. Every app has one, as app.completion, and bind()
+        attaches it to a key of a mode. E.g.:
+        >>> app.completion.bind()
+        Then, in insert mode, tab completes the word before the cursor. A
+        word with a single completion is completed straight away; otherwise
+        the popup lists the most frequent ones, tab and the arrow keys pick
+        one, enter takes it and escape closes the popup. Any other key
+        closes it and is handled as usual.
+
+        The words are counted by a Completer that the buffer's edits keep up
+        to date (see Interact.completer), so nothing is counted until the
+        first completion, and the buffer is never rescanned after it
+    """
+
+    def __init__(self, app, limit=10):
+        """
+            :param app: Peacock - the app whose buffer is completed
+            :param limit: int - the most completions the popup lists
+        """
+        self.app = app
+        self.limit = limit
+
+        # The completions listed in the popup, and the index of the one
+        # picked, while it's open
+        self.candidates = None
+        self.selected = None
+
+        # Private Variables
+        self._prefix = None
+        self._key = None
+
+    @property
+    def completer(self):
+        """
+            The app's Completer, which is made the first time it's needed
+        """
+        interact = self.app.interact
+        if interact.completer is None:
+            interact.completer = Completer(self.limit)
+        return interact.completer
+
+    def complete(self):
+        """
+            Completes the word before the cursor: straight away if it has one
+            completion, and by opening the popup if it has several
+            :return: [str] - the completions found
+        """
+        interact = self.app.interact
+        line = interact._buffer[interact.y]
+        prefix = self.completer.prefix(line, interact.x)
+        candidates = (self.completer.complete(interact._buffer, prefix)
+                      if prefix else [])
+        if len(candidates) == 1:
+            self.app.write(candidates[0][len(prefix):])
+        elif candidates:
+            self._prefix, self.candidates, self.selected = prefix, candidates, 0
+            interact.show_popup(candidates, 0)
+            self.app.await_key(self._handle)
+        return candidates
+
+    def close(self):
+        """
+            Closes the popup, without completing anything
+        """
+        self.app.interact.hide_popup()
+        self.candidates = self.selected = self._prefix = None
+
+    def bind(self, mode="insert", key="tab"):
+        """
+            Binds completion to a key of the given mode. The words in the
+            buffer are first counted when it's pressed
+            :param mode: str - name of the mode, which has to have been added
+            :param key: str - key that completes, and picks the next
+                completion while the popup is open
+        """
+        self._key = key
+
+        @self.app.on(key, mode=mode)
+        def complete_handler(app, *args):
+            self.complete()
+
+    def _handle(self, key):
+        # Keys are passed here while the popup is open
+        if key in (self._key, "down", "up"):
+            step = -1 if key == "up" else 1
+            self.selected = (self.selected + step) % len(self.candidates)
+            self.app.interact.show_popup(self.candidates, self.selected)
+            self.app.await_key(self._handle)
+        elif key == "enter":
+            word, prefix = self.candidates[self.selected], self._prefix
+            self.close()
+            self.app.write(word[len(prefix):])
+        else:
+            self.close()
+            if key != "esc":
+                return self.app._dispatch(key)
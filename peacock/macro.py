@@ -0,0 +1,104 @@
+class Macros:
+    """
+        Records the keys an app handles into named registers, and plays them
+        back, as Vim's q and @ do. Every app has one, as app.macros, and
+        bind() attaches it to keys of a mode. E.g.:
+        >>> app.add_mode(Mode("normal", keyboard=app.keyboard))
+        >>> app.macros.bind("normal")
+        Then, in normal mode, "qa" starts recording into register a, "q"
+        stops, and "@a" plays it back.
+
+        Playback runs the keys through the app's modes with rendering
+        suspended (see Interact.suspended), so a macro played a thousand
+        times costs only the edits it makes, and one redraw at the end
+    """
+
+    def __init__(self, app):
+        """
+            :param app: Peacock - the app whose keys are recorded and played
+        """
+        self.app = app
+
+        # register name: str -> [str] - the keys recorded into it
+        self.registers = {}
+
+        # The name of the register being recorded into, if any
+        self.recording = None
+
+        # Private Variables
+        self._keys = None
+        self._playing = set()
+
+    def start(self, register):
+        """
+            Starts recording the keys the app handles into the given register,
+            replacing what it held
+            :param register: str - name of the register, usually a letter
+        """
+        self.stop()
+        self.recording = register
+        self._keys = []
+
+    def stop(self):
+        """
+            Stops recording, and saves what was recorded in the register
+        """
+        if self.recording is not None:
+            self.registers[self.recording] = self._keys
+            self.recording = None
+            self._keys = None
+
+    def record(self, key):
+        """
+            Called by the app with each key it handles
+        """
+        if self.recording is not None:
+            self._keys.append(key)
+
+    def play(self, register, times=1):
+        """
+            Handles the keys in the given register 'times' times over, without
+            rendering anything until the last one has been handled. A macro
+            that plays its own register would never end, so that is ignored
+            :param register: str - name of the register to play
+            :param times: int - how many times to play it
+        """
+        keys = self.registers.get(register)
+        if not keys or register in self._playing:
+            return
+        self._playing.add(register)
+        try:
+            with self.app.interact.suspended():
+                for _ in range(times):
+                    for key in keys:
+                        self.app._dispatch(key)
+        finally:
+            self._playing.discard(register)
+        self.app.render()
+
+    def bind(self, mode, record="q", play="@"):
+        """
+            Binds recording and playing macros to keys of the given mode.
+            The key after either one names the register. The record key
+            stops the recording that is underway, if there is one, and isn't
+            part of it
+            :param mode: str - name of the mode, which has to have been added
+            :param record: str - key that starts and stops recording
+            :param play: str - key that plays a register, as many times as
+                the count typed before it, if the mode has counts
+        """
+        @self.app.on(record, mode=mode)
+        def record_handler(app, *args):
+            if self.recording is not None:
+                # The key that ends a recording was recorded as it arrived
+                if self._keys and self._keys[-1] == record:
+                    self._keys.pop()
+                self.stop()
+            else:
+                app.await_key(self.start)
+
+        @self.app.on(play, mode=mode)
+        def play_handler(app, *args):
+            # In a mode with counts, "3@a" plays register a three times
+            count = app.count
+            app.await_key(lambda register: self.play(register, count))
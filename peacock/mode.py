@@ -10,7 +10,8 @@ class Mode:
         can have many modes. Users of applications like Vim will be familiar 
         with the concept of moded applications.
     """
-    def __init__(self, name, keyboard, handlers=None, parent=None):
+    def __init__(self, name, keyboard, handlers=None, parent=None, 
+                 counts=False):
         """
             Modes are created with a name, and a keyboard reference, so that it
             can determine what keys are valid. Optionally, pre-defined handlers
@@ -30,15 +31,24 @@ class Mode:
             :param parent: Mode - the mode that should be treated as this
                 mode's parent. Whenever there is a miss for a key handler in 
                 this app, the parents will be searched
+            :param counts: bool - whether digits typed in this mode are a 
+                count for the key after them, as in Vim's "10j". The app 
+                passes the count to that key's handler as app.count. A "0"
+                with no digits before it is still a key of its own
         """
         self.name = name
-        self.valid_keys = keyboard.keys.values()
+        self.valid_keys = set(keyboard.keys.values())
         
         # handlers: str -> ((str, int) -> None)
         self.handlers = handlers or {}
         self.parent = parent
+        self.counts = counts
 
-    def on(self, key):
+        # The keys whose handlers act on app.count themselves, so that 
+        # presses of them waiting to be handled can be handled as one
+        self.counted = set()
+
+    def on(self, key, counted=False):
         """
             Add "on-key" handlers to this mode. Called with a key, (soon to
             support multi-key sequences), and returns a decorator that 
@@ -46,6 +56,9 @@ class Mode:
             handled by the given function. The function will be called with: 
                 * str - the text of the line that the cursor is in
                 * int - the current x position of the cursor in that line 
+            When 'counted' is set, the function does what pressing the key
+            app.count times over would, so that when a key is held down, the
+            repeats waiting behind it are handled by one call
             E.g.:
             >>> app = Peacock()
             >>> normal = Mode("normal", keyboard=app.keyboard)
@@ -55,8 +68,11 @@ class Mode:
             ...     # Switches back to insert mode    
             ...     app.set_mode("insert")
         """
-        # Validate that it is in fact a valid key sequence
-        if key not in self.valid_keys:
+        # Validate that it is in fact a valid key sequence. Any printable
+        # character is a key too, since keyboards can type far more of them
+        # than the key names list
+        if key not in self.valid_keys and not (len(key) == 1 and 
+                                               key.isprintable()):
             raise ValueError("{} not a valid key".format(key))
 
         def inst_decorator(f):
@@ -68,6 +84,10 @@ class Mode:
                 :return: f - unaltered
             """
             self.handlers[key] = f 
+            if counted:
+                self.counted.add(key)
+            else:
+                self.counted.discard(key)
             return f
         return inst_decorator
  
@@ -1,9 +1,30 @@
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import wraps
 from io import StringIO
 import sys
-from threading import Thread
+from threading import Lock, Thread, current_thread, get_ident
+from time import perf_counter
 
+from .completion import Completion
+from .macro import Macros
 from .mode import Mode, ModeError
 from peacock.interact import MacKeyboard, InteractANSIMac
+from peacock.interact.stream import Stream
+from peacock.interact.window import Buffer, Compositor
+
+def _on_loop(method):
+    """
+        Decorates a method that changes the buffer or the cursor, so that 
+        when it's called from a thread other than the event loop's, while
+        the loop is running, it's queued for the loop to call (see 
+        Peacock.call) rather than racing with the loop's handlers
+    """
+    @wraps(method)
+    def call(self, *args, **kwargs):
+        return self._route(method, self, *args, **kwargs)
+    return call
 
 class Peacock(Thread):
     """
@@ -34,7 +55,7 @@ class Peacock(Thread):
                    'left': (0, -1), 'right': (0, 1)}
     
     def __init__(self, echo=True, running=True, insert=True, line_length=120,
-                 out=sys.stdout, debug=False):
+                 out=sys.stdout, debug=False, keyboard=None):
         """
             Instantiates a Peacock app and begin's it running in the its own
             thread. Once created, it will perform various option changes to
@@ -45,18 +66,24 @@ class Peacock(Thread):
             :param echo: bool - Should keystrokes be echoed to 'out' as they
                 are typed?
             :param running: bool - should this thread be started immediately?
+                If not, nothing reads stdin or touches the terminal until
+                start() or run() is called
             :param insert: bool - When the user is typing with text in front
                 of the cursor, should the characters be inserted behind the
                 trailing text, or should they overwrite?
-            :param line-length: int - How long do we allow lines to be be?
+            :param line-length: int - How wide is 'out'? Longer lines are soft
+                wrapped onto several rows
             :param out: file-descriptor - should be a TTY or PTY fd that is
                 connected to a terminal-emulator that supports ANSI control
                 sequences
             :param debug: bool - debug mode
+            :param keyboard: Keyboard - where keys come from. Defaults to a 
+                MacKeyboard reading stdin. Apps that are fed keys by someone 
+                else (see peacock.server) pass a KeyDecoder, with running=False
         """
         super().__init__()
         self.echo = echo
-        self.running = running 
+        self.running = False
         self.insert = insert
         self.line_length = line_length
         self.out = out
@@ -64,7 +91,10 @@ class Peacock(Thread):
         
         # A keyboard interface for the current app. I believe the 'MacKeyboard'
         # interface will work for Unix systems as well, but it must be tested
-        self.keyboard = MacKeyboard()
+        # It doesn't start reading stdin, or put the terminal into cbreak 
+        # mode, until the app is started
+        self.keyboard = keyboard or MacKeyboard()
+        self._keyboard_started = False
         self.interact = InteractANSIMac(self.keyboard, out, line_length)
         
         # Additionally, the app and users can create modes, in which keys have
@@ -83,20 +113,73 @@ class Peacock(Thread):
         # users would expect, but they can easily be overriden with the
         # 'on' decorator
         self.register_default_handlers()
+
+        # Apps can also show several named buffers at once, laid out in split
+        # windows by `layout`. The compositor then redraws whichever windows
+        # changed after each key is handled
+        self.buffers = {}
+        self.compositor = None
+
+        # Other threads append to buffers through streams, which the event
+        # loop flushes a frame at a time
+        self.streams = {}
+
+        # When set, a peacock.peacock.record.Recorder that logs every key the
+        # app handles
+        self.recorder = None
+
+        # When set, a peacock.peacock.profiler.Profiler that times every 
+        # handler the app calls
+        self.profiler = None
+
+        # Keys can be recorded into registers and played back (see 
+        # peacock.peacock.macro)
+        self.macros = Macros(self)
+
+        # The word before the cursor can be completed from the words in the
+        # buffer, once completion is bound to a key (see 
+        # peacock.peacock.completion)
+        self.completion = Completion(self)
+
+        # The count the running handler was given: how many times it was
+        # pressed, or the digits typed before it in a mode with counts (see
+        # Mode). 1 otherwise
+        self.count = 1
+
+        # When set, the next key is passed to this instead of a handler
+        self._awaiting = None
+
+        # The id of the thread the event loop is running on, while it is
+        self._loop = None
+
+        # Calls made from other threads while the loop is running, which it
+        # makes for them: (Future, function, args, kwargs). Appending to and
+        # popping from either end of a deque are atomic, but a call has to
+        # see the loop running and be queued in one step, or it could be
+        # queued after the loop has made its last calls (see _queue)
+        self._calls = deque()
+        self._calls_lock = Lock()
+
+        # The count typed so far, before the key it is for, or None
+        self._count = None
         
 
         ############################## CURSOR METHODS #########################
         # To ease use, a number of utility methods are wrapped here to 
         # interface with the interact library
-        self.move_cursor = self.interact.move_cursor
-        self.move_cursor_to = self.interact.move_cursor_to
-        self.move_cursor_to_x = self.interact.move_cursor_to_x
-        self.move_cursor_to_eol = self.interact.move_cursor_to_eol
-        self.move_cursor_to_beginning = self.interact.move_cursor_to_beginning
-        self.save_cursor = self.interact.save_cursor
+        # The ones that move the cursor are queued for the event loop when 
+        # they're called from another thread, as writes are (save_cursor is
+        # a method of its own, as the closure it returns moves it too)
+        self.move_cursor = self._routed(self.interact.move_cursor)
+        self.move_cursor_to = self._routed(self.interact.move_cursor_to)
+        self.move_cursor_to_x = self._routed(self.interact.move_cursor_to_x)
+        self.move_cursor_to_eol = self._routed(self.interact.move_cursor_to_eol)
+        self.move_cursor_to_beginning = self._routed(
+            self.interact.move_cursor_to_beginning)
 
         # Let's GOOOO
-        self.start()
+        if running:
+            self.start()
 
     def trailing_output(self):
         """
@@ -112,29 +195,200 @@ class Peacock(Thread):
         after_cursor = '\n'.join(self._buffer[self._y:])
         return after_cursor[self._x:]
 
+    @_on_loop
+    def save_cursor(self):
+        """
+            Saves the current location of the cursor, and returns a closure
+            that moves the cursor back there when called. Like the other 
+            cursor methods, both are queued for the event loop when they're
+            called from another thread, in which case save_cursor returns
+            the Future of the closure. E.g.:
+            >>> restore = app.save_cursor()
+            >>> app.move_cursor_to(0, 0)
+            >>> app.write("# ")
+            >>> restore()
+        """
+        return self._routed(self.interact.save_cursor())
+
+    def start(self):
+        """
+            Starts the keyboard reading keys, and the event loop handling them
+            on the app's own thread. Apps created with running=False call this
+            once they are set up, or call run() to handle keys on the calling
+            thread instead
+        """
+        self._start_keyboard()
+        self.running = True
+        super().start()
+
     def run(self):
         """
             Main event loop of the app. On each loop, checks to see if it is
             still running, and then if there is a key queued, triggers the key
-            handler for that key
+            handler for that key. With nothing to do, it sleeps until a key
+            is typed or a call is queued, or until the next frame of any 
+            streams. Called directly, rather than by start(), the loop runs
+            on the calling thread until the app is stopped
         """
-        while self.running:
-            key = self.keyboard.get_key_or_none()
-            if key:
-                self.handle(key)
+        if current_thread() is not self:
+            self._start_keyboard()
+            self.running = True
+        self._loop = get_ident()
+        try:
+            while self.running:
+                key = self.keyboard.get_key_or_none()
+                if key:
+                    self.handle(key, self._repeats(key))
+                if self._calls:
+                    self._make_calls()
+                if self.streams:
+                    self.flush_streams()
+                if not key and not self._calls:
+                    self.keyboard.wait(self._idle_timeout())
+        finally:
+            # Calls queued before the loop stopped are still made. Once
+            # _loop is cleared no more are queued, they're made directly
+            with self._calls_lock:
+                self._loop = None
+            self._make_calls()
+            self._close()
+
+    def _idle_timeout(self):
+        # Streams are written to without waking the loop, so it wakes for
+        # their frames. Otherwise it sleeps until it's woken
+        if not self.streams:
+            return None
+        return min(stream.interval for stream in self.streams.values())
+
+    def call(self, function, *args, **kwargs):
+        """
+            Calls 'function' on the event loop's thread, between keys, and
+            returns a concurrent.futures.Future of its result. Called on the
+            loop's thread, or while the loop isn't running, 'function' is
+            called straight away. The app's methods that change the buffer
+            or the cursor (write, delete, the cursor methods and so on) are
+            made this way when they're called from another thread, and then
+            return the Future rather than their result. E.g.:
+            >>> app.call(app.interact.delete_line).result()   # waits for it
+            :return: concurrent.futures.Future
+        """
+        future = self._queue(function, args, kwargs)
+        if future is None:
+            future = Future()
+            self._resolve(future, function, args, kwargs)
+        return future
+
+    def _route(self, function, *args, **kwargs):
+        """
+            Calls 'function' straight away and returns its result, or, from
+            a thread other than the running loop's, queues it and returns
+            the Future of it, as call does. This is how the methods that
+            change the buffer or the cursor are made (see _on_loop and
+            _routed)
+        """
+        future = self._queue(function, args, kwargs)
+        if future is None:
+            return function(*args, **kwargs)
+        return future
+
+    def _queue(self, function, args, kwargs):
+        """
+            Queues a call for the event loop, unless the loop isn't running
+            or this is the loop's own thread, in which case the call has to
+            be made by the caller
+            :return: concurrent.futures.Future - of the queued call, or None
+                if it wasn't queued
+        """
+        loop = self._loop
+        if loop is None or loop == get_ident():
+            return None
+        future = Future()
+        with self._calls_lock:
+            # The loop may have stopped since _loop was read
+            if self._loop is None:
+                return None
+            self._calls.append((future, function, args, kwargs))
+        self.keyboard.wake()
+        return future
+
+    def _make_calls(self):
+        """
+            Makes the calls queued for the event loop, as one batch that is
+            drawn once, as feed() draws the keys it handles
+        """
+        # Only what was queued when this began is taken, so threads that 
+        # keep queueing can't hold the loop up
+        calls = self._calls
+        batch = [calls.popleft() for _ in range(len(calls))]
+        if not batch:
+            return
+        with self.interact.suspended():
+            for future, function, args, kwargs in batch:
+                self._resolve(future, function, args, kwargs)
+        self.render()
+
+    @staticmethod
+    def _resolve(future, function, args, kwargs):
+        # The calling thread gets whatever the call raises, rather than it
+        # stopping the loop. KeyboardInterrupt, SystemExit and the like 
+        # still stop it, once the calling thread has been given them too
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(function(*args, **kwargs))
+            except Exception as error:
+                future.set_exception(error)
+            except BaseException as error:
+                future.set_exception(error)
+                raise
+
+    def _routed(self, method):
+        """
+            Returns 'method' wrapped as _on_loop wraps the app's own methods
+        """
+        @wraps(method)
+        def call(*args, **kwargs):
+            return self._route(method, *args, **kwargs)
+        return call
+
+    def _close(self):
+        # Ends the recording and the profiling, and closes the spill files,
+        # once nothing on the loop can be using them. Closing twice, as a
+        # stop() racing the loop's start can, closes nothing more
+        self.stop_recording()
+        self.stop_profiling()
+        self._close_scrollbacks()
+
+    def _close_scrollbacks(self):
+        # Closes the spill files the app's scrollbacks opened
+        buffers = [self.interact] + list(self.buffers.values())
+        for buffer in buffers:
+            if buffer.scrollback:
+                buffer.scrollback.close()
+
+    def _start_keyboard(self):
+        # Only the first start touches the terminal
+        if not self._keyboard_started:
+            self._keyboard_started = True
+            self.keyboard.start()
 
     def stop(self):
         """
             Stops the application from running on the next iteration of the 
-            event loop, and kills the keyboard handler
+            event loop, and kills the keyboard handler. The recording, the
+            profiler and the scrollbacks' spill files are closed by the loop
+            once it has stopped, as it may be handling a key that uses them.
+            When the loop isn't running, they're closed straight away
         """
         self.running = False
         self.keyboard.stop()
+        self.keyboard.wake()
+        if self._loop is None:
+            self._close()
 
     ############################################################################
     ########################### EVENT HANDLER METHODS ##########################
     ############################################################################
-    def on(self, key, mode="insert"):
+    def on(self, key, mode="insert", counted=False):
         """
             Add "on-key" handlers to the given mode. Raises `ModeException` if 
             the specified mode has not been registered with the app. 
@@ -153,40 +407,220 @@ class Peacock(Thread):
             ... def delete_to_beginning(app, cur_line, x):
             ...     # Deletes the text before the cursor when in insert mode 
             ...     app.delete(x)
+            A 'counted' handler does what pressing its key app.count times 
+            would, in one go. When its key is held down, the presses that
+            pile up while it runs are handled by one call, with their count
+            >>> @app.on("j", mode="normal", counted=True)
+            ... def down(app, *args):
+            ...     app.move_cursor(app.count, 0)
         """
         # TODO: add multi-key sequences
         try:
-            return self.modes[mode].on(key)
+            return self.modes[mode].on(key, counted)
         except KeyError:
             raise ModeError("{} has not been added yet. All modes must be "
                             "added via Peacock.add_mode() before they can be "
                             "used.".format(mode))
     
-    def handle(self, key):
+    @_on_loop
+    def handle(self, key, count=1):
         """
-            Executes whatever action is associated with the given key
+            Executes whatever action is associated with the given key, and
+            then draws a frame for any windows that it changed
             :param key: str - a key code or sequence (non-None)
+            :param count: int - how many times the key was pressed, which 
+                has to be 1 unless its handler is counted
+        """
+        # Everything the handler draws goes out as one frame, so that cursor
+        # moves it makes one after another are merged
+        with self.interact.frame():
+            result = self._handle(key, count)
+        self.render()
+        return result
+
+    @_on_loop
+    def feed(self, keys):
+        """
+            Handles a whole sequence of keys as handle() would, one after 
+            another, but only draws once they have all been handled: the 
+            lines of the buffer they changed are redrawn, and then any
+            windows they changed. Scripts and tests can drive an app this way
+            without a keyboard, and it costs little more than the handlers
+            themselves. E.g.:
+            >>> app = Peacock(running=False, keyboard=KeyDecoder())
+            >>> app.feed("Hello")
+            >>> app.feed(["left", "delete", "enter"])
+            :param keys: iterable of str - keys, as handle() takes them. A 
+                str is fed one character at a time
+        """
+        with self.interact.suspended():
+            for key in keys:
+                self._handle(key)
+        self.render()
+
+    @contextmanager
+    def batch(self):
+        """
+            Makes the edits and cursor moves made inside it one change, 
+            which is drawn once it ends: only the lines it changed are 
+            rewritten, rather than each edit drawing as it's made. If it ends
+            with an Exception, the buffer and cursor are put back as they 
+            were, and the exception is raised again. Batches can be nested.
+            E.g.:
+            >>> @app.on("\\")
+            ... def transpose_line(app, cur_line, x):
+            ...     with app.batch():
+            ...         app.move_cursor_to_x(0)
+            ...         app.interact.delete_line()
+            ...         app.write(cur_line[x:] + cur_line[:x])
+            A batch has to be made on the event loop's thread, as handlers
+            are, while the loop is running. The edits inside one made from
+            another thread would only be queued, so there would be nothing
+            to draw or put back when it ended, and RuntimeError is raised
+            instead. Other threads pass the batch to the loop with call():
+            >>> def transpose():
+            ...     with app.batch():
+            ...         ...
+            >>> app.call(transpose).result()
+        """
+        loop = self._loop
+        if loop is not None and loop != get_ident():
+            raise RuntimeError("batch() was used on a thread other than the "
+                               "event loop's. Use it in a function passed to "
+                               "app.call() instead")
+        with self.interact.batch():
+            yield
+        self.render()
+
+    def _handle(self, key, count=1):
+        # Every key is logged, whether it's handled or fed, and a key 
+        # handled for several presses is logged once for each
+        for _ in range(count):
+            if self.recorder:
+                self.recorder.record(key)
+            self.macros.record(key)
+        return self._dispatch(key, count)
+
+    def _repeats(self, key):
+        """
+            Returns how many presses of 'key' the next handler call is for: 1,
+            and, when the key's handler is counted, the presses of it that
+            are waiting in the keyboard's queue. Holding an arrow key down
+            queues presses faster than each can be drawn, so handling them
+            one at a time leaves the cursor lagging far behind the key
+        """
+        # A count being typed, or a key being waited for, takes just the 
+        # next key
+        if self._awaiting or self._count is not None:
+            return 1
+        mode = self._mode_for(key)
+        if mode and key in mode.counted:
+            return 1 + self.keyboard.take_repeats(key)
+        return 1
+
+    def _mode_for(self, key):
+        """
+            Returns the mode whose handler the key would be dispatched to:
+            the current mode or the nearest of its parents with one, or None
         """
-        # TODO: add multi-key sequences
         mode = self.mode
-        while mode:
-            # If there is a custom behavior associated with the given key
-            # in the current mode, execute it
-            if mode.handlers.get(key, None):
-                # Handlers is a dict of mapping:
-                #   str -> ((Peacock, str, int) -> None)
-                # Call the function with the current app, the current line's text, 
-                # and the x position in that line
+        while mode and not mode.handlers.get(key, None):
+            mode = mode.parent
+        return mode
+
+    def await_key(self, callback):
+        """
+            Passes the next key to 'callback' rather than to its handler, for
+            handlers that take an argument from the key after theirs, such as
+            a register name
+            :param callback: (str) -> Any
+        """
+        self._awaiting = callback
+
+    def _dispatch(self, key, count=1):
+        # TODO: add multi-key sequences
+        if self._awaiting:
+            callback, self._awaiting = self._awaiting, None
+            return callback(key)
+
+        # In a mode with counts, digits add up to a count for the next key.
+        # A "0" only continues a count, so it can still be bound on its own
+        if (self.mode.counts and len(key) == 1 and "0" <= key <= "9" and 
+                (key != "0" or self._count)):
+            self._count = (self._count or 0) * 10 + int(key)
+            return
+        if self._count is not None:
+            count, self._count = count * self._count, None
+
+        # If there is a custom behavior associated with the given key in the
+        # current mode, execute it. Else, escalate to the parent mode, if 
+        # any, and recurse
+        mode = self._mode_for(key)
+        if mode:
+            # Handlers is a dict of mapping:
+            #   str -> ((Peacock, str, int) -> None)
+            # Call the function with the current app, the current line's text, 
+            # and the x position in that line, and with app.count set for the
+            # handler's duration
+            previous, self.count = self.count, count
+            try:
+                if self.profiler:
+                    return self.profiler.run(
+                        mode, key, lambda: mode.handle(key, app=self))
                 return mode.handle(key, app=self)
-            else:
-                # Else, escalate to the parent mode, if any, and recurse 
-                mode = mode.parent
-            # if there is no custom handler associated with the given key
-            # in any mode on this path to the root node, and echo is on, 
-            # write the key at the current cursor 
-            # position
-            if self.echo:
-                self.write(key)
+            finally:
+                self.count = previous
+        # if there is no custom handler associated with the given key
+        # in any mode on this path to the root node, and echo is on,
+        # write the key at the current cursor
+        # position
+        if self.echo:
+            self.write(key)
+
+    def record(self, file):
+        """
+            Starts logging every key this app handles, with timings, to the
+            given file. The recording can be replayed through a headless app
+            with peacock.peacock.record.replay, e.g. to reproduce a slowdown
+            :param file: str - path to write the recording to
+        """
+        from .record import Recorder
+        self.stop_recording()
+        self.recorder = Recorder(file, self.line_length)
+
+    def stop_recording(self):
+        """
+            Stops and saves the current recording, if any
+        """
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def profile(self, budget=None):
+        """
+            Starts timing every handler this app calls, per mode, key and 
+            handler, and logging a warning (to the "peacock" logger) when
+            one takes longer than 'budget'. E.g.:
+            >>> profiler = app.profile(budget=1 / 60)
+            >>> profiler.capture(10, "/tmp/slow.prof")    # the next 10 keys
+            >>> ...
+            >>> print(profiler.report())
+            :param budget: float - seconds, or None for no warnings
+            :return: peacock.peacock.profiler.Profiler
+        """
+        from .profiler import Profiler
+        self.stop_profiling()
+        self.profiler = Profiler(budget)
+        return self.profiler
+
+    def stop_profiling(self):
+        """
+            Stops timing handlers, and dumps the capture that's running, if
+            any
+        """
+        if self.profiler:
+            self.profiler.finish()
+            self.profiler = None
 
     def register_default_handlers(self):
         """
@@ -204,15 +638,29 @@ class Peacock(Thread):
                 :return: (str, int) -> None
             """
             def arrow_handler(app, *args):
-                app.interact.move_cursor(rows, cols)
+                count = app.count
+                if rows and count > 1:
+                    # Moving a row at a time clips x to the length of each
+                    # line on the way, not just the last one, so a counted 
+                    # move ends where that many single moves would
+                    y = app._y
+                    end = min(max(app.interact._first, y + rows * count), 
+                              len(app._buffer) - 1)
+                    passed = (app._buffer[y + 1:end + 1] if end > y else
+                              app._buffer[end:y])
+                    x = min(map(len, passed), default=app._x)
+                    app.interact.move_cursor(end - y, min(x, app._x) - app._x)
+                else:
+                    app.interact.move_cursor(rows * count, cols * count)
             return arrow_handler
         
         # For each of the directions and associated movement coordinates,
         # use self.on(direc) to create a decorator that binds behavior to
         # the given direc, and then use that decorator to bind
-        # the function which moves the given number for rows and cols 
+        # the function which moves the given number for rows and cols. 
+        # Held down arrow keys are handled a run at a time
         for direc, (rows, cols) in self.dir_to_cart.items():
-            self.on(direc)(arrow_handler_factory(rows, cols))
+            self.on(direc, counted=True)(arrow_handler_factory(rows, cols))
 
         @self.on("delete") 
         def delete_handler(app, *args):
@@ -266,6 +714,7 @@ class Peacock(Thread):
     #############################   IO METHODS   ###############################
     ############################################################################
    
+    @_on_loop
     def write(self, msg):
         """
             Writes msg to 'out' at the current cursor position. This is the
@@ -275,6 +724,7 @@ class Peacock(Thread):
         # TODO add optimization for write_char
         self.interact.write(msg)
 
+    @_on_loop
     def delete(self, chars):
         """
             Delete's 'chars' characters from behind the current cursor position
@@ -284,6 +734,148 @@ class Peacock(Thread):
         # TODO add optimization for delete_char
         self.interact.delete(chars)
 
+    @_on_loop
+    def resize(self, line_length):
+        """
+            Tells the app that 'out' is now 'line_length' columns wide (e.g.
+            after the terminal was resized). Lines are re-wrapped lazily, as 
+            they are next shown
+        """
+        self.line_length = line_length
+        self.interact.resize(line_length)
+        if self.compositor:
+            self.compositor.resize(line_length, self.compositor.height)
+
+    @_on_loop
+    def restyle(self, x0, y0, x1, y1, style=""):
+        """
+            Gives the text from (x0, y0) up to (x1, y1) the given style, and
+            redraws only that text
+            :param style: str - peacock style specification, e.g. "red;white"
+        """
+        self.interact.restyle(x0, y0, x1, y1, style)
+
+    @_on_loop
+    def replace_all(self, pattern, repl, region=None):
+        """
+            Replaces every match of 'pattern' (a regular expression, matched
+            line by line) with 'repl', as re.sub would, in one pass over the
+            buffer, and redraws only the lines that changed. The whole 
+            replacement is undone by one undo()
+            :param region: (x0, y0, x1, y1) - only replace matches inside it
+            :return: int - number of matches replaced
+        """
+        return self.interact.replace_all(pattern, repl, region)
+
+    @_on_loop
+    def undo(self):
+        """
+            Reverts the most recent replace_all, if the lines it changed 
+            haven't moved since
+            :return: bool - whether anything was undone
+        """
+        return self.interact.undo()
+
+    @property
+    def highlighter(self):
+        """
+            The peacock.interact.Highlighter used to style text as it is 
+            written, or None. The styles are only ever written to 'out', 
+            never to the buffer
+        """
+        return self.interact.highlighter
+
+    @highlighter.setter
+    def highlighter(self, highlighter):
+        self.interact.highlighter = highlighter
+
+    @property
+    def scrollback(self):
+        """
+            The peacock.interact.Scrollback capping how many of the oldest
+            lines of the buffer are kept, or None to keep them all
+        """
+        return self.interact.scrollback
+
+    @scrollback.setter
+    def scrollback(self, scrollback):
+        self.interact.scrollback = scrollback
+
+    ############################################################################
+    ############################  WINDOW METHODS  ##############################
+    ############################################################################
+
+    def buffer(self, name, text=""):
+        """
+            Returns the buffer called 'name', creating it with the given text
+            if it doesn't exist yet. E.g.:
+            >>> app.buffer("log").append("connected\n")
+            :return: peacock.interact.Buffer
+        """
+        if name not in self.buffers:
+            self.buffers[name] = Buffer(name, text)
+        return self.buffers[name]
+
+    def layout(self, layout, height):
+        """
+            Takes over the whole of 'out' to show the given windows, and draws
+            them. From then on, each handled key is followed by one frame that
+            redraws only the rows of the windows that changed. E.g.:
+            >>> files, preview = Window(app.buffer("files")), \\
+            ...                  Window(app.buffer("preview"))
+            >>> app.layout(Split("vertical", [files, preview], [1, 3]), 24)
+            :param layout: Window or Split - the windows to show
+            :param height: int - how many rows 'out' has
+            :return: peacock.interact.Compositor
+        """
+        self.compositor = Compositor(self.out, self.line_length, height, layout)
+        self.compositor.render()
+        return self.compositor
+
+    def stream(self, name, fps=30):
+        """
+            Returns the stream that appends to the buffer called 'name', 
+            creating both if need be. Any thread can write to it, and the
+            event loop appends what was written at most 'fps' times a 
+            second. A window following the buffer scrolls, rather than 
+            being repainted. E.g.:
+            >>> log = app.stream("log")
+            >>> app.layout(Window(app.buffer("log"), follow=True), 24)
+            >>> log.write("connected\n")          # from any thread
+            :return: peacock.interact.Stream
+        """
+        if name not in self.streams:
+            self.streams[name] = Stream(self.buffer(name), fps)
+        return self.streams[name]
+
+    def flush_streams(self):
+        """
+            Appends what was written to each stream that is due a frame, and
+            draws the frame. The event loop calls this, so it's only needed
+            when the loop isn't running
+            :return: bool - whether a frame was drawn
+        """
+        start = perf_counter()
+        due = [stream for stream in self.streams.values() 
+               if stream.due(start)]
+        if not due:
+            return False
+        for stream in due:
+            stream.flush()
+        self.render()
+        end = perf_counter()
+        for stream in due:
+            stream.drawn(start, end)
+        return True
+
+    def render(self):
+        """
+            Draws a frame for any windows that have changed since the last one.
+            Only needed when buffers are changed outside of a key handler
+        """
+        if self.compositor:
+            self.compositor.render()
+
     def reset(self):
         """
             Resets this application object and the terminal to the state
@@ -291,6 +883,10 @@ class Peacock(Thread):
         """
         self.clear()
         self.interact.reset()
+        self.buffers = {}
+        self.streams = {}
+        self.compositor = None
+        self._count = None
         self.modes = {}
         self.configure_default_modes()
         self.register_default_handlers()
@@ -0,0 +1,260 @@
+from collections import deque
+import cProfile
+import logging
+from os.path import basename
+import sys
+from threading import Thread, get_ident
+from time import perf_counter, sleep
+
+# Handlers that go over budget are logged here. Nothing is shown unless the
+# app configures logging, since a warning on stderr would land in the middle
+# of the app's own output
+log = logging.getLogger("peacock")
+
+class HandlerStats:
+    """
+        How long one handler, bound to one key of one mode, has taken
+    """
+
+    # How many of the latest calls are kept for the percentiles
+    SAMPLES = 1024
+
+    def __init__(self, mode, key, handler):
+        """
+            :param mode: str - name of the mode the handler is bound in
+            :param key: str - the key it's bound to
+            :param handler: (Peacock, *args) -> Any
+        """
+        self.mode = mode
+        self.key = key
+        self.handler = handler
+        self.calls = 0
+        self.total = 0.0
+
+        # How many calls went over the profiler's budget
+        self.slow = 0
+
+        # The seconds each of the latest calls took
+        self.times = deque(maxlen=self.SAMPLES)
+
+    @property
+    def name(self):
+        return getattr(self.handler, "__qualname__", repr(self.handler))
+
+    def percentile(self, p):
+        """
+            :param p: float - between 0 and 100
+            :return: float - the time per call at the given percentile, of
+                the latest calls
+        """
+        times = sorted(self.times)
+        if not times:
+            return 0.0
+        return times[min(len(times) - 1, int(len(times) * p / 100))]
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+
+class Profiler:
+    """
+        Times every handler an app dispatches a key to, keeping call counts,
+        the total time and the p50 and p99 times of each (mode, key, handler)
+        binding, and logs a warning when a handler goes over a budget.
+        Started with Peacock.profile, e.g.:
+        >>> profiler = app.profile(budget=1 / 60)
+        >>> ...
+        >>> print(profiler.report())
+
+        To find out what a slow handler spends its time on, capture() runs
+        cProfile, or a sampling profiler, over the next few handler calls
+        only, and dumps what it found to a file
+    """
+
+    def __init__(self, budget=None):
+        """
+            :param budget: float - seconds a handler may take before a
+                warning is logged, or None for no warnings
+        """
+        self.budget = budget
+
+        # (mode name, key, handler) -> HandlerStats
+        self.stats = {}
+
+        # Private Variables
+        # The capture that's running, the handler calls left for it, and
+        # where it's dumped to
+        self._capture = None
+        self._left = 0
+        self._file = None
+
+        # Handlers can handle keys themselves, and only the outermost call
+        # starts and stops a capture
+        self._depth = 0
+
+    def run(self, mode, key, call):
+        """
+            Calls the handler bound to 'key' in 'mode', through 'call', and
+            times it
+            :param mode: Mode - the mode the key is being dispatched to
+            :param key: str
+            :param call: () -> Any - calls the handler
+            :return: whatever the handler returns
+        """
+        handler = mode.handlers[key]
+        capture = self._capture if not self._depth else None
+        self._depth += 1
+        if capture:
+            capture.enable()
+        start = perf_counter()
+        try:
+            return call()
+        finally:
+            elapsed = perf_counter() - start
+            if capture:
+                capture.disable()
+            self._depth -= 1
+            self.add(mode.name, key, handler, elapsed)
+            if capture:
+                self._left -= 1
+                if not self._left:
+                    self.finish()
+
+    def add(self, mode, key, handler, elapsed):
+        """
+            Adds a call that took 'elapsed' seconds to the handler's stats
+        """
+        binding = (mode, key, handler)
+        stats = self.stats.get(binding)
+        if stats is None:
+            stats = self.stats[binding] = HandlerStats(mode, key, handler)
+        stats.calls += 1
+        stats.total += elapsed
+        stats.times.append(elapsed)
+        if self.budget is not None and elapsed > self.budget:
+            stats.slow += 1
+            log.warning("%s took %.1f ms to handle %r in %s mode, over its "
+                        "%.1f ms budget", stats.name, elapsed * 1e3, key, mode,
+                        self.budget * 1e3)
+
+    def capture(self, events, file, sampling=False, interval=0.001):
+        """
+            Profiles the next 'events' handler calls, and then dumps the
+            profile to 'file'. A capture already running is dumped first
+            :param events: int - how many handler calls to profile
+            :param file: str - where the profile is dumped. cProfile's can
+                be read with pstats; the sampler's is one line per stack,
+                with how many samples were taken in it, as flame graph tools
+                read
+            :param sampling: bool - sample the stack every 'interval'
+                seconds, rather than tracing every call with cProfile.
+                Sampling barely slows the handlers down, which matters when
+                it's their timing that's being looked into
+            :param interval: float - seconds between samples
+        """
+        self.finish()
+        self._capture = Sampler(interval) if sampling else cProfile.Profile()
+        self._left = events
+        self._file = file
+
+    def finish(self):
+        """
+            Ends the running capture early, if there is one, and dumps it
+        """
+        if self._capture:
+            capture, self._capture = self._capture, None
+            if isinstance(capture, Sampler):
+                capture.close()
+            capture.dump_stats(self._file)
+
+    def report(self):
+        """
+            Returns a table of the stats of each handler, slowest in all
+            first
+            :return: str
+        """
+        rows = ["{:<10} {:<12} {:<30} {:>7} {:>10} {:>9} {:>9} {:>5}".format(
+            "mode", "key", "handler", "calls", "total ms", "p50 ms", "p99 ms",
+            "slow")]
+        for stats in sorted(self.stats.values(), key=lambda s: -s.total):
+            rows.append("{:<10} {:<12} {:<30} {:>7} {:>10.2f} {:>9.3f} "
+                        "{:>9.3f} {:>5}".format(
+                            stats.mode, repr(stats.key), stats.name,
+                            stats.calls, stats.total * 1e3, stats.p50 * 1e3,
+                            stats.p99 * 1e3, stats.slow))
+        return "\n".join(rows)
+
+
+class Sampler(Thread):
+    """
+        A sampling profiler for the handlers of a Profiler's capture. While
+        a handler runs, the stack of the thread running it is read every
+        'interval' seconds from another thread, and the samples taken in
+        each stack are counted. It has the same enable, disable and 
+        dump_stats as cProfile.Profile
+    """
+
+    def __init__(self, interval=0.001):
+        super().__init__()
+        self.daemon = True
+        self.interval = interval
+
+        # stack: str -> int - samples taken in it. Stacks are the functions
+        # called, outermost first, separated by ";"
+        self.stacks = {}
+
+        # Private Variables
+        # The thread being sampled, which is the one that runs the handlers
+        self._target = None
+        self._active = False
+        self._running = True
+
+    def enable(self):
+        """
+            Starts sampling the calling thread, until disable
+        """
+        self._target = get_ident()
+        self._active = True
+        if not self.is_alive():
+            self.start()
+
+    def disable(self):
+        self._active = False
+
+    def close(self):
+        """
+            Stops the sampling thread
+        """
+        self._running = False
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        while self._running:
+            if self._active:
+                frame = sys._current_frames().get(self._target)
+                if frame is not None:
+                    self._sample(frame)
+            sleep(self.interval)
+
+    def _sample(self, frame):
+        stack = []
+        while frame:
+            code = frame.f_code
+            stack.append("{} ({}:{})".format(code.co_name,
+                                             basename(code.co_filename),
+                                             code.co_firstlineno))
+            frame = frame.f_back
+        stack = ";".join(reversed(stack))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def dump_stats(self, file):
+        with open(file, "w", encoding="utf-8") as profile:
+            for stack, count in sorted(self.stacks.items(),
+                                       key=lambda item: -item[1]):
+                profile.write("{} {}\n".format(stack, count))
@@ -0,0 +1,170 @@
+from io import StringIO
+import json
+from time import perf_counter, sleep
+
+from .peacock import Peacock
+from peacock.interact import KeyDecoder
+
+# First line of every recording, followed by the line length it was made at
+HEADER = "# peacock keys v1"
+
+class Recorder:
+    """
+        Logs every key an app handles, with the time since the previous key,
+        to a compact text file: one "<microseconds> <key>" line per key.
+        Started with Peacock.record, e.g.:
+        >>> app.record("/tmp/session.keys")
+        >>> ...
+        >>> app.stop_recording()
+    """
+
+    def __init__(self, file, line_length):
+        """
+            :param file: str - path of the recording
+            :param line_length: int - width of the app being recorded, so it
+                can be replayed at the same width
+        """
+        self.file = open(file, "w", encoding="utf-8")
+        self.file.write("{} {}\n".format(HEADER, line_length))
+        self._last = perf_counter()
+
+    def record(self, key):
+        now = perf_counter()
+        delay = int((now - self._last) * 1e6)
+        self._last = now
+        self.file.write("{} {}\n".format(delay, escape(key)))
+        # A recording is most wanted after a crash, so every key is on disk
+        # as soon as it's handled. A flush is a write of a line, which is
+        # nothing next to handling the key
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def escape(key):
+    """
+        Escapes backslashes and unprintable characters, so that every key
+        fits on one line. Other characters are written as they are
+    """
+    return "".join(ch if ch.isprintable() and ch != "\\" else
+                   ch.encode("unicode_escape").decode("ascii") for ch in key)
+
+def unescape(key):
+    # Characters outside latin-1 become escapes too, so that unicode_escape
+    # (which reads bytes as latin-1) gets every character back
+    return key.encode("latin-1", "backslashreplace").decode("unicode_escape")
+
+def load(file):
+    """
+        Reads a recording
+        :param file: str - path of the recording
+        :return: (int, [(float, str)]) - the line length it was recorded at,
+            and each key with the seconds since the key before it
+    """
+    with open(file, encoding="utf-8") as recording:
+        header = recording.readline()
+        if not header.startswith(HEADER):
+            raise ValueError("{} is not a peacock recording".format(file))
+        line_length = int(header[len(HEADER):])
+        events = []
+        for line in recording:
+            delay, key = line.rstrip("\n").split(" ", 1)
+            events.append((int(delay) / 1e6, unescape(key)))
+    return line_length, events
+
+
+class Replay:
+    """
+        The outcome of replaying a recording: the final buffer, the bytes
+        written to the terminal, and how long each key took to handle. These
+        can be saved as a baseline, and later replays compared against it, to
+        use recordings as regression fixtures, e.g.:
+        >>> result = replay("typing.keys", setup)
+        >>> assert not result.compare(Replay.load("typing.json"))
+    """
+
+    def __init__(self, buffer, output_bytes, times):
+        """
+            :param buffer: [str] - the app's buffer after the last key
+            :param output_bytes: int - bytes written to 'out'
+            :param times: [float] - seconds taken to handle each key
+        """
+        self.buffer = buffer
+        self.output_bytes = output_bytes
+        self.times = times
+
+    @property
+    def total(self):
+        return sum(self.times)
+
+    def percentile(self, p):
+        """
+            :param p: float - between 0 and 100
+            :return: float - the time per key at the given percentile
+        """
+        times = sorted(self.times)
+        if not times:
+            return 0.0
+        return times[min(len(times) - 1, int(len(times) * p / 100))]
+
+    def compare(self, baseline, slowdown=1.5):
+        """
+            Compares this replay against a baseline
+            :param baseline: Replay
+            :param slowdown: float - how many times slower than the baseline
+                this replay may be, or None to ignore timings (e.g. on CI
+                machines that don't match the one the baseline was made on)
+            :return: [str] - a description of each regression, if any
+        """
+        problems = []
+        if self.buffer != baseline.buffer:
+            problems.append("final buffer differs from the baseline")
+        if self.output_bytes > baseline.output_bytes:
+            problems.append("wrote {} bytes, the baseline wrote {}".format(
+                self.output_bytes, baseline.output_bytes))
+        if slowdown and self.total > baseline.total * slowdown:
+            problems.append("took {:.2f} ms, the baseline took {:.2f} ms"
+                            .format(self.total * 1e3, baseline.total * 1e3))
+        return problems
+
+    def save(self, file):
+        with open(file, "w", encoding="utf-8") as baseline:
+            json.dump({"buffer": self.buffer,
+                       "output_bytes": self.output_bytes,
+                       "times": self.times}, baseline)
+
+    @classmethod
+    def load(cls, file):
+        with open(file, encoding="utf-8") as baseline:
+            data = json.load(baseline)
+        return cls(data["buffer"], data["output_bytes"], data["times"])
+
+
+def replay(file, setup=None, realtime=False):
+    """
+        Feeds a recording through a headless app: one that draws into memory,
+        and has no threads or terminal of its own
+        :param file: str - path of the recording
+        :param setup: (Peacock) -> None - binds the app's keys and modes, as
+            the recorded app did
+        :param realtime: bool - wait between keys as long as the user did,
+            rather than replaying as fast as possible
+        :return: Replay
+    """
+    line_length, events = load(file)
+    out = StringIO()
+    app = Peacock(running=False, line_length=line_length, out=out,
+                  keyboard=KeyDecoder())
+    if setup:
+        setup(app)
+
+    times = []
+    for delay, key in events:
+        if realtime:
+            sleep(delay)
+        start = perf_counter()
+        app.handle(key)
+        times.append(perf_counter() - start)
+    return Replay(list(app._buffer), len(out.getvalue().encode("utf-8")),
+                  times)
@@ -0,0 +1,313 @@
+import logging
+import os
+import pty
+import selectors
+from threading import Lock
+from tty import setcbreak
+
+from .peacock import Peacock
+from peacock.interact import KeyDecoder
+
+# Sessions whose handlers raise are logged here, and ended
+log = logging.getLogger("peacock")
+
+class SessionOut:
+    """
+        What a session's app writes to. Each flush sends what was written
+        since the last one, as far as the terminal takes it without 
+        blocking; the rest waits in 'pending' until the terminal is 
+        writable again (see Server.poll). One slow client then only holds up
+        its own output, rather than every session
+    """
+
+    def __init__(self, fd):
+        """
+            :param fd: int - the session's terminal, which is non-blocking
+        """
+        self.fd = fd
+
+        # Encoded output the terminal hasn't taken yet
+        self.pending = bytearray()
+
+        # Private Variables
+        # Text written since the last flush
+        self._text = []
+
+    def write(self, text):
+        self._text.append(text)
+        return len(text)
+
+    def flush(self):
+        if self._text:
+            self.pending += "".join(self._text).encode("utf-8")
+            self._text.clear()
+        self.send()
+
+    def send(self):
+        """
+            Writes as much of the pending output as the terminal takes
+        """
+        while self.pending:
+            try:
+                written = os.write(self.fd, self.pending)
+            except BlockingIOError:
+                return
+            del self.pending[:written]
+
+    def close(self):
+        self._text.clear()
+        self.pending.clear()
+
+
+class Session:
+    """
+        One user's app in a Server: a Peacock app with its own terminal (a PTY
+        or socket), key decoder, modes and Interact state, but no threads of
+        its own
+    """
+
+    def __init__(self, fd, setup, line_length=120):
+        """
+            :param fd: int - file descriptor of the session's terminal, which
+                keys are read from and output is written to
+            :param setup: (Peacock) -> None - configures the session's app,
+                e.g. by binding keys and adding modes
+            :param line_length: int - how wide the session's terminal is
+        """
+        self.fd = fd
+
+        # Whether closing the session closes its terminal too, which it does
+        # when the server opened it (see Server.spawn)
+        self.owns_fd = False
+
+        # Like MacKeyboard does for stdin, read the terminal char by char.
+        # The server never waits on one terminal, so it's non-blocking
+        if os.isatty(fd):
+            setcbreak(fd)
+        os.set_blocking(fd, False)
+        self.out = SessionOut(fd)
+        self.app = Peacock(running=False, line_length=line_length,
+                           out=self.out, keyboard=KeyDecoder())
+        setup(self.app)
+
+    def fileno(self):
+        return self.fd
+
+    def receive(self, data):
+        """
+            Decodes the bytes read from the session's terminal, and handles
+            every key they contain. Keys that arrive together, as a paste 
+            does, are drawn as one frame
+            :param data: bytes
+        """
+        keyboard = self.app.keyboard
+        keyboard.feed(data)
+        self.app.feed(iter(keyboard.get_key_or_none, None))
+
+    def flush_escape(self):
+        """
+            Handles the keys of an escape held at the end of the last read,
+            as the rest of its sequence didn't follow it, e.g. the esc key
+            (see KeyDecoder.feed)
+        """
+        keyboard = self.app.keyboard
+        keyboard.flush_escape()
+        self.app.feed(iter(keyboard.get_key_or_none, None))
+
+    def close(self):
+        self.app.running = False
+        self.out.close()
+        if self.owns_fd:
+            os.close(self.fd)
+
+
+class Server:
+    """
+        Runs many Peacock apps in one process from a single selector loop,
+        rather than two threads per app. A session that isn't typing costs
+        no CPU at all, since the loop sleeps in select until one of the
+        terminals has input. E.g.:
+        >>> def setup(app):
+        ...     @app.on("ctrl+d")
+        ...     def quit(app, *args):
+        ...         server.remove(app.session)
+        >>> server = Server(setup)
+        >>> for conn in accepted_connections:
+        ...     server.add(conn.fileno())
+        >>> server.run()
+
+        The server's selector and wake pipe are closed when run() returns,
+        or by close() for a server that's polled rather than run
+    """
+
+    def __init__(self, setup, line_length=120):
+        """
+            :param setup: (Peacock) -> None - called with each new session's
+                app, to configure it
+            :param line_length: int - default width of session terminals
+        """
+        self.setup = setup
+        self.line_length = line_length
+        self.sessions = {}
+        self.running = False
+
+        # Private Variables
+        self._selector = selectors.DefaultSelector()
+
+        # Writing to this pipe wakes the loop up, so that stop() works from
+        # other threads without the loop having to poll
+        self._wake_r, self._wake_w = os.pipe()
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+
+        # Held while waking the loop, and while closing the pipe, so that 
+        # stop() never writes to a descriptor that was closed, and maybe 
+        # reused by then
+        self._wake_lock = Lock()
+
+        # Sessions whose last read ended with the start of an escape 
+        # sequence. The loop wakes up to flush it, if no more arrives
+        self._escapes = set()
+
+    def add(self, fd, line_length=None):
+        """
+            Starts a session on the given terminal
+            :param fd: int - the program side of a PTY, or a connected socket
+            :param line_length: int - width of the terminal
+            :return: Session
+        """
+        session = Session(fd, self.setup, line_length or self.line_length)
+        session.app.session = session
+        self.sessions[fd] = session
+        self._selector.register(fd, selectors.EVENT_READ, session)
+        self._watch(session)
+        return session
+
+    def spawn(self, line_length=None):
+        """
+            Starts a session on a new local PTY
+            :return: (Session, int) - the session, and the file descriptor of
+                the PTY's master side, which is where the user's keys are 
+                written and the session's output is read, as a terminal
+                emulator would
+        """
+        master, slave = pty.openpty()
+        session = self.add(slave, line_length)
+        session.owns_fd = True
+        return session, master
+
+    def remove(self, session):
+        """
+            Ends the given session. Its file descriptor is not closed, as it
+            belongs to whoever added it, unless the session was spawned
+        """
+        if self.sessions.pop(session.fd, None):
+            self._selector.unregister(session.fd)
+            self._escapes.discard(session)
+            session.close()
+
+    def poll(self, timeout=None):
+        """
+            Waits up to 'timeout' seconds for input, and handles it
+            :return: int - number of sessions that had input
+        """
+        if self._escapes:
+            due = max(0, min(session.app.keyboard.escape_timeout() 
+                             for session in self._escapes))
+            timeout = due if timeout is None else min(timeout, due)
+        ready = self._selector.select(timeout)
+        for key, events in ready:
+            session = key.data
+            if session is None:
+                os.read(self._wake_r, 512)
+                continue
+            if self.sessions.get(session.fd) is not session:
+                # Removed by a session handled before it
+                continue
+            try:
+                if events & selectors.EVENT_WRITE:
+                    session.out.send()
+                data = (os.read(session.fd, 4096) 
+                        if events & selectors.EVENT_READ else None)
+            except BlockingIOError:
+                data = None
+            except OSError:
+                # A PTY raises EIO once the other side has been closed
+                data = b""
+            if data == b"":
+                self.remove(session)
+            elif data:
+                self._handle(session, session.receive, data)
+            else:
+                self._watch(session)
+        for session in list(self._escapes):
+            if session.app.keyboard.escape_timeout() <= 0:
+                self._escapes.discard(session)
+                self._handle(session, session.flush_escape)
+        return len(ready)
+
+    def _handle(self, session, handler, *args):
+        """
+            Calls one of the session's methods that handle keys
+        """
+        try:
+            handler(*args)
+        except Exception:
+            # One session's broken handler ends that session alone
+            log.exception("session on fd %d raised, and was ended", 
+                          session.fd)
+            self.remove(session)
+            return
+        # Handlers can end their own session
+        if self.sessions.get(session.fd) is session:
+            if session.app.keyboard.escape_timeout() is None:
+                self._escapes.discard(session)
+            else:
+                self._escapes.add(session)
+            self._watch(session)
+
+    def _watch(self, session):
+        """
+            Has the selector tell the loop when the session's terminal is
+            writable, for as long as it has output pending
+        """
+        events = selectors.EVENT_READ
+        if session.out.pending:
+            events |= selectors.EVENT_WRITE
+        if self._selector.get_key(session.fd).events != events:
+            self._selector.modify(session.fd, events, session)
+
+    def run(self):
+        """
+            Handles input for all of the sessions until stop() is called
+        """
+        self.running = True
+        try:
+            while self.running:
+                self.poll()
+        finally:
+            self.close()
+
+    def stop(self):
+        """
+            Stops the loop, which ends every session. Safe to call from any
+            thread
+        """
+        self.running = False
+        with self._wake_lock:
+            if self._wake_w is not None:
+                os.write(self._wake_w, b"\0")
+
+    def close(self):
+        """
+            Ends every session, and closes the selector and the wake pipe.
+            The server can't be used after
+        """
+        for session in list(self.sessions.values()):
+            self.remove(session)
+        with self._wake_lock:
+            if self._wake_w is None:
+                return
+            self._selector.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_w = None
@@ -0,0 +1,61 @@
+import json
+from io import StringIO
+
+from peacock.interact.capture import Screen, Tee, analyze, load, report
+
+def issues(*frames):
+    return [issue for frame in analyze([(0, f) for f in frames], 20)
+            for issue, _ in frame.issues]
+
+def test_tee_records_a_frame_per_flush(tmp_path):
+    path = str(tmp_path / "out.cast")
+    out = StringIO()
+    tee = Tee(out, path, width=20)
+    tee.write("ab")
+    tee.write("\033[1D")
+    tee.flush()
+    tee.flush()
+    tee.write("c")
+    tee.close()
+    assert out.getvalue() == "ab\033[1Dc"
+    assert tee.getvalue() == out.getvalue()
+
+    width, frames = load(path)
+    assert width == 20
+    assert [text for _, text in frames] == ["ab\033[1D", "c"]
+    with open(path) as cast:
+        assert json.loads(cast.readline())["version"] == 2
+
+def test_breakdown():
+    frame, = analyze([(0, "ab\033[1D\033[31;mc\033[0;m\033[K")])
+    assert frame.counts == {"move": 1, "erase": 1, "style": 2, "text": 2}
+    assert frame.bytes["move"] == 4 and frame.bytes["text"] == 3
+
+def test_flags_redundant_output():
+    assert issues("abc\033[1A\033[2D") == ["move after move"]
+    assert issues("abc\r\n") == []
+    assert issues("abc\033[K") == ["empty erase"]
+    assert issues("abc", "\033[3D\033[Kabc") == ["erase and identical rewrite"]
+    assert issues("abc", "\033[3D\033[Kabd") == []
+    assert issues("abc", "\033[3Dabc") == ["unchanged rewrite"]
+    assert issues("\033[0;m") == ["unchanged style"]
+
+def test_report():
+    text = report(analyze([(0, "ab\033[K"), (1, "\033[1D\033[1D")]))
+    assert text.splitlines()[0] == "2 frames, 13 bytes"
+    assert "1 x move after move" in text and "1 x empty erase" in text
+
+def test_style_changes_are_understood():
+    # Turning bold off and back on is a change each time
+    assert issues("\033[1;31ma\033[22mb\033[1mc") == []
+    assert issues("\033[38;5;208ma\033[38;5;208mb") == ["unchanged style"]
+
+def test_screen_erases_where_the_cursor_waits_to_wrap():
+    screen = Screen(4)
+    screen.play("abcd\033[K")
+    # The cursor is still on the last column, which is erased
+    assert sorted(screen.cells) == [(0, 0), (0, 1), (0, 2)]
+    screen.play("d\033[De")
+    assert screen.cells[(0, 2)][0] == "e"
+    screen.play("fg")
+    assert (screen.cells[(1, 0)][0], screen.row, screen.col) == ("g", 1, 1)
@@ -0,0 +1,42 @@
+from peacock.interact import Completer, WordTrie
+
+def test_trie_orders_by_count_then_word():
+    trie = WordTrie(limit=3)
+    for word in ["peahen", "peacock", "pear", "peacock", "pea", "plume"]:
+        trie.add(word)
+    assert trie.top("pea") == ["peacock", "pea", "peahen"]
+    assert trie.top("pea", 1) == ["peacock"]
+    assert trie.top("x") == []
+
+    trie.add("peacock", -2)
+    assert "peacock" not in trie
+    assert trie.top("pea") == ["pea", "peahen", "pear"]
+    assert trie.count("plume") == 1
+
+def test_trie_prunes_uncounted_words():
+    trie = WordTrie()
+    trie.add("peacock")
+    trie.add("peacock", -1)
+    assert trie._root.children is None
+
+def test_completer_follows_edits():
+    lines = ["import peacock", "peahen = peacock.Peacock()", "pea"]
+    completer = Completer(limit=2)
+    assert completer.complete(lines, "pea") == ["peacock", "peahen"]
+    assert completer.complete(lines, "Pea") == ["Peacock"]
+
+    # Edits are reported before the buffer changes, as Interact does
+    completer.edit(1, 1, 2)
+    lines[1:2] = ["pearl = pearl + pear", "pearl"]
+    assert completer.complete(lines, "pea") == ["pearl", "peacock"]
+    assert completer.complete(lines, "pear") == ["pearl"]
+
+    completer.edit(0, 2, 1)
+    lines[0:2] = [""]
+    assert completer.complete(lines, "pea") == ["pearl"]
+
+def test_completer_prefix():
+    completer = Completer()
+    assert completer.prefix("x = app.pea", 11) == "pea"
+    assert completer.prefix("x = app.pea", 9) == "p"
+    assert completer.prefix("x = 12", 6) == ""
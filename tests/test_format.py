@@ -0,0 +1,33 @@
+from peacock import format
+
+def test_width():
+    assert format.width(format("{|red}", "abc")) == 3
+    assert format.width("日本x") == 5
+
+def test_rows():
+    lines = format.rows("{} | {:.1f|green}", [("a", 1), ("bcd", 10)],
+                        align="<>")
+    assert list(lines) == ["a   |  \033[32;m1.0\033[0;m",
+                           "bcd | \033[32;m10.0\033[0;m"]
+
+def test_rows_measure_visible_width():
+    rows = [(format("{|bold}", "ab"), 1), ("日本語", 2)]
+    assert list(format.rows("{}|{}", rows)) == ["\033[1;mab\033[0;m    |1",
+                                                "日本語|2"]
+
+def test_rows_center_and_named_fields():
+    rows = [{"name": "ab", "n": 1}, {"name": "abcde", "n": 22}]
+    assert list(format.rows("[{name|red}] {n}", rows, align="^>")) == \
+           ["[ \033[31;mab\033[0;m  ]  1", "[\033[31;mabcde\033[0;m] 22"]
+
+def test_rows_are_lazy():
+    def rows():
+        yield ("a", "b")
+        raise AssertionError("read too far")
+
+    # With the widths given, the first line doesn't need the other rows
+    lines = format.rows("{} {}", rows(), widths=[3, 1])
+    assert next(lines) == "a   b"
+
+    # Nothing is done until the first line is asked for
+    format.rows("{} {}", rows())
@@ -0,0 +1,118 @@
+import pytest
+from io import StringIO
+
+from peacock.interact import Highlighter, PygmentsLineLexer, InteractANSIMac
+from peacock.format.styled import render_runs
+
+################################################################################
+################################# FIXTURES #####################################
+################################################################################
+class QuoteLexer:
+    """
+        Tiny lexer where '"' toggles between code and string states, so that
+        a quote on one line changes the state of every line after it
+    """
+    initial = "code"
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, line, state):
+        self.calls += 1
+        tokens = []
+        for ch in line:
+            if ch == '"':
+                state = "string" if state == "code" else "code"
+                tokens.append((ch, "string"))
+            else:
+                tokens.append((ch, state))
+        return tokens, state
+
+@pytest.fixture
+def lexer():
+    return QuoteLexer()
+
+@pytest.fixture
+def highlighter(lexer):
+    return Highlighter(lexer, {"string": "green", "code": ""})
+
+################################################################################
+############################## HIGHLIGHTER #####################################
+################################################################################
+def test_runs(highlighter):
+    lines = ['ab"cd', 'ef"g']
+    assert highlighter.runs(lines, 0) == [(2, ""), (3, "green")]
+    assert highlighter.runs(lines, 1) == [(3, "green"), (1, "")]
+
+def test_lazy(highlighter, lexer):
+    lines = ["a"] * 100
+    highlighter.highlight(lines, 0, 10)
+    assert lexer.calls == 10
+    highlighter.highlight(lines, 0, 10)
+    assert lexer.calls == 10
+
+def test_edit_stops_when_state_matches(highlighter, lexer):
+    lines = ["a"] * 100
+    highlighter.highlight(lines, 0, 100)
+    lexer.calls = 0
+    lines[50] = "b"
+    highlighter.edit(50, 1, 1)
+    highlighter.highlight(lines, 0, 100)
+    assert lexer.calls == 1
+
+def test_edit_relexes_changed_state(highlighter, lexer):
+    lines = ["a"] * 10
+    highlighter.highlight(lines, 0, 10)
+    lexer.calls = 0
+    lines[5] = 'a"'
+    highlighter.edit(5, 1, 1)
+    assert highlighter.runs(lines, 9) == [(1, "green")]
+    assert lexer.calls == 5
+
+def test_edit_inserted_lines(highlighter, lexer):
+    lines = ["a"] * 10
+    highlighter.highlight(lines, 0, 10)
+    lexer.calls = 0
+    lines[3:4] = ["a", "b", "c"]
+    highlighter.edit(3, 1, 3)
+    highlighter.highlight(lines, 0, len(lines))
+    assert lexer.calls == 3
+
+def test_render_runs():
+    runs = [(2, ""), (3, "blue")]
+    assert render_runs("abcde", runs) == "ab\033[34mcde\033[0m"
+    assert render_runs("de", runs, 3) == "\033[34mde\033[0m"
+    assert render_runs("abcdefg", runs) == "ab\033[34mcde\033[0mfg"
+
+def test_interact_styles_out_not_buffer(highlighter):
+    interact = InteractANSIMac(None, StringIO(), 120)
+    interact.highlighter = highlighter
+    interact.write('x"y"')
+    assert interact._buffer == ['x"y"']
+    assert interact.out.getvalue().endswith('x\033[32m"y"\033[0m')
+
+def test_pygments_multiline_state():
+    pygments = pytest.importorskip("pygments")
+    from pygments.lexers import PythonLexer
+    from pygments.token import Token
+    lexer = PygmentsLineLexer(PythonLexer())
+    highlighter = Highlighter(lexer, {Token.Keyword: "yellow",
+                                      Token.Literal.String: "magenta"})
+    lines = ['x = """', 'def', '"""', 'def f(): pass']
+    assert highlighter.runs(lines, 1) == [(3, "magenta")]
+    assert highlighter.runs(lines, 3)[0] == (3, "yellow")
+
+def test_render_runs_only_changes():
+    # Runs that share attributes only switch the ones that differ
+    runs = [(2, "blue,bold"), (2, "blue"), (2, "blue;red")]
+    assert render_runs("abcdef", runs) == \
+           "\033[1;34mab\033[22mcd\033[41mef\033[0m"
+
+def test_render_runs_spaces_keep_style():
+    # The space between the keywords looks the same in either style
+    runs = [(3, "208,bold"), (1, ""), (2, "208,bold"), (2, "")]
+    assert render_runs("def if  ", runs) == "\033[1;38;5;208mdef if  \033[0m"
+
+    # Unless it has a background or underline
+    runs = [(1, "bold"), (1, ";blue"), (1, "bold")]
+    assert render_runs("a b", runs) == "\033[1ma\033[0;44m \033[0;1mb\033[0m"
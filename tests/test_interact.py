@@ -1,7 +1,13 @@
+import os
 import pytest
 from peacock import keyboard, interact 
 from unittest.mock import patch, MagicMock
 from io import StringIO
+from threading import Thread
+from time import perf_counter
+from tty import setcbreak
+
+from peacock.interact.ring import KeyRing, LineRing
 
 @patch("peacock.keyboard.termios")
 @patch("peacock.keyboard.setcbreak")
@@ -12,12 +18,132 @@ def test_keybaord(mock_sys, mock_setcbreak, mock_termios):
     keys = ["a", "A", "esc", "up", "ctrl+c", "3", 
             ";", ":", "\\",  "!", ">", "0", "9"]
     board = keyboard.MacKeyboard()
+    assert not mock_termios.tcgetattr.called and not board.is_alive()
+    board.start()
+    board.join(1)
     for key in keys:
         assert board.get_key_or_none() == key
         assert board.get_key_or_none() == " " 
     assert board.get_key_or_none() == None
     board.stop()
 
+@patch("peacock.keyboard.termios")
+@patch("peacock.keyboard.setcbreak")
+@patch("peacock.keyboard.sys")
+def test_keyboard_flushes_a_lone_esc_itself(mock_sys, mock_setcbreak, 
+                                             mock_termios):
+    master, slave = os.openpty()
+    setcbreak(slave)
+    mock_sys.stdin = os.fdopen(slave, "rb", buffering=0)
+    board = keyboard.MacKeyboard()
+    board.start()
+    try:
+        os.write(master, b"\033")
+        # The keyboard's thread queues the esc, and wakes the loop for it
+        assert board.wait(5)
+        assert board.get_key_or_none() == "esc"
+        os.write(master, b"\033[")
+        os.write(master, b"B")
+        assert board.wait(5)
+        assert board.get_key_or_none() == "down"
+    finally:
+        board.stop()
+        # One more key for the thread to see it's been stopped
+        os.write(master, b"x")
+        board.join(1)
+        os.close(master)
+        mock_sys.stdin.close()
+
+def test_decoder_table_and_ctrl_u():
+    assert len(keyboard.key_table) == 128
+    decoder = keyboard.KeyDecoder()
+    decoder.feed(b"\x15\x16\x00")
+    keys = [decoder.get_key_or_none() for _ in range(3)]
+    assert keys == ["ctrl+u", "ctrl+v", "ctrl+space"]
+
+def test_decoder_utf8_split_across_reads():
+    decoder = keyboard.KeyDecoder()
+    data = "é日😀".encode("utf-8")
+    for i in range(len(data)):
+        decoder.feed(data[i:i + 1])
+    decoder.feed(b"\xff")
+    keys = [decoder.get_key_or_none() for _ in range(5)]
+    assert keys == ["é", "日", "😀", "\ufffd", None]
+
+def test_decoder_take_repeats():
+    decoder = keyboard.KeyDecoder()
+    decoder.feed("\033[B" * 4 + "\033[Aj\033")
+    assert decoder.get_key_or_none() == "down"
+    assert decoder.take_repeats("down") == 3
+    assert decoder.get_key_or_none() == "up"
+    assert decoder.take_repeats("up") == 0
+    assert decoder.take_repeats("k") == 0
+    decoder.flush_escape()
+    assert [decoder.get_key_or_none() for _ in range(3)] == ["j", "esc", None]
+
+def test_decoder_holds_escape_sequences_split_across_feeds():
+    decoder = keyboard.KeyDecoder()
+    decoder.feed("\033\033[Ax\033[Z\033[")
+    decoder.feed("D")
+    decoder.feed("\033")
+    decoder.feed("[A\033")
+    decoder.feed("x")
+    keys = iter(decoder.get_key_or_none, None)
+    assert list(keys) == ["esc", "up", "x", "esc", "[", "Z", "left", "up", 
+                          "esc", "x"]
+
+    # An escape nothing follows is the keys it is made of, once waited for
+    decoder.feed("\033[")
+    assert decoder.get_key_or_none() is None
+    assert not decoder.wait(0)
+    assert 0 < decoder.escape_timeout() <= decoder.ESCAPE_TIMEOUT
+    start = perf_counter()
+    assert decoder.wait(1)
+    assert perf_counter() - start < 0.5
+    assert [decoder.get_key_or_none() for _ in range(3)] == ["esc", "[", None]
+    assert decoder.escape_timeout() is None
+
+def test_key_ring():
+    ring = KeyRing(3)
+    assert [ring.put(key) for key in "abcde"] == [True] * 4 + [False]
+    assert (len(ring), ring.peek(), ring.get(), ring.get()) == (4, "a", "a", "b")
+    assert ring.put("e") and ring.put("f") and not ring.put("g")
+    ring.grow()
+    assert ring.put("g")
+    assert list(iter(ring.get, None)) == list("cdefg")
+    assert ring.peek() is None
+
+def test_key_ring_wakes_the_consumer():
+    ring = KeyRing()
+    assert not ring.wakeup.wait(0)
+    def produce():
+        ring.put("a")
+        ring.wakeup.set()
+    thread = Thread(target=produce)
+    thread.start()
+    assert ring.wakeup.wait(5)
+    thread.join()
+    assert ring.get() == "a"
+    # Waking clears it
+    assert not ring.wakeup.wait(0)
+
+def test_line_ring_keeps_indices_across_evictions():
+    lines = LineRing(str(i) for i in range(6))
+    assert lines.evict(2) == ["0", "1"]
+    assert (lines.first, len(lines), lines[2], lines[-1]) == (2, 6, "2", "5")
+    assert list(lines) == ["2", "3", "4", "5"] and lines[:4] == ["2", "3"]
+    with pytest.raises(IndexError):
+        lines[1]
+
+    lines[3:5] = ["x", "y", "z"]
+    del lines[6]
+    assert list(lines) == ["2", "x", "y", "z"]
+
+    # Closing the gap the evictions left doesn't move any line's index
+    assert lines.evict(3) == ["2", "x", "y"]
+    assert (lines.first, lines[5], lines._offset) == (5, "z", 5)
+    assert lines.evict(1) == ["z"] and not lines and len(lines) == 6
+
 
 ################################################################################
 ################################# FIXTURES #####################################
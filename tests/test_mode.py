@@ -15,6 +15,13 @@ def test_on_raises_on_bad_keys(normal):
         def handler():
             pass
 
+def test_on_accepts_printable_characters(normal):
+    for key in ("é", "日"):
+        normal.on(key)(lambda *args: None)
+    assert set(normal.handlers) == {"é", "日"}
+    with pytest.raises(ValueError):
+        normal.on("\x85")
+
 def test_on(normal):
     assert normal.handlers == {}
     @normal.on("enter")
@@ -0,0 +1,62 @@
+import pytest
+from io import StringIO
+
+from peacock.format import StyledText
+from peacock.interact import InteractANSIMac
+from peacock.interact.motion import plan_move
+
+@pytest.fixture
+def ansi():
+    ansi = InteractANSIMac(None, StringIO(), 120)
+    ansi.write("hello world\nfoo")
+    ansi.out.truncate(0)
+    ansi.out.seek(0)
+    return ansi
+
+def test_plan_move():
+    assert plan_move(0, 5, 5) == ""
+    assert plan_move(-1, 5, 5) == "\033[A"
+    assert plan_move(0, 50, 40) == "\033[10D"
+    assert plan_move(0, 50, 0) == "\r"
+    assert plan_move(0, 50, 1) == "\r\033[C"
+    assert plan_move(0, 50, 2) == "\033[3G"
+    assert plan_move(0, 50, 49) == "\b"
+    assert plan_move(2, 150, 20) == "\033[2B\033[21G"
+    assert plan_move(0, 3, 5, "ab") == "ab"
+    assert plan_move(0, 3, 5, "\033[31;mab\033[0;m") == "\033[2C"
+
+def test_moves_in_a_frame_are_merged(ansi):
+    with ansi.frame():
+        ansi.move_cursor(-1)
+        ansi.move_cursor(cols=5)
+        ansi.move_cursor(cols=-1)
+        assert ansi.out.getvalue() == ""
+    assert (ansi.x, ansi.y) == (7, 0)
+    assert ansi.out.getvalue() == "\033[A\033[4C"
+
+def test_moves_back_to_start_cancel_out(ansi):
+    with ansi.frame():
+        ansi.move_cursor(-1, 2)
+        ansi.move_cursor(1, -2)
+    assert ansi.out.getvalue() == ""
+
+def test_move_is_placed_before_writing(ansi):
+    with ansi.frame():
+        ansi.move_cursor(cols=-3)
+        ansi.write("!")
+    assert ansi._buffer[1] == "!foo"
+    assert ansi.out.getvalue().startswith("\r\033[J!foo")
+
+def test_reprint(ansi):
+    ansi.move_cursor(-1, -3)
+    ansi.out.truncate(0)
+    ansi.out.seek(0)
+    ansi.move_cursor(cols=2)
+    assert ansi.out.getvalue() == "he"
+
+def test_move_to_x_is_one_move(ansi):
+    ansi.move_cursor(-1, 8)
+    ansi.out.truncate(0)
+    ansi.out.seek(0)
+    ansi.move_cursor_to_x(1)
+    assert ansi.out.getvalue() == "\r\033[C"
@@ -1,9 +1,12 @@
+from concurrent.futures import Future
 from io import StringIO
 from mock import patch
+from threading import Event, Thread
+from time import perf_counter, sleep
 import pytest
 
 from peacock import Peacock, interact, keyboard, format, Mode, ModeError
-from peacock.interact import _BufferInteract
+from peacock.interact import KeyDecoder, Scrollback, _BufferInteract
 
 def test_format():
     assert format("No peacocks here") == "No peacocks here"
@@ -28,7 +31,9 @@ def _pck(mock_keyboard, mock_interact, request):
     mock_interact.return_value = _BufferInteract(None, out, 120)
     mac.keys = keys
     mac.get_key_or_none.return_value = None    
-    p = Peacock(out=out, debug=True)
+    # The tests drive the app from their own thread, which would queue 
+    # their writes for the event loop if it were running
+    p = Peacock(out=out, debug=True, running=False)
     def fin():
         p.stop()
     request.addfinalizer(fin)
@@ -137,7 +142,23 @@ def test_handle_arrows_read_mode(hello_pck):
     hello_pck.handle("down")
     assert (hello_pck._x, hello_pck._y) == (2, 1)
 
+def test_windows(pck):
+    from peacock.interact import Window, Split
+    files, log = pck.buffer("files", "a.py"), pck.buffer("log")
+    assert pck.buffer("files") is files
+    pck.layout(Split("horizontal", [Window(files), Window(log)]), 4)
+    out = StringIO()
+    pck.compositor.out = out
+
+    @pck.on("ctrl+l")
+    def log_key(app, *args):
+        app.buffer("log").set_line(0, "pressed")
+
+    pck.handle("ctrl+l")
+    assert out.getvalue() == "\033[3;1Hpressed" + " " * 113
+
 def test_stop(pck):
+    pck.start()
     assert pck.running
     pck.stop()
     assert not pck.running
@@ -278,3 +299,338 @@ keys = {
     131: "left"
 }
 
+
+def test_extended_colors():
+    assert format("{|208}", "x") == "\033[38;5;208;mx\033[0;m"
+    assert format("{|bold;#ff8800}", "x") == \
+           "\033[1;48;2;255;136;0;mx\033[0;m"
+    assert format("{|#f80}", "x") == format("{|#ff8800}", "x")
+    with pytest.raises(KeyError):
+        format("{|#ggg}", "x")
+
+    # Parsing gives back specifications that produce the same sequences
+    text = "\033[1;38;5;208;48;2;255;136;0mx\033[22;39my"
+    assert format.parse(text) == ("xy", [(1, "bold,208;#ff8800"), 
+                                         (1, ";#ff8800")])
+
+def test_transition():
+    assert format.transition("", "") == ""
+    assert format.transition("red,bold", "bold,red") == ""
+    assert format.transition("blue,bold", "blue;red") == "\033[22;41m"
+    assert format.transition("bold;blue", "bold;208") == "\033[48;5;208m"
+    # Resetting is shorter than turning each attribute off
+    assert format.transition("bold,underline,blink,red", "green") == \
+           "\033[0;32m"
+    assert format.transition("red", "") == "\033[0m"
+
+@patch("peacock.peacock.peacock.MacKeyboard")
+def test_deferred_start(mock_keyboard):
+    mock_keyboard.return_value.keys = keys
+    mock_keyboard.return_value.get_key_or_none.return_value = None
+    app = Peacock(out=StringIO(), running=False)
+    assert not mock_keyboard.return_value.start.called
+    assert not app.is_alive() and not app.running
+
+    app.start()
+    try:
+        assert mock_keyboard.return_value.start.call_count == 1
+        assert app.is_alive() and app.running
+    finally:
+        app.stop()
+        app.join(1)
+    assert not app.is_alive()
+
+def test_macros():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.write("one\ntwo\nthree")
+    app.move_cursor_to(0, 0)
+    app.add_mode(Mode("normal", keyboard=app.keyboard, 
+                      parent=app.modes["insert"]))
+    app.on("i", mode="normal")(lambda app, *args: app.set_mode("insert"))
+    app.on("esc")(lambda app, *args: app.set_mode("normal"))
+    app.macros.bind("normal")
+    app.set_mode("normal")
+
+    for key in ["q", "a", "i", "#", "esc", "left", "down", "q"]:
+        app.handle(key)
+    assert app.macros.registers["a"] == ["i", "#", "esc", "left", "down"]
+    assert app.macros.recording is None
+    assert app._buffer == ["#one", "two", "three"]
+
+    with patch.object(app.interact, "_redraw", 
+                      wraps=app.interact._redraw) as redraw:
+        app.macros.play("a", 2)
+    assert redraw.call_count == 1
+    assert app._buffer == ["#one", "#two", "#three"]
+
+    # Playing from the keyboard, and a macro that plays itself
+    app.macros.registers["b"] = ["@", "b", "i", "!", "esc"]
+    app.handle("@")
+    app.handle("b")
+    assert app._buffer == ["#one", "#two", "!#three"]
+
+def test_feed():
+    out = StringIO()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    app.write("abc")
+    out.truncate(0)
+    out.seek(0)
+    with patch.object(app.interact, "_redraw", 
+                      wraps=app.interact._redraw) as redraw:
+        app.feed("xy")
+        app.feed(["left", "delete", "enter", "z"])
+    assert redraw.call_count == 2
+    assert app._buffer == ["abc", "zy"]
+    # Each feed redraws from the first line it changed, once
+    assert out.getvalue() == "\r\033[Jabcxy\r\033[Jabc\nzy\b"
+
+def test_batch():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.write("hello world")
+
+    @app.on("\\")
+    def transpose_line(app, cur_line, x):
+        with app.batch():
+            app.move_cursor_to_x(0)
+            app.interact.delete_line()
+            app.write(cur_line[x:] + cur_line[:x])
+            if not x:
+                raise ValueError
+
+    app.move_cursor_to_x(6)
+    app.handle("\\")
+    assert app._buffer == ["worldhello "]
+    app.move_cursor_to_x(0)
+    with pytest.raises(ValueError):
+        app.handle("\\")
+    assert app._buffer == ["worldhello "]
+    assert app._x == 0
+
+def test_completion():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.completion.bind()
+    app.write("peacock peahen peacock\npeak\n")
+
+    app.feed("pe")
+    app.handle("tab")
+    assert app.interact.popup == ["peacock", "peahen", "peak"]
+    assert app._buffer[-1] == "pe"
+    for key in ["tab", "tab", "up", "enter"]:
+        app.handle(key)
+    assert app.interact.popup is None
+    assert app._buffer[-1] == "peahen"
+
+    # A single completion is written straight away
+    app.feed([" ", "p", "e", "a", "c", "o", "tab"])
+    assert app._buffer[-1] == "peahen peacock"
+
+    # Any other key closes the popup, and is handled as usual
+    app.feed([" ", "p", "e", "a", "tab", "x"])
+    assert app.interact.popup is None
+    assert app._buffer[-1] == "peahen peacock peax"
+
+def test_held_arrows_are_handled_as_one_move():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.write("long line\nab\n\nanother long line\nlast")
+    app.move_cursor_to(7, 0)
+    app.keyboard.feed("\033[B" * 3 + "x")
+    with patch.object(app.interact, "_move_cursor", 
+                      wraps=app.interact._move_cursor) as move:
+        key = app.keyboard.get_key_or_none()
+        app.handle(key, app._repeats(key))
+    assert move.call_count == 1
+    # x is clipped by the empty line on the way, as single moves would be
+    assert (app._x, app._y) == (0, 3)
+    assert app.keyboard.get_key_or_none() == "x"
+
+    # Handlers that aren't counted take their keys one at a time
+    app.on("up")(lambda app, *args: app.move_cursor(-1, 0))
+    app.keyboard.feed("\033[A" * 2)
+    assert app._repeats(app.keyboard.get_key_or_none()) == 1
+
+def test_counts():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.write("\n".join(str(i) for i in range(20)))
+    app.move_cursor_to(0, 0)
+    app.add_mode(Mode("normal", keyboard=app.keyboard, counts=True,
+                      parent=app.modes["insert"]))
+    app.macros.bind("normal")
+    counts = []
+
+    @app.on("j", mode="normal", counted=True)
+    def down(app, *args):
+        counts.append(app.count)
+        app.move_cursor(app.count, 0)
+
+    @app.on("0", mode="normal")
+    def start_of_line(app, *args):
+        app.move_cursor_to_x(0)
+
+    app.set_mode("normal")
+    app.feed(["1", "0", "j", "j", "down"])
+    assert counts == [10, 1]
+    assert app._y == 12
+    assert app.count == 1
+
+    # A leading 0 is a key, and counts reach other handlers' arguments
+    app.feed(["right", "0", "2", "@", "a"])
+    assert app._x == 0
+    app.macros.registers["a"] = ["j", "j"]
+    assert counts == [10, 1]
+    app.feed(["3", "@", "a"])
+    assert counts == [10, 1] + [1] * 6
+    assert app._y == 18
+
+def test_calls_from_other_threads_are_queued():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.write("abc")
+    # While the loop isn't running, every thread writes directly
+    thread = Thread(target=app.write, args=("d",))
+    thread.start()
+    thread.join()
+    assert app._buffer == ["abcd"]
+
+    app.start()
+    try:
+        futures = []
+        def writer():
+            for _ in range(100):
+                futures.append(app.write("x"))
+        threads = [Thread(target=writer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        position = app.call(lambda: (app._x, app._y))
+        failed = app.move_cursor_to_x("nowhere")
+        assert position.result(1) == (404, 0)
+        assert isinstance(failed.exception(1), TypeError)
+        assert all(future.done() and future.result() is None 
+                   for future in futures)
+    finally:
+        app.stop()
+        app.join(1)
+    assert app._buffer == ["abcd" + "x" * 400]
+
+    # Once the loop has stopped, calls are direct again
+    assert app.write("!") is None
+    assert app._buffer == ["abcd" + "x" * 400 + "!"]
+
+def test_calls_made_as_the_loop_stops_are_all_made():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.start()
+    deadline = perf_counter() + 5
+    while app._loop is None and perf_counter() < deadline:
+        sleep(0.001)
+    futures = []
+    writer = Thread(target=lambda: futures.append(app.write("x")))
+    # The writer has seen the loop running, but is held up queueing its
+    # call until the loop has been told to stop
+    with app._calls_lock:
+        writer.start()
+        sleep(0.05)
+        app.stop()
+        sleep(0.05)
+    writer.join(1)
+    app.join(1)
+    # It was queued before the loop's last calls, or made directly after
+    # them, not left waiting
+    assert app._buffer == ["x"]
+    assert futures[0] is None or futures[0].done()
+
+def test_only_exceptions_are_kept_from_the_loop():
+    def interrupt():
+        raise KeyboardInterrupt
+    future = Future()
+    with pytest.raises(KeyboardInterrupt):
+        Peacock._resolve(future, interrupt, (), {})
+    assert isinstance(future.exception(0), KeyboardInterrupt)
+
+def test_event_loop_sleeps_until_keys_arrive():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.start()
+    try:
+        # Fed from another thread, as a keyboard's thread would
+        app.keyboard.feed("hi")
+        deadline = perf_counter() + 5
+        while app._buffer != ["hi"] and perf_counter() < deadline:
+            sleep(0.001)
+        assert app._buffer == ["hi"]
+    finally:
+        app.stop()
+        app.join(1)
+    assert not app.is_alive()
+
+def test_stop_closes_scrollback_spill_files(tmp_path):
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.scrollback = Scrollback(max_lines=8, spill=str(tmp_path / "app.log"))
+    log = app.buffer("log")
+    log.scrollback = Scrollback(max_lines=8, spill=str(tmp_path / "log.log"))
+    app.write("".join("{}\n".format(i) for i in range(10)))
+    log.append("".join("{}\n".format(i) for i in range(10)))
+    spills = [app.scrollback.spill, log.scrollback.spill]
+    app.stop()
+    assert all(spill.closed for spill in spills)
+    with open(str(tmp_path / "app.log")) as spill:
+        assert spill.read() == "0\n1\n2\n3\n"
+
+    # Files it was given are left open
+    with open(str(tmp_path / "given.log"), "a") as given:
+        with Scrollback(spill=given) as scrollback:
+            pass
+        assert not given.closed and scrollback.spill is None
+
+def test_stop_closes_files_once_the_loop_has_stopped(tmp_path):
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.scrollback = Scrollback(max_lines=8, spill=str(tmp_path / "app.log"))
+    app.record(str(tmp_path / "keys.log"))
+    entered, release, raised = Event(), Event(), []
+    @app.on("a")
+    def slow(app, *args):
+        entered.set()
+        release.wait(5)
+        try:
+            app.write("".join("{}\n".format(i) for i in range(10)))
+        except Exception as e:
+            raised.append(e)
+    app.start()
+    try:
+        app.keyboard.feed("a")
+        assert entered.wait(5)
+
+        # The key being handled still has the files it uses
+        app.stop()
+        assert app.recorder and not app.scrollback.spill.closed
+        release.set()
+        app.join(5)
+    finally:
+        release.set()
+    assert not app.is_alive() and not raised
+    assert app.recorder is None and app.scrollback.spill is None
+    with open(str(tmp_path / "app.log")) as spill:
+        assert spill.read() == "0\n1\n2\n3\n"
+
+def test_cursor_saves_and_batches_from_other_threads():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+    app.write("abc\ndef")
+    app.start()
+    try:
+        restore = app.save_cursor().result(1)
+        app.move_cursor_to(0, 0).result(1)
+        assert restore().result(1) is None
+        assert app.call(lambda: (app._x, app._y)).result(1) == (3, 1)
+
+        # The edits inside a batch would only be queued, so there would be
+        # nothing to put back if it failed
+        with pytest.raises(RuntimeError):
+            with app.batch():
+                app.write("x")
+        def failing():
+            with app.batch():
+                app.write("x")
+                raise ValueError
+        assert isinstance(app.call(failing).exception(1), ValueError)
+        assert app.call(lambda: list(app._buffer)).result(1) == ["abc", "def"]
+    finally:
+        app.stop()
+        app.join(1)
@@ -0,0 +1,59 @@
+from io import StringIO
+import logging
+import pstats
+from time import sleep
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+
+def slow_app():
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder())
+
+    @app.on("ctrl+s")
+    def slow(app, *args):
+        sleep(0.02)
+        app.write("!")
+
+    return app
+
+def test_profile_times_each_binding(caplog):
+    app = slow_app()
+    profiler = app.profile(budget=0.01)
+    with caplog.at_level(logging.WARNING, logger="peacock"):
+        app.feed(["a", "left", "left", "ctrl+s"])
+    # Unbound keys are echoed, and there's no handler to time
+    assert {(stats.key, stats.calls) for stats in profiler.stats.values()} \
+           == {("left", 2), ("ctrl+s", 1)}
+    slow = next(stats for stats in profiler.stats.values() 
+                if stats.key == "ctrl+s")
+    assert slow.mode == "insert" and slow.slow == 1
+    assert slow.p50 == slow.p99 == slow.total >= 0.02
+    assert len(caplog.records) == 1
+    assert "slow_app.<locals>.slow" in caplog.records[0].getMessage()
+
+    report = profiler.report().splitlines()
+    assert len(report) == 3 and "'ctrl+s'" in report[1]
+
+    app.stop_profiling()
+    app.handle("ctrl+s")
+    assert slow.calls == 1
+
+def test_profile_captures(tmp_path):
+    app = slow_app()
+    profiler = app.profile()
+    path = str(tmp_path / "handlers.prof")
+    profiler.capture(2, path)
+    app.feed(["ctrl+s", "ctrl+s", "ctrl+s"])
+    # Only the first two were profiled
+    calls = {name: stats[0] for (_, _, name), stats 
+             in pstats.Stats(path).stats.items()}
+    assert calls["slow"] == 2
+
+    path = str(tmp_path / "handlers.stacks")
+    profiler.capture(1, path, sampling=True, interval=0.001)
+    app.handle("ctrl+s")
+    with open(path) as stacks:
+        lines = stacks.read().splitlines()
+    assert lines
+    assert all(line.rsplit(" ", 1)[0].endswith(")") for line in lines)
+    assert any("slow (test_profiler.py" in line for line in lines)
@@ -0,0 +1,51 @@
+import os
+from io import StringIO
+
+from peacock import Peacock
+from peacock.interact import KeyDecoder
+from peacock.peacock.record import Replay, load, replay
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def setup(app):
+    @app.on("ctrl+x")
+    def shout(app, *args):
+        app.write("!")
+
+def test_record_and_replay(tmp_path):
+    app = Peacock(running=False, out=StringIO(), keyboard=KeyDecoder(),
+                  line_length=60)
+    setup(app)
+    path = str(tmp_path / "session.keys")
+    app.record(path)
+    for key in ["a", " ", "\\", "enter", "日", "ctrl+x", "left"]:
+        app.handle(key)
+    # Each key is on disk before the recording is stopped, in case it never is
+    assert len(load(path)[1]) == 7
+    app.stop_recording()
+
+    line_length, events = load(path)
+    assert line_length == 60
+    assert [key for _, key in events] == \
+           ["a", " ", "\\", "enter", "日", "ctrl+x", "left"]
+
+    result = replay(path, setup)
+    assert result.buffer == app._buffer == ["a \\", "日!"]
+    assert result.output_bytes == len(app.out.getvalue().encode("utf-8"))
+    assert len(result.times) == 7
+
+def test_fixture_against_baseline(tmp_path):
+    result = replay(os.path.join(FIXTURES, "typing.keys"), setup)
+    assert result.buffer == ["hello", "wo日!ld"]
+
+    baseline = Replay.load(os.path.join(FIXTURES, "typing.json"))
+    assert result.compare(baseline, slowdown=None) == []
+
+    # Regressions are reported
+    slower = Replay(["hello"], baseline.output_bytes + 1,
+                    [t * 10 + 1 for t in baseline.times])
+    assert len(slower.compare(baseline)) == 3
+
+    path = str(tmp_path / "baseline.json")
+    result.save(path)
+    assert Replay.load(path).buffer == result.buffer
@@ -0,0 +1,160 @@
+import os
+import pytest
+import threading
+
+from peacock.interact import KeyDecoder
+from peacock.peacock.server import Server
+
+def setup(app):
+    @app.on("ctrl+x")
+    def shout(app, *args):
+        app.write("!")
+
+def test_key_decoder():
+    decoder = KeyDecoder()
+    decoder.feed("a\033[A\x18\033")
+    keys = [decoder.get_key_or_none() for _ in range(4)]
+    assert keys == ["a", "up", "ctrl+x", None]
+    decoder.flush_escape()
+    assert decoder.get_key_or_none() == "esc"
+
+def test_sessions_are_independent():
+    server = Server(setup)
+    one, one_master = server.spawn()
+    two, two_master = server.spawn()
+    os.write(one_master, b"hi\x18")
+    os.write(two_master, "日本".encode())
+    while server.poll(0.2) == 0:
+        pass
+    server.poll(0.05)
+    assert one.app._buffer == ["hi!"]
+    assert two.app._buffer == ["日本"]
+    assert os.read(one_master, 1024).replace(b"\033[J", b"") == b"hi!"
+
+    # Closing the terminal ends its session only
+    os.close(two_master)
+    server.poll(0.2)
+    assert list(server.sessions.values()) == [one]
+    os.close(one_master)
+
+def test_stop_from_another_thread():
+    server = Server(setup)
+    session, master = server.spawn()
+    loop = threading.Thread(target=server.run)
+    loop.start()
+    server.stop()
+    loop.join(1)
+    assert not loop.is_alive()
+    assert server.sessions == {}
+    os.close(master)
+
+def test_servers_close_their_descriptors():
+    def closed(server):
+        # The selector's own descriptor and both ends of the wake pipe
+        fds = [server._selector.fileno(), server._wake_r, server._wake_w]
+        def gone(fd):
+            try:
+                os.fstat(fd)
+            except OSError:
+                return True
+            return False
+        return lambda: all(map(gone, fds))
+
+    server = Server(setup)
+    session, master = server.spawn()
+    is_closed = closed(server)
+    loop = threading.Thread(target=server.run)
+    loop.start()
+    server.stop()
+    loop.join(1)
+    assert is_closed() and server.sessions == {}
+    os.close(master)
+
+    # Stopping it again writes to nothing, and a server that's only polled
+    # is closed by close()
+    server.stop()
+    server = Server(setup)
+    is_closed = closed(server)
+    server.poll(0)
+    server.close()
+    server.close()
+    assert is_closed()
+
+def test_a_raising_session_is_ended_alone(caplog):
+    def broken(app):
+        setup(app)
+        @app.on("ctrl+b")
+        def fail(app, *args):
+            raise ValueError("broken handler")
+
+    server = Server(broken)
+    one, one_master = server.spawn()
+    two, two_master = server.spawn()
+    os.write(one_master, b"\x02")
+    os.write(two_master, b"\x18")
+    while two.app._buffer != ["!"]:
+        server.poll(1)
+    assert list(server.sessions.values()) == [two]
+    assert "broken handler" in caplog.text
+    # The session's PTY was spawned by the server, which closes it
+    with pytest.raises(OSError):
+        os.fstat(one.fd)
+    os.close(one_master)
+    server.remove(two)
+    with pytest.raises(OSError):
+        os.fstat(two.fd)
+    os.close(two_master)
+
+def test_a_slow_client_holds_up_only_its_own_output():
+    def flood(app):
+        @app.on("ctrl+f")
+        def write_lots(app, *args):
+            app.write("x" * 200000)
+
+    server = Server(flood, line_length=100000)
+    slow, slow_master = server.spawn()
+    fast, fast_master = server.spawn()
+    os.write(slow_master, b"\x06")
+    server.poll(1)
+    # More than a PTY holds, so the rest waits for the client to read it
+    assert slow.out.pending
+
+    os.write(fast_master, b"hi")
+    server.poll(1)
+    assert os.read(fast_master, 1024).replace(b"\033[J", b"") == b"hi"
+
+    received = 0
+    while slow.out.pending or received < 200000:
+        received += len(os.read(slow_master, 65536))
+        server.poll(0)
+    assert received >= 200000
+    for master in (slow_master, fast_master):
+        os.close(master)
+
+def test_sessions_hold_escape_sequences_split_across_reads():
+    def arrows(app):
+        @app.on("up")
+        def up(app, *args):
+            app.write("^")
+
+        @app.on("esc")
+        def escape(app, *args):
+            app.write("e")
+
+    server = Server(arrows)
+    session, master = server.spawn()
+    os.write(master, b"\033[")
+    server.poll(1)
+    assert session.app._buffer == [""]
+    os.write(master, b"A")
+    server.poll(1)
+    assert session.app._buffer == ["^"]
+
+    # A lone esc is handled once the loop has waited for the rest of it
+    os.write(master, b"\033")
+    server.poll(1)
+    while session.app._buffer != ["^e"]:
+        assert server.poll(1) == 0
+    assert not server._escapes
+    server.remove(session)
+    os.close(master)
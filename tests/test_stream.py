@@ -0,0 +1,52 @@
+from io import StringIO
+from threading import Thread
+
+from peacock import Peacock
+from peacock.format import StyledText
+from peacock.interact import Buffer, KeyDecoder, Stream, Window
+
+def test_flush_appends_everything_written_at_once():
+    buffer = Buffer("log")
+    stream = Stream(buffer, fps=10)
+    writers = [Thread(target=lambda: [stream.write("x\n") for _ in range(500)])
+               for _ in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert stream.due(0)
+    assert stream.flush() == 2000
+    assert len(buffer) == 2001
+    assert not stream.due(0)
+
+def test_styles_survive_joining():
+    buffer = Buffer("log")
+    stream = Stream(buffer)
+    stream.write("plain ")
+    stream.write(StyledText("red", [(3, "red")]))
+    stream.flush()
+    assert buffer[0] == "plain red"
+    assert buffer._styles[0] == [(6, ""), (3, "red")]
+
+def test_slow_frames_drop_the_frames_in_between():
+    stream = Stream(Buffer("log"), fps=4)
+    stream.write("a")
+    stream.drawn(1.0, 1.1)
+    assert stream.due(1.25) and not stream.due(1.2)
+
+    # A frame that took 0.6 s takes the time of three frames
+    stream.drawn(1.25, 1.85)
+    assert not stream.due(1.9) and stream.due(2.0)
+    assert (stream.frames, stream.dropped) == (2, 2)
+
+def test_app_flushes_streams():
+    out = StringIO()
+    app = Peacock(running=False, out=out, keyboard=KeyDecoder())
+    log = app.stream("log")
+    app.layout(Window(app.buffer("log"), follow=True), 2)
+    log.write("started\n")
+    log.write("ready")
+    assert app.flush_streams()
+    assert app.buffer("log").text == "started\nready"
+    assert not app.flush_streams()
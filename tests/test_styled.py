@@ -0,0 +1,77 @@
+import pytest
+from io import StringIO
+
+from peacock import format
+from peacock.format import StyledText
+from peacock.format.styled import restyle_runs, split_runs
+from peacock.interact import InteractANSIMac
+
+@pytest.fixture
+def ansi():
+    return InteractANSIMac(None, StringIO(), 120)
+
+def styles(ansi):
+    return [line and line.styles for line in ansi._lines]
+
+def test_from_ansi():
+    text = StyledText.from_ansi(format("a{|blue}c", "b"))
+    assert text == "abc"
+    assert text.runs == [(1, ""), (1, "blue"), (1, "")]
+
+def test_line_runs():
+    text = StyledText("ab\ncd\nef", [(4, "red"), (4, "")])
+    assert text.line_runs() == [[(2, "red")], [(1, "red"), (1, "")], None]
+
+def test_split_runs_unstyled_is_none():
+    assert split_runs([(3, "")], [1, 1]) == [None, None]
+
+def test_restyle_runs():
+    assert restyle_runs(None, 1, 3, "red", 5) == [(1, ""), (2, "red"), (2, "")]
+    assert restyle_runs([(5, "red")], 0, 5, "", 5) is None
+
+def test_write_ansi_keeps_buffer_plain(ansi):
+    ansi.write(format("hello {|red,bold}", "world"))
+    assert ansi._buffer == ["hello world"]
+    assert (ansi.x, ansi.y) == (11, 0)
+    assert ansi.line_runs(0) == [(6, ""), (5, "bold,red")]
+
+def test_insert_into_styled_line(ansi):
+    ansi.write(StyledText("abcd", [(4, "red")]))
+    ansi.move_cursor(cols=-2)
+    ansi.write("X\nY")
+    assert ansi._buffer == ["abX", "Ycd"]
+    assert styles(ansi) == [[(2, "red"), (1, "")], [(1, ""), (2, "red")]]
+
+def test_delete_keeps_styles(ansi):
+    ansi.write(StyledText("ab\ncd", [(5, "red")]))
+    ansi.move_cursor_to(0, 1)
+    ansi.delete(1)
+    assert ansi._buffer == ["abcd"]
+    assert styles(ansi) == [[(4, "red")]]
+
+def test_restyle(ansi):
+    ansi.write("hello\nworld")
+    ansi.out.truncate(0)
+    ansi.out.seek(0)
+    ansi.restyle(3, 0, 2, 1, "blue")
+    assert ansi._buffer == ["hello", "world"]
+    assert styles(ansi) == [[(3, ""), (2, "blue")], [(2, "blue"), (3, "")]]
+    assert (ansi.x, ansi.y) == (5, 1)
+
+    # Only the restyled text is redrawn, nothing is erased
+    out = ansi.out.getvalue()
+    assert "\033[34mlo\033[0m" in out and "\033[34mwo\033[0m" in out
+    assert "\033[K" not in out
+
+def test_restyle_keeps_cached_metadata(ansi):
+    ansi.write("日本\nabc")
+    ansi.rows(0)
+    cmap, wrap = ansi._lines[0].colmap, ansi._lines[0].wrap
+    ansi.restyle(0, 0, 1, 0, "red")
+    assert ansi._lines[0].colmap is cmap and ansi._lines[0].wrap is wrap
+
+def test_replace_all_keeps_styles_around_matches(ansi):
+    ansi.write(StyledText("a foo b", [(7, "red")]))
+    assert ansi.replace_all("foo", "bar\nbaz") == 1
+    assert ansi._buffer == ["a bar", "baz b"]
+    assert styles(ansi) == [[(2, "red"), (3, "")], [(3, ""), (2, "red")]]
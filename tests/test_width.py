@@ -0,0 +1,74 @@
+import pytest
+from io import StringIO
+
+from peacock.interact import InteractANSIMac
+from peacock.interact.width import ColumnMap, char_width
+
+@pytest.fixture
+def ansi():
+    return InteractANSIMac(None, StringIO(), 120)
+
+def test_char_width():
+    assert char_width("a") == 1
+    assert char_width("日") == 2
+    assert char_width("́") == 0
+    assert char_width("😀") == 2
+
+def test_column_map_ascii():
+    cmap = ColumnMap("hello")
+    assert cmap.column(3) == 3
+    assert cmap.index(3) == 3
+    assert cmap.column(100) == cmap.width == 5
+
+def test_column_map_wide():
+    cmap = ColumnMap("日本a")
+    assert [cmap.column(i) for i in range(4)] == [0, 2, 4, 5]
+    assert [cmap.index(c) for c in range(6)] == [0, 0, 1, 1, 2, 3]
+
+def test_column_map_combining_and_tabs():
+    cmap = ColumnMap("é\tb")
+    assert [cmap.column(i) for i in range(5)] == [0, 1, 1, 8, 9]
+    assert cmap.index(4) == 2
+
+def test_move_over_wide_chars(ansi):
+    ansi.write("日本語")
+    ansi.out.truncate(0)
+    ansi.out.seek(0)
+    ansi.move_cursor(cols=-1)
+    assert (ansi.x, ansi.y) == (2, 0)
+    assert ansi.out.getvalue() == "\b\b"
+
+def test_vertical_move_uses_both_lines(ansi):
+    ansi.write("a\tb\n日本")
+    ansi.out.truncate(0)
+    ansi.out.seek(0)
+    ansi.move_cursor(-1, 1)
+    assert (ansi.x, ansi.y) == (3, 0)
+    assert ansi.out.getvalue() == "\033[A\033[5C"
+
+def test_column_maps_cached_and_invalidated(ansi):
+    ansi.write("日本\nabc")
+    ansi.move_cursor(-1)
+    cmap = ansi._lines[0].colmap
+    ansi.move_cursor(1)
+    ansi.move_cursor(-1)
+    assert ansi._lines[0].colmap is cmap
+    ansi.write("x")
+    assert ansi.column() == 5
+    assert ansi._lines[0].colmap is not cmap
+
+def test_delete_keeps_metadata_of_lines_below(ansi):
+    ansi.write("ab\ncd\n日本\nef")
+    cmaps = [ansi._column_map(y) for y in (2, 3)]
+    lines = ansi._lines[2:]
+    ansi.move_cursor_to(0, 1)
+    ansi.delete(1)
+    assert ansi._buffer == ["abcd", "日本", "ef"]
+
+    # The lines below only moved up, so their records moved with them
+    assert ansi._lines[1:] == lines
+    assert [ansi._column_map(y) for y in (1, 2)] == cmaps
+
+    # Untouched lines have no record at all
+    ansi.write("\n" * 3)
+    assert ansi._lines.count(None) >= 2
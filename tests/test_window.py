@@ -0,0 +1,143 @@
+import pytest
+from io import StringIO
+
+from peacock.format import StyledText
+from peacock.interact import Buffer, Window, Split, Compositor, Scrollback
+
+class CountingIO(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+    def take(self):
+        value = self.getvalue()
+        self.truncate(0)
+        self.seek(0)
+        return value
+
+@pytest.fixture
+def screen():
+    files = Buffer("files", "a.py\nb.py")
+    preview = Buffer("preview", "import os")
+    left, right = Window(files), Window(preview)
+    out = CountingIO()
+    compositor = Compositor(out, 20, 3, Split("vertical", [left, right], [1, 3]))
+    return compositor, files, preview, left, right
+
+def test_split_regions(screen):
+    compositor, files, preview, left, right = screen
+    assert (left.top, left.left, left.height, left.width) == (0, 0, 3, 5)
+    assert (right.top, right.left, right.height, right.width) == (0, 5, 3, 15)
+
+    nested = Split("horizontal", [Window(files), Window(preview)])
+    Split("vertical", [Window(files), nested]).place(0, 0, 5, 10)
+    assert [(w.top, w.left, w.height) for w in nested.windows()] == \
+           [(0, 5, 2), (2, 5, 3)]
+
+def test_first_frame_draws_everything(screen):
+    compositor, *_ = screen
+    assert compositor.render() == 6
+    out = compositor.out.take()
+    assert "\033[1;1Ha.py " in out and "\033[1;6Himport os      " in out
+    assert compositor.out.writes == 1
+
+def test_update_one_pane(screen):
+    compositor, files, preview, left, right = screen
+    compositor.render()
+    compositor.out.take()
+    compositor.out.writes = 0
+
+    preview.set_line(0, "import sys")
+    assert compositor.render() == 1
+    assert compositor.out.take() == "\033[1;6Himport sys     "
+    assert compositor.out.writes == 1
+
+    # Nothing changed, so nothing is written
+    assert compositor.render() == 0
+    assert compositor.out.writes == 1
+
+    # The focused window's cursor goes out with the frame, but isn't a row
+    compositor.focus = right
+    right.cursor = (2, 0)
+    preview.set_line(0, "import re")
+    assert compositor.render() == 1
+    assert compositor.out.take() == "\033[1;6Himport re      \033[1;8H"
+
+def test_inserting_lines_repaints_rows_below(screen):
+    compositor, files, preview, left, right = screen
+    compositor.render()
+    compositor.out.take()
+    files.insert_lines(1, "a2.py")
+    compositor.render()
+    out = compositor.out.take()
+
+    # a.py is unchanged, and its row is not repainted
+    assert "a.py" not in out
+    assert "\033[2;1Ha2.py" in out and "\033[3;1Hb.py " in out
+
+def test_clipping_and_styles(screen):
+    compositor, files, *_ = screen
+    compositor.render()
+    compositor.out.take()
+    files.set_line(0, StyledText("longname.py", [(4, "red"), (7, "")]))
+    compositor.render()
+    assert compositor.out.take() == "\033[1;1H\033[31mlong\033[0mn"
+
+def test_follow():
+    log = Buffer("log")
+    window = Window(log, follow=True)
+    compositor = Compositor(StringIO(), 10, 2, window)
+    for i in range(5):
+        log.append("line {}\n".format(i))
+    assert window.scroll == 4
+    compositor.render()
+    assert compositor.out.getvalue().endswith("\033[1;1Hline 4    \033[2;1H          ")
+
+def test_following_window_scrolls_natively():
+    log = Buffer("log", "a\nb")
+    out = CountingIO()
+    compositor = Compositor(out, 6, 3, Split("horizontal", [
+        Window(log, follow=True), Window(Buffer("status", "ok"))], [2, 1]))
+    compositor.render()
+    out.take()
+
+    # Only the rows of the log window move, and only the new line is drawn
+    log.append("\nc")
+    assert compositor.render() == 1
+    assert out.take() == "\033[1;2r\033[S\033[r\033[2;1Hc     "
+
+    # Scrolling further than the window is tall just repaints it
+    log.append("\nd\ne")
+    assert compositor.render() == 2
+    assert out.take() == "\033[1;1Hd     \033[2;1He     "
+
+def test_narrow_following_window_repaints():
+    log = Buffer("log", "a\nb")
+    out = CountingIO()
+    compositor = Compositor(out, 6, 2, Split("vertical", [
+        Window(Buffer("files", "x")), Window(log, follow=True)]))
+    compositor.render()
+    out.take()
+    log.append("\nc")
+    assert compositor.render() == 2
+    assert out.take() == "\033[1;4Hb  \033[2;4Hc  "
+
+def test_scrollback_keeps_following_windows_in_place():
+    log = Buffer("log", "a\nb")
+    log.scrollback = Scrollback(max_lines=3)
+    window = Window(log, follow=True)
+    out = CountingIO()
+    compositor = Compositor(out, 6, 2, window)
+    compositor.render()
+    out.take()
+
+    log.append("\nc\nd\ne")
+    assert log.text == "c\nd\ne"
+    assert (log.first, log[2], window.scroll) == (2, "c", 3)
+    assert log.scrollback.evicted == 2
+    compositor.render()
+    assert out.take() == "\033[1;1Hd     \033[2;1He     "
@@ -0,0 +1,325 @@
+import pytest
+from io import StringIO
+
+from peacock.interact import (Completer, Highlighter, InteractANSIMac, 
+                              Scrollback)
+from peacock.interact.capture import Screen
+from peacock.interact.width import ColumnMap
+from peacock.interact.wrap import Wrap
+
+@pytest.fixture
+def ansi():
+    return InteractANSIMac(None, StringIO(), 4)
+
+def clear(interact):
+    interact.out.truncate(0)
+    interact.out.seek(0)
+
+def shown(interact):
+    """
+        Plays everything the interact wrote through a model of a terminal,
+        and returns the text of each row and whether the terminal's cursor
+        is where the interact has it
+    """
+    screen = Screen(interact.line_length)
+    screen.play(interact.out.getvalue())
+    rows = [""] * (max([row for row, _ in screen.cells] or [0]) + 1)
+    for (row, col), (ch, _) in sorted(screen.cells.items()):
+        rows[row] = rows[row].ljust(col) + ch
+    row, col = interact.display_position()
+    cursor = (interact.row_distance(0, interact.y) + row, col)
+    # A cursor waiting to wrap is at the start of the next row, once it does
+    at = ((screen.row + 1, 0) if screen.col >= interact.line_length else
+          (screen.row, screen.col))
+    return [row.rstrip() for row in rows], at == cursor
+
+def test_wrap_plain():
+    cmap = ColumnMap("hello world")
+    wrap = Wrap(cmap, 4)
+    assert list(wrap.starts) == [0, 4, 8]
+    assert wrap.position(cmap, 9) == (2, 1)
+    assert Wrap(ColumnMap(""), 4).rows == 1
+
+def test_wrap_exact_fit_ends_at_the_next_row():
+    cmap = ColumnMap("abcd")
+    wrap = Wrap(cmap, 4)
+    assert wrap.rows == 1
+    assert wrap.position(cmap, 3) == (0, 3)
+    # The next character printed goes to the row after, as the cursor does
+    assert wrap.position(cmap, 4) == (1, 0)
+
+def test_wide_char_moves_to_next_row():
+    cmap = ColumnMap("abc日")
+    wrap = Wrap(cmap, 4)
+    assert list(wrap.starts) == [0, 3]
+    assert wrap.position(cmap, 4) == (1, 2)
+
+def test_move_within_wrapped_line(ansi):
+    ansi.write("abcdefghij")
+    clear(ansi)
+    ansi.move_cursor(cols=-9)
+    assert (ansi.x, ansi.y) == (1, 0)
+    assert ansi.out.getvalue() == "\033[2A\b"
+
+def test_move_across_wrapped_lines(ansi):
+    ansi.write("abcdefghij\nxy")
+    clear(ansi)
+    ansi.move_cursor(-1)
+    assert (ansi.x, ansi.y) == (2, 0)
+    assert ansi.out.getvalue() == "\033[3A"
+
+def test_display_rows(ansi):
+    ansi.write("abcdef\ngh")
+    assert list(ansi.display_rows()) == [(0, 0, 4), (0, 4, 6), (1, 0, 2)]
+    assert list(ansi.display_rows(0, 1)) == [(0, 4, 6), (1, 0, 2)]
+
+def test_resize_rewraps_lazily(ansi):
+    ansi.write("abcdef\nabcdef\nabcdef")
+    assert [ansi.rows(y) for y in range(3)] == [2, 2, 2]
+    wraps = [line.wrap for line in ansi._lines]
+    ansi.resize(3)
+    assert ansi.rows(2) == 2
+    assert ansi._lines[0].wrap is wraps[0]
+    assert ansi._lines[2].wrap is not wraps[2]
+
+def test_delete_line_clears_wrapped_rows(ansi):
+    ansi.write("abcdefghij")
+    ansi.move_cursor_to_x(2)
+    clear(ansi)
+    ansi.delete_line()
+    assert ansi._buffer == ["ab"]
+    assert ansi.out.getvalue().startswith("\033[K\033[1B\033[2K\033[1B\033[2K\033[2A")
+
+def test_suspended_edits_redraw_once(ansi):
+    ansi.write("abcdef\ngh\nij")
+    clear(ansi)
+    with ansi.suspended():
+        ansi.move_cursor_to(0, 1)
+        ansi.write("XYZ")
+        ansi.move_cursor(1)
+        ansi.delete(1)
+        assert ansi.out.getvalue() == ""
+    assert ansi._buffer == ["abcdef", "XYZgh", "i"]
+    assert (ansi.x, ansi.y) == (1, 2)
+    # Up one row to the first line that changed, then everything from there
+    assert ansi.out.getvalue() == "\033[A\r\033[JXYZgh\ni"
+
+def test_suspensions_keep_only_the_lines_they_touch(ansi):
+    ansi.write("\n".join(str(i) for i in range(100)) + "abcdefghij")
+    before = len(ansi.out.getvalue())
+    with ansi.suspended():
+        ansi.write("kl")
+        changes, = ansi._changes
+        assert (changes.first, changes.after) == (99, 0)
+        assert list(changes.lines) == ["99abcdefghij"]
+    # Only the last row of the line changed, so the rows above it are kept
+    assert ansi.out.getvalue()[before:] == "\033[A\033[Jghijkl"
+    rows, cursor = shown(ansi)
+    assert rows[-4:] == ["99ab", "cdef", "ghij", "kl"] and cursor
+
+def test_batch_rewrites_only_the_changed_block(ansi):
+    ansi.write("abcdef\ngh\nij")
+    clear(ansi)
+    with ansi.batch():
+        ansi.move_cursor_to(0, 0)
+        ansi.delete_line()
+        ansi.write("fedcba")
+    assert ansi._buffer == ["fedcba", "gh", "ij"]
+    # The line still takes two rows, so those two are cleared and written
+    # again, and the lines below are left alone
+    assert ansi.out.getvalue() == "\033[3A\r\033[2K\033[B\033[2K\033[Afedcba"
+
+def test_batch_rolls_back_on_exceptions(ansi):
+    ansi.write("ab\ncd")
+    clear(ansi)
+    with pytest.raises(ValueError):
+        with ansi.batch():
+            ansi.write("\nxy")
+            raise ValueError
+    assert ansi._buffer == ["ab", "cd"]
+    assert (ansi.x, ansi.y) == (2, 1)
+    assert ansi.out.getvalue() == ""
+
+    # A failed inner batch only undoes its own changes
+    with ansi.batch():
+        ansi.write("!")
+        with pytest.raises(KeyError):
+            with ansi.batch():
+                ansi.move_cursor_to(0, 0)
+                ansi.write("zz")
+                raise KeyError
+    assert ansi._buffer == ["ab", "cd!"]
+    assert (ansi.x, ansi.y) == (3, 1)
+    assert ansi.out.getvalue() == "\r\033[Jcd!"
+
+def test_batch_keeps_only_the_lines_it_touches(ansi):
+    ansi.write("\n".join(str(i) for i in range(100)))
+    with ansi.batch():
+        ansi.move_cursor_to(0, 50)
+        ansi.write("#")
+        changes = ansi._changes[-1]
+        assert (changes.first, list(changes.lines)) == (50, ["50"])
+
+    # Interrupting a batch isn't a failure of what it did, which is kept
+    with pytest.raises(KeyboardInterrupt):
+        with ansi.batch():
+            ansi.write("#")
+            raise KeyboardInterrupt
+    assert ansi._buffer[50] == "##50"
+    assert ansi._changes == []
+
+def test_replace_all_rewrites_only_changed_lines(ansi):
+    ansi.write("foo\nab\nfoo\nabcdef\nx")
+    clear(ansi)
+    assert ansi.replace_all("o", "0") == 4
+    assert ansi._buffer == ["f00", "ab", "f00", "abcdef", "x"]
+    assert (ansi.x, ansi.y) == (1, 4)
+    # Up to the first line, then down past the unchanged one to the third
+    assert ansi.out.getvalue() == ("\033[5A\r\033[2Kf00\033[2B\r\033[2Kf00"
+                                   "\033[3B\b\b")
+
+    clear(ansi)
+    assert ansi.undo()
+    assert ansi._buffer == ["foo", "ab", "foo", "abcdef", "x"]
+    assert ansi.out.getvalue() == ("\033[5A\r\033[2Kfoo\033[2B\r\033[2Kfoo"
+                                   "\033[3B\b\b")
+    assert not ansi.undo()
+
+def test_replace_all_in_region(ansi):
+    ansi.write("aaa\naaa\naaa")
+    assert ansi.replace_all("a", "b", (2, 0, 1, 2)) == 5
+    assert ansi._buffer == ["aab", "bbb", "baa"]
+
+def test_replace_all_sees_the_text_around_its_region(ansi):
+    # The region's ends aren't the ends of the line, for anchors and word
+    # boundaries
+    ansi.write("foobar")
+    assert ansi.replace_all(r"^bar", "X", (3, 0, 6, 0)) == 0
+    assert ansi.replace_all(r"\bbar", "X", (3, 0, 6, 0)) == 0
+    assert ansi._buffer == ["foobar"]
+    assert ansi.replace_all(r"(?<=o)bar", "X", (3, 0, 6, 0)) == 1
+    assert ansi._buffer == ["fooX"]
+
+def test_popup_covers_the_rows_below_the_line(ansi):
+    ansi.write("abcdef\ngh\nij")
+    ansi.move_cursor_to(1, 0)
+    clear(ansi)
+    ansi.show_popup(["one", "three"], selected=1)
+    # Items are cut off short of the last column
+    assert ansi.out.getvalue() == ("\n\n\033[2Kone\n\033[2K\033[7mthr\033[0m"
+                                   "\033[3A\b\b")
+    assert ansi._buffer == ["abcdef", "gh", "ij"]
+
+    clear(ansi)
+    ansi.hide_popup()
+    assert ansi.out.getvalue() == ("\033[2B\r\033[2K\033[B\033[2K\033[Agh\nij"
+                                   "\033[3A\b")
+    assert ansi.popup is None
+
+def test_scrollback_evicts_the_oldest_lines(ansi):
+    spill = StringIO()
+    ansi.scrollback = Scrollback(max_lines=8, spill=spill)
+    ansi.write("".join("{}\n".format(i) for i in range(7)))
+    assert len(ansi._buffer) == 8
+    clear(ansi)
+
+    # Going over the cap evicts down to 7/8 of it. Nothing more is written,
+    # and the lines kept keep their indices
+    ansi.write("7\nx")
+    assert list(ansi._buffer) == [str(i) for i in range(2, 8)] + ["x"]
+    assert (ansi.x, ansi.y, ansi._buffer[8]) == (1, 8, "x")
+    assert ansi.scrollback.evicted == ansi._first == 2
+    assert spill.getvalue() == "0\n1\n"
+    assert ansi.out.getvalue() == "\033[J7\nx"
+
+    # The first line kept is as far up as the cursor goes
+    ansi.move_cursor_to(0, 0)
+    assert ansi.y == 2
+    assert ansi.out.getvalue() == "\033[J7\nx\033[6A\r"
+
+def test_scrollback_keeps_the_cursors_line(ansi):
+    ansi.write("abc\ndef\nghi")
+    ansi.move_cursor_to(0, 1)
+    ansi.scrollback = Scrollback(max_chars=4)
+    ansi.write("!")
+    assert list(ansi._buffer) == ["!def", "ghi"]
+    assert (ansi.x, ansi.y) == (1, 1)
+
+def test_scrollback_keeps_what_holds_a_line_on_it(ansi):
+    # Undo, the highlighter and the completer go on finding their lines
+    # after the lines before them are evicted
+    ansi.highlighter = Highlighter(lambda line, state: ([(line, "x")], 
+                                                        state), {"x": "red"})
+    ansi.completer = Completer()
+    ansi.write("peahen\npeacock\npea")
+    assert ansi.completer.complete(ansi._buffer, "pea") == ["peacock", 
+                                                            "peahen"]
+    assert ansi.replace_all("pea", "PEA", (0, 1, 3, 1)) == 1
+    ansi.scrollback = Scrollback(max_lines=3)
+    ansi.write("\n")
+    assert list(ansi._buffer) == ["PEAcock", "pea", ""]
+    assert ansi.highlighter.runs(ansi._buffer, 2) == [(3, "red")]
+    assert ansi.completer.complete(ansi._buffer, "pea") == []
+    assert ansi.undo() and ansi._buffer[1] == "peacock"
+    assert ansi.completer.complete(ansi._buffer, "pea") == ["peacock"]
+
+    # Ranges that start in lines that were evicted start at the first kept
+    ansi.restyle(2, 0, 3, 1, "red")
+    assert ansi._line_styles(1)[0] == (3, "red")
+
+def test_typing_across_rows(ansi):
+    for ch in "abcdefghij":
+        ansi.write(ch)
+    assert shown(ansi) == (["abcd", "efgh", "ij"], True)
+
+def test_typing_an_exact_multiple_of_the_width(ansi):
+    for ch in "abcdefgh":
+        ansi.write(ch)
+    # The cursor is at the start of the row after the text, as the terminal's
+    # is once it wraps
+    assert ansi.display_position() == (2, 0)
+    assert shown(ansi) == (["abcd", "efgh"], True)
+    ansi.move_cursor(cols=-1)
+    ansi.move_cursor(cols=1)
+    ansi.write("\ni")
+    assert shown(ansi) == (["abcd", "efgh", "i"], True)
+
+def test_deleting_back_across_rows(ansi):
+    ansi.write("abcdefgh\nxy")
+    ansi.move_cursor_to(8, 0)
+    ansi.delete(1)
+    assert shown(ansi) == (["abcd", "efg", "xy"], True)
+    ansi.write("h")
+    assert shown(ansi) == (["abcd", "efgh", "xy"], True)
+    for _ in range(5):
+        ansi.delete(1)
+    assert shown(ansi) == (["abc", "xy"], True)
+
+def test_deleting_trailing_text_at_the_end_of_a_row(ansi):
+    ansi.write("abcdefgh\nxy\nz")
+    ansi.move_cursor_to(8, 0)
+    ansi.delete_trailing()
+    assert ansi._buffer == ["abcdefgh"]
+    assert shown(ansi) == (["abcd", "efgh"], True)
+    ansi.move_cursor_to(4, 0)
+    ansi.delete_line()
+    assert shown(ansi) == (["abcd"], True)
+
+def test_restyling_up_to_the_end_of_a_row(ansi):
+    ansi.write("abcdefgh")
+    ansi.move_cursor_to(2, 0)
+    ansi.restyle(0, 0, 4, 0, "red")
+    assert shown(ansi) == (["abcd", "efgh"], True)
+    ansi.restyle(4, 0, 8, 0, "bold")
+    ansi.write("!")
+    assert shown(ansi) == (["ab!c", "defg", "h"], True)
+
+def test_wide_character_pushed_to_the_next_row(ansi):
+    ansi.write("abc日x")
+    ansi.move_cursor_to(3, 0)
+    assert ansi.display_position() == (1, 0)
+    ansi.delete_trailing()
+    # Without the wide character, the end of the line is on the first row
+    assert shown(ansi) == (["abc"], True)
+    ansi.write("d日")
+    assert shown(ansi) == (["abcd", "日"], True)